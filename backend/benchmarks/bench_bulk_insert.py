@@ -0,0 +1,100 @@
+"""
+Benchmark: embeddings insert throughput, per-row ORM objects vs binary COPY.
+
+Inserts synthetic chunks for throwaway documents in DATABASE_URL, rolls
+everything back afterwards and prints rows/sec for each write path:
+
+    cd backend && python -m benchmarks.bench_bulk_insert --rows 20000
+"""
+import asyncio
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from db.bulk import copy_embeddings
+from db.database import DATABASE_URL
+from db.models import Document, Embedding
+from benchmarks.common import benchmark_parser, write_report
+
+DIM = 768
+CHUNKS_PER_DOCUMENT = 20
+
+
+def _synthetic_rows(rows: int):
+    documents, chunks = [], []
+    for d in range(0, rows, CHUNKS_PER_DOCUMENT):
+        document_id = uuid.uuid4()
+        documents.append({"id": document_id, "source_id": f"bench-{document_id}", "title": f"Bench {d}"})
+        for i in range(min(CHUNKS_PER_DOCUMENT, rows - d)):
+            chunks.append({
+                "id": uuid.uuid4(),
+                "document_id": document_id,
+                "chunk_text": "lorem ipsum " * 80,
+                "chunk_index": i,
+                "embedding": [random.uniform(-1, 1) for _ in range(DIM)],
+                "meta": {"source_title": f"Bench {d}"},
+                "created_at": datetime.now(timezone.utc),
+            })
+    return documents, chunks
+
+
+async def _orm_path(session: AsyncSession, documents: list, chunks: list):
+    """The previous sync write path: one ORM object per row, flush per document."""
+    by_document = {}
+    for chunk in chunks:
+        by_document.setdefault(chunk["document_id"], []).append(chunk)
+    for doc in documents:
+        session.add(Document(id=doc["id"], source_id=doc["source_id"], title=doc["title"], content="bench"))
+        await session.flush()
+        for chunk in by_document[doc["id"]]:
+            session.add(Embedding(
+                document_id=chunk["document_id"],
+                chunk_text=chunk["chunk_text"],
+                chunk_index=chunk["chunk_index"],
+                embedding=chunk["embedding"],
+                meta=chunk["meta"],
+            ))
+    await session.flush()
+
+
+async def _copy_path(session: AsyncSession, documents: list, chunks: list):
+    """The bulk path: multi-row INSERT for documents, binary COPY for embeddings."""
+    await session.execute(insert(Document), [{**doc, "content": "bench"} for doc in documents])
+    await copy_embeddings(session, chunks)
+
+
+async def benchmark(rows: int) -> dict:
+    engine = create_async_engine(DATABASE_URL, echo=False)
+    async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    report = {"rows": rows}
+    try:
+        for name, path in (("orm", _orm_path), ("copy", _copy_path)):
+            documents, chunks = _synthetic_rows(rows)
+            async with async_session() as session:
+                started = time.perf_counter()
+                await path(session, documents, chunks)
+                elapsed = time.perf_counter() - started
+                await session.rollback()
+            report[name] = {"seconds": round(elapsed, 3), "rows_per_second": round(rows / elapsed, 1)}
+            print(f"{name}: {rows} rows in {elapsed:.2f}s ({rows / elapsed:.0f} rows/s)")
+        report["speedup"] = round(report["copy"]["rows_per_second"] / report["orm"]["rows_per_second"], 1)
+    finally:
+        await engine.dispose()
+    return report
+
+
+def main():
+    parser = benchmark_parser(__doc__)
+    parser.add_argument("--rows", type=int, default=20_000)
+    args = parser.parse_args()
+
+    report = asyncio.run(benchmark(args.rows))
+    print(json.dumps(report, indent=2))
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
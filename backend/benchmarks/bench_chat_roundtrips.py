@@ -0,0 +1,101 @@
+"""
+Load test: database round-trips per chat turn.
+
+Runs chat turns against DATABASE_URL with a stubbed Gemini client (no API
+calls) and counts every statement sent to Postgres, including BEGIN/COMMIT.
+The "legacy" flow replays the previous turn sequence (create + commit,
+add user message + commit, read history, add assistant message + commit)
+through the same service for comparison.
+
+    cd backend && GEMINI_API_KEY=dummy python -m benchmarks.bench_chat_roundtrips --turns 50
+"""
+import asyncio
+from uuid import UUID
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from db.database import DATABASE_URL
+from services.chat_service import ChatService
+from services.context_cache import ContextCacheManager
+from benchmarks.common import benchmark_parser, write_report
+
+
+class _StubGemini:
+    async def agenerate_content(self, prompt, model_type: str = "fast", **kwargs) -> str:
+        return "stub answer"
+
+
+class _StubClients:
+    gemini = _StubGemini()
+    embeddings = None
+    context_cache = ContextCacheManager(gemini, enabled=False)
+
+
+class RoundTripCounter:
+    def __init__(self, engine):
+        self.count = 0
+        sync_engine = engine.sync_engine
+        event.listen(sync_engine, "before_cursor_execute", self._statement)
+        event.listen(sync_engine, "begin", self._statement)
+        event.listen(sync_engine, "commit", self._statement)
+        event.listen(sync_engine, "rollback", self._statement)
+
+    def _statement(self, *args, **kwargs):
+        self.count += 1
+
+
+async def _legacy_turn(service: ChatService, conversation_id, message: str):
+    if conversation_id is None:
+        conversation_id = await service.create_conversation()
+    await service.add_message(conversation_id, "user", message)
+    history = await service.get_conversation_history(conversation_id, limit=10)
+    prompt = service._build_prompt_with_history(history, message)
+    answer = await service.gemini_service.agenerate_content(prompt)
+    await service.add_message(conversation_id, "assistant", answer, {})
+    return conversation_id
+
+
+async def _current_turn(service: ChatService, conversation_id, message: str):
+    result = await service.chat(conversation_id, message)
+    return conversation_id or result["conversation_id"]
+
+
+async def benchmark(turns: int) -> dict:
+    engine = create_async_engine(DATABASE_URL, echo=False)
+    async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    counter = RoundTripCounter(engine)
+    report = {"turns": turns}
+    try:
+        for name, turn in (("legacy", _legacy_turn), ("current", _current_turn)):
+            conversation_id = None
+            first_turn = None
+            counter.count = 0
+            for i in range(turns):
+                before = counter.count
+                async with async_session() as session:
+                    service = ChatService(session, _StubClients())
+                    conversation_id = await turn(service, conversation_id, f"message {i}")
+                    if isinstance(conversation_id, str):
+                        conversation_id = UUID(conversation_id)
+                if first_turn is None:
+                    first_turn = counter.count - before
+            report[name] = {
+                "first_turn_round_trips": first_turn,
+                "follow_up_round_trips": round((counter.count - first_turn) / max(turns - 1, 1), 2),
+            }
+            print(f"{name}: {report[name]}")
+    finally:
+        await engine.dispose()
+    return report
+
+
+def main():
+    parser = benchmark_parser(__doc__)
+    parser.add_argument("--turns", type=int, default=50)
+    args = parser.parse_args()
+
+    report = asyncio.run(benchmark(args.turns))
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
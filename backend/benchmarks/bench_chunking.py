@@ -0,0 +1,104 @@
+"""
+Benchmark: chunking throughput and event-loop stalls by worker count.
+
+Splits a synthetic corpus through TextChunker.split_stream, as the sync
+does, with 0 (a thread) to N worker processes, and compares it with
+splitting on the event loop ("inline", the previous behaviour). While
+splitting, a ticker measures how late the loop wakes it up, which is the
+delay every concurrent request would see. Reports chunks per second and the
+p99 / max loop lag for each length unit:
+
+    cd backend && python -m benchmarks.bench_chunking --pages 500 --workers 0 1 2 4 8
+"""
+import asyncio
+import json
+import statistics
+import time
+from services.chunking import LENGTH_UNITS, TextChunker, make_splitter, normalize_text
+from benchmarks.fakes import synthetic_corpus
+from benchmarks.common import benchmark_parser, write_report
+
+# Chunk sizes per unit, roughly equivalent for English text
+DEFAULT_SIZES = {"characters": (1000, 200), "tokens": (250, 50)}
+
+
+async def _items(texts):
+    for i, text in enumerate(texts):
+        yield i, text
+
+
+async def _split(texts, workers, chunk_size: int, chunk_overlap: int, unit: str) -> int:
+    if workers == "inline":
+        splitter = make_splitter(chunk_size, chunk_overlap, unit)
+        chunks = 0
+        async for _, text in _items(texts):
+            chunks += len(splitter.split_text(normalize_text(text)))
+        return chunks
+
+    chunker = TextChunker(workers=workers, chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_unit=unit)
+    try:
+        # Start the pool outside the measurement
+        await chunker.split(texts[0])
+        return sum([len(result.chunks) async for result in chunker.split_stream(_items(texts))])
+    finally:
+        chunker.close()
+
+
+async def _measure(texts, workers, chunk_size: int, chunk_overlap: int, unit: str, tick_ms: float) -> dict:
+    lags = []
+    running = True
+
+    async def ticker():
+        interval = tick_ms / 1000
+        while running:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append((time.perf_counter() - started - interval) * 1000)
+
+    tick_task = asyncio.create_task(ticker())
+    await asyncio.sleep(0)
+    started = time.perf_counter()
+    chunks = await _split(texts, workers, chunk_size, chunk_overlap, unit)
+    elapsed = time.perf_counter() - started
+    running = False
+    await tick_task
+
+    lags.sort()
+    return {
+        "chunks": chunks,
+        "seconds": round(elapsed, 2),
+        "chunks_per_second": round(chunks / elapsed),
+        "loop_lag_p99_ms": round(lags[int(len(lags) * 0.99)] if lags else 0.0, 1),
+        "loop_lag_max_ms": round(lags[-1] if lags else 0.0, 1),
+        "loop_lag_mean_ms": round(statistics.fmean(lags) if lags else 0.0, 2),
+    }
+
+
+async def benchmark(args) -> list:
+    texts = [doc.page_content for doc in synthetic_corpus(args.pages, args.words_per_page)]
+    report = []
+    for unit in args.units:
+        chunk_size, chunk_overlap = DEFAULT_SIZES[unit]
+        for workers in ["inline", *args.workers]:
+            stats = await _measure(texts, workers, chunk_size, chunk_overlap, unit, args.tick_ms)
+            row = {"unit": unit, "chunk_size": chunk_size, "workers": workers, **stats}
+            report.append(row)
+            print(json.dumps(row))
+    return report
+
+
+def main():
+    parser = benchmark_parser(__doc__)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--words-per-page", type=int, default=5000, help="Large pages are what stall the loop")
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--units", nargs="+", default=list(LENGTH_UNITS), choices=LENGTH_UNITS)
+    parser.add_argument("--tick-ms", type=float, default=5, help="Interval of the loop-lag probe")
+    args = parser.parse_args()
+
+    report = asyncio.run(benchmark(args))
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
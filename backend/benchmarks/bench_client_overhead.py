@@ -0,0 +1,51 @@
+"""
+Micro-benchmark: per-request service construction cost, building fresh
+Gemini/embeddings clients per request vs reusing the shared ClientRegistry.
+
+No network calls are made; any GEMINI_API_KEY value works:
+
+    cd backend && GEMINI_API_KEY=dummy python -m benchmarks.bench_client_overhead
+"""
+import json
+import os
+import time
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from services.chat_service import ChatService
+from services.clients import ClientRegistry, EMBEDDING_MODEL
+from services.gemini_service import GeminiService
+from benchmarks.common import benchmark_parser, write_report
+
+
+def _per_request_clients():
+    """What ChatService.__init__ used to do on every request."""
+    GeminiService()
+    GeminiService()  # KnowledgeBaseService built a second one
+    GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL, google_api_key=os.environ["GEMINI_API_KEY"])
+
+
+def _time(label: str, fn, iterations: int) -> dict:
+    fn()  # warm-up (imports, lazy initialisation)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    per_call_us = (time.perf_counter() - started) / iterations * 1e6
+    print(f"{label}: {per_call_us:.1f} us/request")
+    return {"us_per_request": round(per_call_us, 1)}
+
+
+def main():
+    parser = benchmark_parser(__doc__)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    registry = ClientRegistry()
+    report = {
+        "per_request_clients": _time("new clients per request", _per_request_clients, args.iterations),
+        "shared_registry": _time("shared registry", lambda: ChatService(None, registry), args.iterations),
+    }
+    print(json.dumps(report, indent=2))
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Benchmark: retrieval latency, vector-only vs hybrid (vector + full-text, RRF).
+
+Copies synthetic chunks (random vectors, text drawn from a small vocabulary
+plus rare "product name" terms) into the embeddings table of DATABASE_URL
+inside a transaction, times both statements built by db/hybrid_search.py
+with the real indexes (HNSW + GIN), and rolls everything back.
+
+It also times batch_search_statement on `--batch-size` queries at a time
+against running the same queries one statement each, for both modes:
+
+    cd backend && python -m benchmarks.bench_hybrid_search --rows 50000 --queries 200 --batch-size 20
+"""
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+import uuid
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from db.bulk import copy_embeddings
+from db.database import DATABASE_URL
+from db.hybrid_search import batch_search_statement, hybrid_search_statement, vector_search_statement
+from db.models import Document
+from benchmarks.common import benchmark_parser, percentile, write_report
+
+DIM = 768
+CHUNKS_PER_DOCUMENT = 20
+WORDS_PER_CHUNK = 150
+VOCABULARY = [f"word{i}" for i in range(5000)]
+RARE_TERMS = [f"product{i}" for i in range(500)]
+
+
+def _chunk_text() -> str:
+    words = random.choices(VOCABULARY, k=WORDS_PER_CHUNK)
+    words[random.randrange(WORDS_PER_CHUNK)] = random.choice(RARE_TERMS)
+    return " ".join(words)
+
+
+async def _seed(session: AsyncSession, rows: int):
+    for start in range(0, rows, CHUNKS_PER_DOCUMENT * 500):
+        documents, chunks = [], []
+        for d in range(start, min(start + CHUNKS_PER_DOCUMENT * 500, rows), CHUNKS_PER_DOCUMENT):
+            document_id = uuid.uuid4()
+            documents.append({"id": document_id, "source_id": f"bench-{document_id}", "content": "bench"})
+            for i in range(min(CHUNKS_PER_DOCUMENT, rows - d)):
+                chunks.append({
+                    "id": uuid.uuid4(),
+                    "document_id": document_id,
+                    "chunk_text": _chunk_text(),
+                    "chunk_index": i,
+                    "embedding": [random.uniform(-1, 1) for _ in range(DIM)],
+                    "meta": {},
+                })
+        await session.execute(insert(Document), documents)
+        await copy_embeddings(session, chunks)
+        print(f"  seeded {start + len(chunks)}/{rows}", file=sys.stderr)
+    await session.execute(text("ANALYZE embeddings"))
+
+
+async def _time(session: AsyncSession, stmt) -> float:
+    started = time.perf_counter()
+    result = await session.execute(stmt)
+    result.all()
+    return (time.perf_counter() - started) * 1000
+
+
+async def _time_batches(session: AsyncSession, samples: list, k: int, batch_size: int, lexical_weight: float) -> dict:
+    """One batch statement per `batch_size` queries vs one statement per query."""
+    single = vector_search_statement if lexical_weight == 0 else hybrid_search_statement
+    batched, singles = [], []
+    for start in range(0, len(samples) - batch_size + 1, batch_size):
+        batch = samples[start:start + batch_size]
+        batched.append(await _time(session, batch_search_statement(
+            [query for query, _ in batch], [vector for _, vector in batch], k, lexical_weight=lexical_weight
+        )))
+        total = 0.0
+        for query, vector in batch:
+            total += await _time(session, single(vector, k) if lexical_weight == 0 else single(query, vector, k))
+        singles.append(total)
+    batch_p50, singles_p50 = statistics.median(batched), statistics.median(singles)
+    return {
+        "batch_p50_ms": round(batch_p50, 3),
+        "singles_p50_ms": round(singles_p50, 3),
+        "speedup": round(singles_p50 / batch_p50, 2),
+    }
+
+
+async def benchmark(rows: int, queries: int, k: int, batch_size: int = 20) -> dict:
+    engine = create_async_engine(DATABASE_URL, echo=False)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    report = {"rows": rows, "queries": queries, "k": k}
+    try:
+        async with session_factory() as session:
+            print(f"Seeding {rows} chunks...", file=sys.stderr)
+            await _seed(session, rows)
+
+            samples = [
+                (
+                    f"{random.choice(RARE_TERMS)} {' '.join(random.choices(VOCABULARY, k=4))}",
+                    [random.uniform(-1, 1) for _ in range(DIM)],
+                )
+                for _ in range(queries)
+            ]
+            # Warm up plans and caches
+            for query, vector in samples[:10]:
+                await _time(session, vector_search_statement(vector, k))
+                await _time(session, hybrid_search_statement(query, vector, k))
+
+            latencies = {"vector": [], "hybrid": []}
+            for query, vector in samples:
+                latencies["vector"].append(await _time(session, vector_search_statement(vector, k)))
+                latencies["hybrid"].append(await _time(session, hybrid_search_statement(query, vector, k)))
+
+            for name, values in latencies.items():
+                report[name] = {
+                    "p50_ms": round(statistics.median(values), 3),
+                    "p95_ms": round(percentile(values, 95), 3),
+                    "p99_ms": round(percentile(values, 99), 3),
+                }
+            report["p50_overhead_ms"] = round(report["hybrid"]["p50_ms"] - report["vector"]["p50_ms"], 3)
+
+            if batch_size > 1 and queries >= batch_size:
+                report["batch_size"] = batch_size
+                report["batch_vector"] = await _time_batches(session, samples, k, batch_size, lexical_weight=0)
+                report["batch_hybrid"] = await _time_batches(session, samples, k, batch_size, lexical_weight=1.0)
+            await session.rollback()
+    finally:
+        await engine.dispose()
+    print(json.dumps(report))
+    return report
+
+
+def main():
+    parser = benchmark_parser(__doc__)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=20, help="Queries per batch statement (1 skips the comparison)")
+    args = parser.parse_args()
+
+    report = asyncio.run(benchmark(args.rows, args.queries, args.k, args.batch_size))
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
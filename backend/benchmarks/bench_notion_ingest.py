@@ -0,0 +1,105 @@
+"""
+Benchmark: Notion ingestion, streaming vs loading every page first.
+
+Serves a synthetic corpus from the fake Notion server (benchmarks/fake_notion.py)
+and reads it through NotionDatabaseSource while a consumer spends
+`--consume-ms` per page (standing in for chunking and embedding), either as
+pages stream in ("stream") or after collecting all of them, as the previous
+NotionDBLoader.load() did ("materialize"; with --concurrency 1 this is the old
+behaviour of fetching one page's blocks at a time). Reports time to the first
+processed page, pages per second and peak Python memory above the corpus
+itself (tracemalloc):
+
+    cd backend && python -m benchmarks.bench_notion_ingest --pages 1000 5000 --concurrency 1 4 8
+"""
+import asyncio
+import json
+import time
+import tracemalloc
+from services.notion_source import NotionDatabaseSource
+from benchmarks import fake_notion
+from benchmarks.fake_notion import start_server, stop_server
+from benchmarks.fakes import synthetic_corpus
+from benchmarks.common import benchmark_parser, write_report
+
+MODES = ("stream", "materialize")
+
+
+async def _ingest(base_url: str, mode: str, concurrency: int, requests_per_second: float, consume_ms: float) -> dict:
+    source = NotionDatabaseSource(
+        "fake", "synthetic", base_url=base_url,
+        max_concurrency=concurrency, requests_per_second=requests_per_second
+    )
+    baseline = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    started = time.perf_counter()
+    first = None
+    processed = 0
+
+    async def consume(doc):
+        nonlocal first, processed
+        await asyncio.sleep(consume_ms / 1000)
+        processed += 1
+        if first is None:
+            first = time.perf_counter() - started
+
+    if mode == "materialize":
+        docs = [doc async for doc in source.documents()]
+        for doc in docs:
+            await consume(doc)
+    else:
+        async for doc in source.documents():
+            await consume(doc)
+
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    return {
+        "pages": processed,
+        "first_page_s": round(first or 0.0, 3),
+        "seconds": round(elapsed, 2),
+        "pages_per_second": round(processed / elapsed, 1),
+        "peak_mb": round((peak - baseline) / 1024 ** 2, 1),
+    }
+
+
+async def benchmark(args) -> list:
+    tracemalloc.start()
+    report = []
+    for pages in args.pages:
+        corpus = synthetic_corpus(pages, args.words_per_page)
+        app = fake_notion.create_app(lambda: corpus, latency_ms=args.latency_ms)
+        server, task = await start_server(app, args.port)
+        try:
+            for mode in args.modes:
+                for concurrency in args.concurrency:
+                    stats = await _ingest(
+                        f"http://127.0.0.1:{args.port}", mode, concurrency, args.requests_per_second, args.consume_ms
+                    )
+                    row = {"mode": mode, "concurrency": concurrency, **stats}
+                    report.append(row)
+                    print(json.dumps(row))
+        finally:
+            await stop_server(server, task)
+    tracemalloc.stop()
+    return report
+
+
+def main():
+    parser = benchmark_parser(__doc__)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1000])
+    parser.add_argument("--words-per-page", type=int, default=800)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--latency-ms", type=float, default=50, help="Fake Notion response time")
+    parser.add_argument("--requests-per-second", type=float, default=1000,
+                        help="Client rate limit (Notion's real limit is about 3)")
+    parser.add_argument("--consume-ms", type=float, default=5, help="Processing time per page")
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args()
+
+    report = asyncio.run(benchmark(args))
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
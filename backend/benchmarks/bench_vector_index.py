@@ -0,0 +1,159 @@
+"""
+Benchmark: ANN (HNSW / IVFFlat) vs exact cosine search on synthetic 768-dim vectors.
+
+Runs against the database in DATABASE_URL using a scratch table
+(bench_embeddings) that is dropped afterwards. Example:
+
+    cd backend && python -m benchmarks.bench_vector_index --sizes 10000 100000 1000000
+"""
+import asyncio
+import json
+import statistics
+import sys
+import time
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from db.database import DATABASE_URL
+from benchmarks.common import benchmark_parser, percentile, write_report
+
+DIM = 768
+TABLE = "bench_embeddings"
+
+
+async def _seed(conn, rows: int, clusters: int):
+    """Generates clustered unit vectors server-side (clusters make recall realistic)."""
+    await conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+    await conn.execute(text(f"CREATE TABLE {TABLE} (id bigint PRIMARY KEY, embedding vector({DIM}) NOT NULL)"))
+    await conn.execute(text(
+        f"""
+        CREATE TEMP TABLE bench_centroids AS
+        SELECT c AS cid, array_agg(random() - 0.5) AS v
+        FROM generate_series(1, :clusters) c, generate_series(1, {DIM}) d
+        GROUP BY c
+        """
+    ), {"clusters": clusters})
+
+    batch = 50_000
+    for start in range(0, rows, batch):
+        stop = min(start + batch, rows)
+        await conn.execute(text(
+            f"""
+            INSERT INTO {TABLE} (id, embedding)
+            SELECT g, l2_normalize((
+                SELECT array_agg(cv + (random() - 0.5) * 0.3 ORDER BY ord)
+                FROM unnest(c.v) WITH ORDINALITY AS u(cv, ord)
+                WHERE g IS NOT NULL
+            )::vector)
+            FROM generate_series(:start, :stop - 1) g
+            JOIN bench_centroids c ON c.cid = 1 + (g % :clusters)
+            """
+        ), {"start": start, "stop": stop, "clusters": clusters})
+        print(f"  seeded {stop}/{rows}", file=sys.stderr)
+    await conn.execute(text("DROP TABLE bench_centroids"))
+    await conn.execute(text(f"ANALYZE {TABLE}"))
+
+
+async def _query_vectors(conn, count: int) -> list:
+    result = await conn.execute(text(
+        f"SELECT embedding::text FROM {TABLE} ORDER BY random() LIMIT :n"
+    ), {"n": count})
+    return [row[0] for row in result]
+
+
+async def _search(conn, vector: str, k: int) -> tuple:
+    started = time.perf_counter()
+    result = await conn.execute(text(
+        f"SELECT id FROM {TABLE} ORDER BY embedding <=> CAST(:q AS vector) LIMIT :k"
+    ), {"q": vector, "k": k})
+    ids = [row[0] for row in result]
+    return ids, (time.perf_counter() - started) * 1000
+
+
+async def _run_config(conn, queries: list, k: int, settings: dict, truth: list = None) -> dict:
+    # The connection is in autocommit mode, so settings are applied session-wide
+    # for the duration of this configuration and reset afterwards.
+    for name, value in settings.items():
+        await conn.execute(text("SELECT set_config(:n, :v, false)"), {"n": name, "v": str(value)})
+
+    latencies, recalls, results = [], [], []
+    for i, vector in enumerate(queries):
+        ids, ms = await _search(conn, vector, k)
+        latencies.append(ms)
+        results.append(ids)
+        if truth is not None:
+            recalls.append(len(set(ids) & set(truth[i])) / k)
+
+    for name in settings:
+        await conn.execute(text(f"RESET {name}"))
+    return {
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "recall": round(statistics.mean(recalls), 4) if recalls else 1.0,
+        "_results": results,
+    }
+
+
+async def benchmark(sizes: list, methods: list, queries: int, k: int, clusters: int) -> list:
+    engine = create_async_engine(DATABASE_URL, echo=False)
+    report = []
+    try:
+        async with engine.connect() as conn:
+            await conn.execution_options(isolation_level="AUTOCOMMIT")
+            for rows in sizes:
+                print(f"Seeding {rows} vectors...", file=sys.stderr)
+                await _seed(conn, rows, clusters)
+                sample = await _query_vectors(conn, queries)
+
+                exact = await _run_config(conn, sample, k, {"enable_indexscan": "off"})
+                truth = exact.pop("_results")
+                report.append({"rows": rows, "method": "exact", **exact})
+
+                for method in methods:
+                    if method == "hnsw":
+                        options = "m = 16, ef_construction = 64"
+                        sweep = [("hnsw.ef_search", v) for v in (20, 40, 100, 200)]
+                    else:
+                        lists = max(rows // 1000, 1) if rows <= 1_000_000 else int(rows ** 0.5)
+                        options = f"lists = {lists}"
+                        sweep = [("ivfflat.probes", v) for v in (1, 5, 10, 20)]
+
+                    started = time.perf_counter()
+                    await conn.execute(text(
+                        f"CREATE INDEX bench_ann ON {TABLE} USING {method} (embedding vector_cosine_ops) WITH ({options})"
+                    ))
+                    build_s = round(time.perf_counter() - started, 2)
+                    size_mb = round(await conn.scalar(text("SELECT pg_relation_size('bench_ann')")) / 1024 ** 2, 1)
+
+                    for name, value in sweep:
+                        stats = await _run_config(conn, sample, k, {name: value}, truth)
+                        stats.pop("_results")
+                        report.append({
+                            "rows": rows, "method": method, name: value,
+                            "build_s": build_s, "index_mb": size_mb, **stats
+                        })
+                    await conn.execute(text("DROP INDEX bench_ann"))
+
+                for row in report:
+                    if row["rows"] == rows:
+                        print(json.dumps(row))
+            await conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+    finally:
+        await engine.dispose()
+    return report
+
+
+def main():
+    parser = benchmark_parser(__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--methods", nargs="+", default=["hnsw", "ivfflat"], choices=["hnsw", "ivfflat"])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--clusters", type=int, default=200)
+    args = parser.parse_args()
+
+    report = asyncio.run(benchmark(args.sizes, args.methods, args.queries, args.k, args.clusters))
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
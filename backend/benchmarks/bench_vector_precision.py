@@ -0,0 +1,145 @@
+"""
+Benchmark: ANN index precision (full vector / halfvec / binary quantization).
+
+Reports, per precision, the index size, the per-row size of the indexed
+representation, query latency and recall@k against exact full-precision
+search. Quantized searches re-rank `k * rerank_factor` candidates with the
+full vectors, as the application does. Uses the same scratch table as
+bench_vector_index (dropped afterwards):
+
+    cd backend && python -m benchmarks.bench_vector_precision --rows 100000 --rerank-factors 1 4 10
+"""
+import asyncio
+import json
+import statistics
+import sys
+import time
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from db.database import DATABASE_URL
+from benchmarks.bench_vector_index import DIM, TABLE, _query_vectors, _seed
+from benchmarks.common import benchmark_parser, percentile, write_report
+
+INDEXES = {
+    "full": ("embedding vector_cosine_ops", "embedding", "CAST(:q AS vector)", "<=>"),
+    "halfvec": (
+        f"(embedding::halfvec({DIM})) halfvec_cosine_ops",
+        f"embedding::halfvec({DIM})",
+        f"CAST(:q AS halfvec({DIM}))",
+        "<=>",
+    ),
+    "binary": (
+        f"(binary_quantize(embedding)::bit({DIM})) bit_hamming_ops",
+        f"binary_quantize(embedding)::bit({DIM})",
+        f"binary_quantize(CAST(:q AS vector))::bit({DIM})",
+        "<~>",
+    ),
+}
+
+
+def _search_sql(precision: str) -> str:
+    _, column, query, operator = INDEXES[precision]
+    if precision == "full":
+        return f"SELECT id FROM {TABLE} ORDER BY embedding <=> CAST(:q AS vector) LIMIT :k"
+    return f"""
+        SELECT id FROM (
+            SELECT id, embedding FROM {TABLE}
+            ORDER BY {column} {operator} {query}
+            LIMIT :candidates
+        ) c
+        ORDER BY embedding <=> CAST(:q AS vector)
+        LIMIT :k
+    """
+
+
+async def _run(conn, sql: str, queries: list, k: int, candidates: int, truth: list = None) -> tuple:
+    latencies, recalls, results = [], [], []
+    for i, vector in enumerate(queries):
+        started = time.perf_counter()
+        result = await conn.execute(text(sql), {"q": vector, "k": k, "candidates": candidates})
+        ids = [row[0] for row in result]
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append(ids)
+        if truth is not None:
+            recalls.append(len(set(ids) & set(truth[i])) / k)
+    stats = {
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "recall": round(statistics.mean(recalls), 4) if recalls else 1.0,
+    }
+    return stats, results
+
+
+async def benchmark(rows: int, precisions: list, rerank_factors: list, queries: int, k: int, clusters: int) -> list:
+    engine = create_async_engine(DATABASE_URL, echo=False)
+    report = []
+    try:
+        async with engine.connect() as conn:
+            await conn.execution_options(isolation_level="AUTOCOMMIT")
+            print(f"Seeding {rows} vectors...", file=sys.stderr)
+            await _seed(conn, rows, clusters)
+            sample = await _query_vectors(conn, queries)
+
+            row_bytes = (await conn.execute(text(
+                f"""
+                SELECT avg(pg_column_size(embedding)),
+                       avg(pg_column_size(embedding::halfvec({DIM}))),
+                       avg(pg_column_size(binary_quantize(embedding)::bit({DIM})))
+                FROM {TABLE}
+                """
+            ))).first()
+            value_bytes = dict(zip(("full", "halfvec", "binary"), (round(float(v)) for v in row_bytes)))
+
+            await conn.execute(text("SET enable_indexscan = off"))
+            _, truth = await _run(conn, _search_sql("full"), sample, k, k)
+            await conn.execute(text("RESET enable_indexscan"))
+
+            for precision in precisions:
+                keys = INDEXES[precision][0]
+                started = time.perf_counter()
+                await conn.execute(text(
+                    f"CREATE INDEX bench_ann ON {TABLE} USING hnsw ({keys}) WITH (m = 16, ef_construction = 64)"
+                ))
+                build_s = round(time.perf_counter() - started, 2)
+                index_mb = round(await conn.scalar(text("SELECT pg_relation_size('bench_ann')")) / 1024 ** 2, 1)
+
+                # Enough ef_search for the largest candidate set
+                factors = [1] if precision == "full" else rerank_factors
+                await conn.execute(text("SELECT set_config('hnsw.ef_search', :v, false)"), {
+                    "v": str(max(40, k * max(factors)))
+                })
+                for factor in factors:
+                    stats, _ = await _run(conn, _search_sql(precision), sample, k, k * factor, truth)
+                    row = {
+                        "rows": rows, "precision": precision, "rerank_factor": factor,
+                        "value_bytes": value_bytes[precision], "index_mb": index_mb, "build_s": build_s, **stats
+                    }
+                    report.append(row)
+                    print(json.dumps(row))
+                await conn.execute(text("RESET hnsw.ef_search"))
+                await conn.execute(text("DROP INDEX bench_ann"))
+
+            await conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+    finally:
+        await engine.dispose()
+    return report
+
+
+def main():
+    parser = benchmark_parser(__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--precisions", nargs="+", default=list(INDEXES), choices=list(INDEXES))
+    parser.add_argument("--rerank-factors", type=int, nargs="+", default=[1, 4, 10])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--clusters", type=int, default=200)
+    args = parser.parse_args()
+
+    report = asyncio.run(benchmark(
+        args.rows, args.precisions, args.rerank_factors, args.queries, args.k, args.clusters
+    ))
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
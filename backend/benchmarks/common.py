@@ -0,0 +1,28 @@
+"""
+Helpers shared by the benchmark scripts: latency percentiles and the
+command-line boilerplate (description from the module docstring, --output).
+"""
+import argparse
+import json
+from typing import Any, Optional
+
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile of `values` (which need not be sorted)."""
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def benchmark_parser(doc: str) -> argparse.ArgumentParser:
+    """Argument parser showing `doc` as help, with the common --output option."""
+    parser = argparse.ArgumentParser(description=doc, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="Write the report to this JSON file")
+    return parser
+
+
+def write_report(report: Any, path: Optional[str]) -> None:
+    """Writes `report` as JSON to `path`, if one was given."""
+    if path:
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
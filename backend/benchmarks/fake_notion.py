@@ -0,0 +1,129 @@
+"""
+Local stand-in for the two Notion endpoints the sync uses (database query
+and block children), serving LangChain Documents such as the synthetic
+corpus from benchmarks/fakes.py. Point NOTION_BASE_URL at it. Latency and
+periodic 429 responses (with Retry-After) are configurable.
+"""
+import asyncio
+from typing import Callable, List, Optional
+from fastapi import Body, FastAPI
+from fastapi.responses import JSONResponse
+import uvicorn
+
+
+def _rich_text(text: str) -> list:
+    return [{"type": "text", "text": {"content": text}, "plain_text": text}]
+
+
+def _page(doc) -> dict:
+    return {
+        "object": "page",
+        "id": doc.metadata["id"],
+        "last_edited_time": doc.metadata["last_edited_time"],
+        "properties": {
+            "Title": {"type": "title", "title": _rich_text(doc.metadata["title"])},
+            "Tags": {"type": "multi_select", "multi_select": [{"name": tag} for tag in doc.metadata.get("tags", [])]},
+        },
+    }
+
+
+def _paragraph(block_id: str, text: str) -> dict:
+    return {
+        "object": "block",
+        "id": block_id,
+        "type": "paragraph",
+        "has_children": False,
+        "paragraph": {"rich_text": _rich_text(text)},
+    }
+
+
+def _listing(results: list, start: int, total: int) -> dict:
+    end = start + len(results)
+    return {
+        "object": "list",
+        "results": results,
+        "has_more": end < total,
+        "next_cursor": str(end) if end < total else None,
+    }
+
+
+def create_app(
+    pages: Callable[[], List],
+    latency_ms: float = 0,
+    rate_limit_every: int = 0,
+    retry_after_seconds: float = 1,
+) -> FastAPI:
+    """
+    `pages()` returns the current documents (called per request, so a test can
+    swap the corpus between syncs). Every `rate_limit_every`th request is
+    answered with a 429.
+    """
+    app = FastAPI()
+    app.state.requests = 0
+    app.state.in_flight = 0
+    app.state.max_in_flight = 0
+    index = {"docs": None, "by_id": {}}
+
+    def lookup(page_id: str):
+        docs = pages()
+        if index["docs"] is not docs:
+            index["docs"], index["by_id"] = docs, {doc.metadata["id"]: doc for doc in docs}
+        return index["by_id"].get(page_id)
+
+    async def respond(payload: dict):
+        app.state.requests += 1
+        if rate_limit_every and app.state.requests % rate_limit_every == 0:
+            return JSONResponse(
+                {"object": "error", "status": 429, "code": "rate_limited", "message": "Rate limited"},
+                status_code=429,
+                headers={"Retry-After": str(retry_after_seconds)},
+            )
+        app.state.in_flight += 1
+        app.state.max_in_flight = max(app.state.max_in_flight, app.state.in_flight)
+        try:
+            await asyncio.sleep(latency_ms / 1000)
+        finally:
+            app.state.in_flight -= 1
+        return payload
+
+    @app.post("/v1/databases/{database_id}/query")
+    async def query_database(database_id: str, body: dict = Body(default={})):
+        docs = pages()
+        start = int(body.get("start_cursor") or 0)
+        results = docs[start:start + int(body.get("page_size", 100))]
+        return await respond(_listing([_page(doc) for doc in results], start, len(docs)))
+
+    @app.get("/v1/blocks/{block_id}/children")
+    async def block_children(block_id: str, start_cursor: Optional[str] = None, page_size: int = 100):
+        doc = lookup(block_id)
+        if doc is None:
+            return JSONResponse(
+                {"object": "error", "status": 404, "code": "object_not_found", "message": f"No block {block_id}"},
+                status_code=404,
+            )
+        paragraphs = doc.page_content.split("\n\n")
+        start = int(start_cursor or 0)
+        results = [
+            _paragraph(f"{block_id}-{i}", text)
+            for i, text in enumerate(paragraphs[start:start + page_size], start)
+        ]
+        return await respond(_listing(results, start, len(paragraphs)))
+
+    return app
+
+
+async def start_server(app, port: int) -> tuple:
+    """Runs `app` with uvicorn on 127.0.0.1:`port` in this event loop; returns (server, task)."""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            await task
+            raise RuntimeError(f"Server on port {port} failed to start")
+        await asyncio.sleep(0.05)
+    return server, task
+
+
+async def stop_server(server, task):
+    server.should_exit = True
+    await task
@@ -0,0 +1,145 @@
+"""
+Local stand-ins for the Gemini and embeddings clients plus a synthetic Notion
+corpus, used by the load tests so they measure this service rather than
+Google's or Notion's. Latencies are configurable to model the real APIs.
+"""
+import asyncio
+import random
+import zlib
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import List
+import numpy as np
+from langchain_core.documents import Document as SourceDocument
+from db.models import EMBEDDING_DIMENSIONS
+from services.context_cache import ContextCacheManager
+
+TOPICS = 50
+WORDS_PER_TOPIC = 200
+VOCABULARY = [f"term{i}" for i in range(TOPICS * WORDS_PER_TOPIC)]
+
+
+@lru_cache(maxsize=len(VOCABULARY) + 1024)
+def _word_vector(word: str) -> np.ndarray:
+    rng = np.random.default_rng(zlib.crc32(word.encode("utf-8")))
+    return rng.standard_normal(EMBEDDING_DIMENSIONS).astype(np.float32)
+
+
+class FakeEmbeddings:
+    """
+    Bag-of-words embeddings: texts sharing words get similar vectors, so
+    retrieval over the synthetic corpus behaves like it would on real data.
+    """
+
+    def __init__(self, latency_ms: float = 50):
+        self.latency = latency_ms / 1000
+        self.calls = 0
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(EMBEDDING_DIMENSIONS, dtype=np.float32)
+        for word in text.split():
+            vector += _word_vector(word)
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    async def aembed_documents(self, texts: List[str], **kwargs) -> List[List[float]]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self._embed(text)
+
+    def embed_documents(self, texts: List[str], **kwargs) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class FakeGemini:
+    """
+    Answers after `first_token_ms`, then streams `stream_chunks` chunks
+    `chunk_interval_ms` apart. Non-streaming calls take as long as the whole stream.
+    """
+
+    def __init__(self, first_token_ms: float = 300, stream_chunks: int = 20, chunk_interval_ms: float = 20):
+        self.first_token = first_token_ms / 1000
+        self.stream_chunks = stream_chunks
+        self.chunk_interval = chunk_interval_ms / 1000
+        self.calls = 0
+
+    def _chunks(self) -> List[str]:
+        return [f"chunk{i} of a synthetic answer. " for i in range(self.stream_chunks)]
+
+    async def agenerate_content(self, prompt, model_type: str = "fast", **kwargs) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.first_token + self.stream_chunks * self.chunk_interval)
+        return "".join(self._chunks())
+
+    async def astream_content(self, prompt, model_type: str = "fast", **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.first_token)
+        for i, chunk in enumerate(self._chunks()):
+            if i:
+                await asyncio.sleep(self.chunk_interval)
+            yield chunk
+
+    async def aclose(self):
+        pass
+
+
+class FakeClientRegistry:
+    """Drop-in for services.clients.ClientRegistry (context caching off: there is no remote cache)."""
+
+    def __init__(self, gemini: FakeGemini, embeddings: FakeEmbeddings):
+        self.gemini = gemini
+        self.embeddings = embeddings
+        self.context_cache = ContextCacheManager(gemini, enabled=False)
+
+    async def aclose(self):
+        await self.context_cache.aclose()
+
+
+def synthetic_corpus(pages: int, words_per_page: int = 800, revision: int = 0, edit_every: int = 10, seed: int = 0):
+    """
+    Notion-like pages, each drawing most of its words from one topic. Pages
+    whose index is a multiple of `edit_every` get new content and a newer
+    last_edited_time for every `revision`, so later incremental syncs have
+    something to re-embed.
+    """
+    edited = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    docs = []
+    for page in range(pages):
+        page_revision = revision if edit_every and page % edit_every == 0 else 0
+        rng = random.Random(f"{seed}:{page}:{page_revision}")
+        topic = page % TOPICS
+        topic_words = VOCABULARY[topic * WORDS_PER_TOPIC:(topic + 1) * WORDS_PER_TOPIC]
+        words = [
+            rng.choice(topic_words) if rng.random() < 0.8 else rng.choice(VOCABULARY)
+            for _ in range(words_per_page)
+        ]
+        paragraphs = [" ".join(words[i:i + 80]) for i in range(0, len(words), 80)]
+        docs.append(SourceDocument(
+            page_content="\n\n".join(paragraphs),
+            metadata={
+                "id": f"synthetic-{page}",
+                "title": f"Synthetic page {page} (topic {topic})",
+                "tags": [f"topic{topic}"],
+                "last_edited_time": (edited + timedelta(minutes=page_revision)).isoformat(),
+            }
+        ))
+    return docs
+
+
+def synthetic_queries(count: int, words: int = 6, seed: int = 0) -> List[str]:
+    """Queries built from one topic's vocabulary each, all distinct (no cache hits)."""
+    rng = random.Random(f"queries:{seed}")
+    queries = []
+    for i in range(count):
+        topic = rng.randrange(TOPICS)
+        topic_words = VOCABULARY[topic * WORDS_PER_TOPIC:(topic + 1) * WORDS_PER_TOPIC]
+        queries.append(" ".join(rng.sample(topic_words, words)) + f" q{i}")
+    return queries
@@ -0,0 +1,283 @@
+"""
+Load test: end-to-end latency and throughput of the API at fixed concurrency.
+
+Serves the real FastAPI app (uvicorn, loopback HTTP) against DATABASE_URL with
+Gemini and the embeddings client replaced by the local fakes in
+benchmarks/fakes.py and Notion by benchmarks/fake_notion.py, so results depend
+on this code base and Postgres only. The knowledge base is first seeded by a
+full sync of a synthetic corpus, then each scenario is driven by
+`--concurrency` workers:
+
+- chat / chat_stream: POST /api/chat(/stream), `--turns` turns per conversation
+  (chat_stream also reports time to the first token)
+- kb_query: POST /api/knowledge-base/query
+- kb_query_batch: POST /api/knowledge-base/query/batch with `--batch-size`
+  queries per request (retrieval only; reports queries per second too)
+- sync: incremental syncs after editing every `--edit-every`th page
+
+p50/p95/p99 latency, RPS and error counts are written as JSON with the current
+git commit, for comparison across commits. Use a scratch database: the full
+sync replaces the knowledge base and benchmark conversations are left behind.
+Syncs still honour EMBEDDING_REQUESTS_PER_MINUTE and NOTION_REQUESTS_PER_SECOND;
+raise them to measure the pipeline rather than the production rate limits.
+
+    cd backend && DATABASE_URL=postgresql+asyncpg://...scratch... \\
+        EMBEDDING_REQUESTS_PER_MINUTE=100000 NOTION_REQUESTS_PER_SECOND=1000 \\
+        python -m benchmarks.load_test --pages 2000 --concurrency 32 --requests 2000 --output load.json
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import subprocess
+import sys
+import os
+import time
+from datetime import datetime, timezone
+import httpx
+from services import clients as client_registry
+from benchmarks import fake_notion
+from benchmarks.fake_notion import start_server, stop_server
+from benchmarks.fakes import FakeClientRegistry, FakeEmbeddings, FakeGemini, synthetic_corpus, synthetic_queries
+from benchmarks.common import benchmark_parser, percentile, write_report
+
+SCENARIOS = ("chat", "chat_stream", "kb_query", "kb_query_batch", "sync")
+
+
+def _summary(latencies: list, elapsed: float, errors: int, extra: dict = None) -> dict:
+    summary = {"requests": len(latencies) + errors, "errors": errors, "rps": round(len(latencies) / elapsed, 2)}
+    if latencies:
+        summary.update({
+            "mean_ms": round(statistics.mean(latencies), 1),
+            "p50_ms": round(percentile(latencies, 50), 1),
+            "p95_ms": round(percentile(latencies, 95), 1),
+            "p99_ms": round(percentile(latencies, 99), 1),
+        })
+    for name, values in (extra or {}).items():
+        if values:
+            summary[f"{name}_p50_ms"] = round(percentile(values, 50), 1)
+            summary[f"{name}_p95_ms"] = round(percentile(values, 95), 1)
+            summary[f"{name}_p99_ms"] = round(percentile(values, 99), 1)
+    return summary
+
+
+async def _drive(requests: int, concurrency: int, call) -> dict:
+    """
+    Runs `call(state, i)` for i in range(requests) on `concurrency` workers;
+    `state` is per worker (e.g. its conversation). `call` may return the
+    perf_counter time of the first streamed token.
+    """
+    latencies, ttft, errors = [], [], []
+    next_request = iter(range(requests))
+
+    async def worker():
+        state = {}
+        for i in next_request:
+            started = time.perf_counter()
+            try:
+                first_token = await call(state, i)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+            if first_token is not None:
+                ttft.append((first_token - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    summary = _summary(latencies, elapsed, len(errors), {"first_token": ttft})
+    if errors:
+        summary["sample_errors"] = sorted(set(errors))[:5]
+    return summary
+
+
+def _chat_call(http: httpx.AsyncClient, queries: list, turns: int, use_rag: bool):
+    async def call(state: dict, i: int):
+        if state.get("turns", 0) >= turns:
+            state.clear()
+        response = await http.post("/api/chat", json={
+            "message": queries[i % len(queries)],
+            "conversation_id": state.get("conversation_id"),
+            "use_rag": use_rag
+        })
+        response.raise_for_status()
+        state["conversation_id"] = response.json()["conversation_id"]
+        state["turns"] = state.get("turns", 0) + 1
+    return call
+
+
+def _chat_stream_call(http: httpx.AsyncClient, queries: list, turns: int, use_rag: bool):
+    async def call(state: dict, i: int):
+        if state.get("turns", 0) >= turns:
+            state.clear()
+        first_token, event = None, None
+        async with http.stream("POST", "/api/chat/stream", json={
+            "message": queries[i % len(queries)],
+            "conversation_id": state.get("conversation_id"),
+            "use_rag": use_rag
+        }) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                    if event == "token" and first_token is None:
+                        first_token = time.perf_counter()
+                elif line.startswith("data: "):
+                    data = json.loads(line[len("data: "):])
+                    if event == "conversation":
+                        state["conversation_id"] = data["conversation_id"]
+                    elif event == "error":
+                        raise RuntimeError(data["detail"])
+        state["turns"] = state.get("turns", 0) + 1
+        return first_token
+    return call
+
+
+def _kb_query_call(http: httpx.AsyncClient, queries: list):
+    async def call(state: dict, i: int):
+        response = await http.post("/api/knowledge-base/query", json={"query": queries[i % len(queries)]})
+        response.raise_for_status()
+    return call
+
+
+def _kb_query_batch_call(http: httpx.AsyncClient, queries: list, batch_size: int):
+    async def call(state: dict, i: int):
+        batch = [queries[(i * batch_size + j) % len(queries)] for j in range(batch_size)]
+        response = await http.post("/api/knowledge-base/query/batch", json={"queries": batch})
+        response.raise_for_status()
+    return call
+
+
+async def _run_sync(http: httpx.AsyncClient, mode: str, poll_interval: float = 0.2) -> dict:
+    started = time.perf_counter()
+    response = await http.post("/api/knowledge-base/sync", params={"mode": mode})
+    response.raise_for_status()
+    job_id = response.json()["job_id"]
+    while True:
+        await asyncio.sleep(poll_interval)
+        job = (await http.get(f"/api/knowledge-base/sync/{job_id}")).json()
+        if job["status"] in ("succeeded", "failed"):
+            break
+    elapsed = time.perf_counter() - started
+    if job["status"] != "succeeded":
+        raise RuntimeError(f"Sync {job_id} failed: {job.get('errors')}")
+    result = job["result"]
+    return {
+        "seconds": round(elapsed, 2),
+        "documents": result["documents_loaded"],
+        "chunks_embedded": result["chunks_embedded"],
+        "documents_per_second": round(result["documents_loaded"] / elapsed, 1),
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def benchmark(args) -> dict:
+    corpus = {"docs": synthetic_corpus(args.pages, args.words_per_page, edit_every=args.edit_every)}
+    notion, notion_task = await start_server(
+        fake_notion.create_app(lambda: corpus["docs"], latency_ms=args.notion_latency_ms), args.port + 1
+    )
+
+    # Swap the external services before the app's lifespan builds its registry
+    os.environ.update({
+        "NOTION_BASE_URL": f"http://127.0.0.1:{args.port + 1}",
+        "NOTION_TOKEN": "fake",
+        "NOTION_KNOWLEDGE_DATABASE_ID": "synthetic",
+    })
+    gemini = FakeGemini(args.llm_first_token_ms, args.llm_stream_chunks, args.llm_chunk_interval_ms)
+    embeddings = FakeEmbeddings(args.embedding_latency_ms)
+    client_registry._registry = FakeClientRegistry(gemini, embeddings)
+
+    from main import app
+
+    server, server_task = await start_server(app, args.port)
+
+    report = {
+        "commit": _git_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "config": vars(args),
+        "scenarios": {},
+    }
+    queries = synthetic_queries(args.distinct_queries or args.requests * args.batch_size)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=300, limits=limits) as http:
+            if not args.skip_seed:
+                print(f"Seeding {args.pages} pages (full sync)...", file=sys.stderr)
+                report["seed"] = await _run_sync(http, "full")
+                print(json.dumps({"seed": report["seed"]}), file=sys.stderr)
+
+            for scenario in args.scenarios:
+                print(f"Running {scenario}...", file=sys.stderr)
+                if scenario == "sync":
+                    runs = []
+                    for revision in range(1, args.sync_runs + 1):
+                        corpus["docs"] = synthetic_corpus(
+                            args.pages, args.words_per_page, revision=revision, edit_every=args.edit_every
+                        )
+                        runs.append(await _run_sync(http, "incremental"))
+                    result = {
+                        "runs": runs,
+                        **_summary([run["seconds"] * 1000 for run in runs], sum(run["seconds"] for run in runs), 0),
+                    }
+                else:
+                    call = {
+                        "chat": lambda: _chat_call(http, queries, args.turns, args.rag),
+                        "chat_stream": lambda: _chat_stream_call(http, queries, args.turns, args.rag),
+                        "kb_query": lambda: _kb_query_call(http, queries),
+                        "kb_query_batch": lambda: _kb_query_batch_call(http, queries, args.batch_size),
+                    }[scenario]()
+                    if args.warmup:
+                        await _drive(args.warmup, args.concurrency, call)
+                    result = await _drive(args.requests, args.concurrency, call)
+                    if scenario == "kb_query_batch":
+                        result["queries_per_second"] = round(result["rps"] * args.batch_size, 2)
+                report["scenarios"][scenario] = result
+                print(json.dumps({scenario: result}), file=sys.stderr)
+    finally:
+        await stop_server(server, server_task)
+        await stop_server(notion, notion_task)
+
+    report["fake_calls"] = {"gemini": gemini.calls, "embeddings": embeddings.calls}
+    return report
+
+
+def main():
+    parser = benchmark_parser(__doc__)
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="Unreported requests before each scenario")
+    parser.add_argument("--distinct-queries", type=int, default=0,
+                        help="Size of the query pool (0 = every request distinct, i.e. no cache hits)")
+    parser.add_argument("--batch-size", type=int, default=20, help="Queries per kb_query_batch request")
+    parser.add_argument("--turns", type=int, default=5, help="Chat turns per conversation")
+    parser.add_argument("--rag", action=argparse.BooleanOptionalAction, default=True, help="use_rag for chat scenarios")
+    parser.add_argument("--pages", type=int, default=1000, help="Synthetic corpus size")
+    parser.add_argument("--words-per-page", type=int, default=800)
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse the knowledge base already in the database")
+    parser.add_argument("--sync-runs", type=int, default=3)
+    parser.add_argument("--edit-every", type=int, default=10, help="Incremental syncs edit every Nth page")
+    parser.add_argument("--llm-first-token-ms", type=float, default=300)
+    parser.add_argument("--llm-stream-chunks", type=int, default=20)
+    parser.add_argument("--llm-chunk-interval-ms", type=float, default=20)
+    parser.add_argument("--notion-latency-ms", type=float, default=100)
+    parser.add_argument("--embedding-latency-ms", type=float, default=50)
+    parser.add_argument("--port", type=int, default=8765, help="API port (the fake Notion server uses the next one)")
+    args = parser.parse_args()
+
+    report = asyncio.run(benchmark(args))
+    print(json.dumps(report["scenarios"], indent=2))
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
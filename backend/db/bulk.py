@@ -0,0 +1,79 @@
+from typing import AsyncIterator, Iterable, List
+from datetime import datetime, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
+import json
+import struct
+
+# Binary COPY (https://www.postgresql.org/docs/current/sql-copy.html#id-1.9.3.55.9.4)
+# for the embeddings table. Rows are encoded here rather than through asyncpg
+# codecs, so pgvector's binary vector format needs no per-connection type
+# registration.
+_COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+_COPY_TRAILER = struct.pack(">h", -1)
+_PG_EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+EMBEDDING_COPY_COLUMNS = ["id", "document_id", "chunk_text", "chunk_index", "embedding", "metadata", "created_at"]
+COPY_ROWS_PER_CHUNK = 1000
+
+
+def _field(data: bytes) -> bytes:
+    return struct.pack(">i", len(data)) + data
+
+
+def encode_vector(vector) -> bytes:
+    """pgvector binary format: int16 dim, int16 unused, dim x float4 (big endian)."""
+    dim = len(vector)
+    return struct.pack(f">HH{dim}f", dim, 0, *vector)
+
+
+def encode_timestamptz(value: datetime) -> bytes:
+    delta = value - _PG_EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+    return struct.pack(">q", micros)
+
+
+def encode_jsonb(value) -> bytes:
+    return b"\x01" + json.dumps(value).encode("utf-8")
+
+
+def encode_embedding_row(row: dict) -> bytes:
+    """Encodes one embeddings row (keys as in EMBEDDING_COPY_COLUMNS, metadata as `meta`)."""
+    created_at = row.get("created_at") or datetime.now(timezone.utc)
+    return b"".join((
+        struct.pack(">h", len(EMBEDDING_COPY_COLUMNS)),
+        _field(row["id"].bytes),
+        _field(row["document_id"].bytes),
+        _field(row["chunk_text"].encode("utf-8")),
+        _field(struct.pack(">i", row["chunk_index"])),
+        _field(encode_vector(row["embedding"])),
+        _field(encode_jsonb(row.get("meta") or {})),
+        _field(encode_timestamptz(created_at)),
+    ))
+
+
+async def _copy_stream(rows: Iterable[dict]) -> AsyncIterator[bytes]:
+    buffer: List[bytes] = [_COPY_HEADER]
+    for row in rows:
+        buffer.append(encode_embedding_row(row))
+        if len(buffer) >= COPY_ROWS_PER_CHUNK:
+            yield b"".join(buffer)
+            buffer = []
+    buffer.append(_COPY_TRAILER)
+    yield b"".join(buffer)
+
+
+async def copy_embeddings(session: AsyncSession, rows: Iterable[dict]) -> None:
+    """
+    Bulk-inserts embeddings rows with binary COPY on the session's connection,
+    inside its current transaction. Pending ORM changes are flushed first so
+    referenced documents exist.
+    """
+    await session.flush()
+    conn = await session.connection()
+    raw = await conn.get_raw_connection()
+    await raw.driver_connection.copy_to_table(
+        "embeddings",
+        source=_copy_stream(rows),
+        columns=EMBEDDING_COPY_COLUMNS,
+        format="binary",
+    )
@@ -0,0 +1,284 @@
+from typing import List, Optional
+from dataclasses import dataclass
+from datetime import datetime
+from sqlalchemy import Select, Float, Text, ColumnElement, select, func, cast, column, literal, literal_column, true
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+from pgvector.sqlalchemy import Vector, HALFVEC, BIT
+from db.models import Document, Embedding, FULLTEXT_CONFIG, EMBEDDING_DIMENSIONS
+from db.vector_index import VECTOR_RERANK_FACTOR
+from uuid import UUID
+import os
+import json
+
+# Hybrid retrieval: pgvector cosine search and Postgres full-text search over
+# embeddings, fused with reciprocal-rank fusion (RRF):
+#   score(chunk) = sum over rankers of weight / (RRF_K + rank)
+# A lexical weight of 0 skips full-text search entirely (vector-only).
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "4"))
+# Largest k a request may ask for (it also bounds LIMIT and the candidate pool).
+RAG_MAX_K = int(os.getenv("RAG_MAX_K", "50"))
+HYBRID_VECTOR_WEIGHT = float(os.getenv("HYBRID_VECTOR_WEIGHT", "1.0"))
+HYBRID_LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", "1.0"))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+# Candidates taken from each ranker before fusion (pgvector's default
+# hnsw.ef_search is 40, so the ANN scan returns at most that many rows).
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "40"))
+
+
+@dataclass
+class SearchFilters:
+    """
+    Restricts retrieval to chunks of matching documents. All given criteria
+    must hold. `metadata` is matched by JSONB containment on documents.metadata
+    (GIN-indexed), e.g. {"tags": ["pricing"]} or {"status": "Published"}; the
+    date range applies to the page's Notion last-edited time.
+    """
+    metadata: Optional[dict] = None
+    title: Optional[str] = None  # case-insensitive substring
+    updated_after: Optional[datetime] = None
+    updated_before: Optional[datetime] = None
+    document_ids: Optional[List[UUID]] = None
+
+    def is_empty(self) -> bool:
+        return not (
+            self.metadata or self.title or self.updated_after or self.updated_before
+            or self.document_ids is not None
+        )
+
+    def cache_key(self) -> str:
+        """Stable representation, used to partition cached answers."""
+        if self.is_empty():
+            return ""
+        values = {
+            "metadata": self.metadata,
+            "title": self.title,
+            "updated_after": self.updated_after,
+            "updated_before": self.updated_before,
+            "document_ids": sorted(str(i) for i in self.document_ids) if self.document_ids is not None else None,
+        }
+        return json.dumps(values, sort_keys=True, default=str)
+
+
+def filter_clauses(filters: Optional[SearchFilters]) -> list:
+    """WHERE clauses on Embedding for the given filters (empty if none)."""
+    if filters is None or filters.is_empty():
+        return []
+
+    clauses = []
+    if filters.document_ids is not None:
+        clauses.append(Embedding.document_id.in_(filters.document_ids))
+
+    document_clauses = []
+    if filters.metadata:
+        document_clauses.append(Document.meta.op("@>", is_comparison=True)(literal(filters.metadata, JSONB)))
+    if filters.title:
+        document_clauses.append(Document.title.icontains(filters.title, autoescape=True))
+    if filters.updated_after:
+        document_clauses.append(Document.source_updated_at >= filters.updated_after)
+    if filters.updated_before:
+        document_clauses.append(Document.source_updated_at < filters.updated_before)
+    if document_clauses:
+        # Semi-join: the planner can start from the GIN index on documents
+        # when the filter is selective, or scan the ANN index otherwise
+        clauses.append(Embedding.document_id.in_(select(Document.id).where(*document_clauses)))
+    return clauses
+
+
+def _index_distance(query_embedding, precision: str):
+    """The ORDER BY expression served by the ANN index of the given precision."""
+    if not isinstance(query_embedding, ColumnElement):
+        query_embedding = literal(query_embedding, Vector(EMBEDDING_DIMENSIONS))
+    if precision == "halfvec":
+        halfvec = HALFVEC(EMBEDDING_DIMENSIONS)
+        return cast(Embedding.embedding, halfvec).op("<=>", return_type=Float)(cast(query_embedding, halfvec))
+    if precision == "binary":
+        bit = BIT(EMBEDDING_DIMENSIONS)
+        return cast(func.binary_quantize(Embedding.embedding), bit).op("<~>", return_type=Float)(
+            cast(func.binary_quantize(query_embedding), bit)
+        )
+    return Embedding.embedding.cosine_distance(query_embedding)
+
+
+def _nearest(query_embedding, limit: int, clauses: list, precision: str):
+    """
+    Subquery of the `limit` nearest chunks as (id, distance), with exact
+    cosine distances. `query_embedding` is a vector or, in batch searches,
+    the query row's vector column. Quantized indexes over-fetch VECTOR_RERANK_FACTOR times
+    the candidates and re-rank them with the full-precision vectors.
+    """
+    # correlate_except: a query row referenced from an enclosing LATERAL
+    # stays in the outer FROM rather than being joined in again here
+    distance = Embedding.embedding.cosine_distance(query_embedding)
+    if precision == "full":
+        return (
+            select(Embedding.id, distance.label("distance"))
+            .where(*clauses)
+            .order_by(distance)
+            .limit(limit)
+            .correlate_except(Embedding)
+            .subquery()
+        )
+
+    candidates = (
+        select(Embedding.id, Embedding.embedding)
+        .where(*clauses)
+        .order_by(_index_distance(query_embedding, precision))
+        .limit(limit * VECTOR_RERANK_FACTOR)
+        .correlate_except(Embedding)
+        .subquery()
+    )
+    exact = candidates.c.embedding.cosine_distance(query_embedding)
+    return (
+        select(candidates.c.id, exact.label("distance"))
+        .order_by(exact)
+        .limit(limit)
+        .correlate_except(candidates)
+        .subquery()
+    )
+
+
+def vector_search_statement(
+    query_embedding: List[float],
+    k: int,
+    filters: Optional[SearchFilters] = None,
+    precision: str = "full"
+) -> Select:
+    """Plain ANN search: the k nearest (matching) chunks by cosine distance."""
+    clauses = filter_clauses(filters)
+    if not clauses and precision == "full":
+        return select(Embedding).order_by(Embedding.embedding.cosine_distance(query_embedding)).limit(k)
+
+    # Filtered scans run with iterative index scans (see apply_search_params),
+    # whose relaxed ordering is corrected by re-sorting the k hits
+    hits = _nearest(query_embedding, k, clauses, precision)
+    return select(Embedding).join(hits, Embedding.id == hits.c.id).order_by(hits.c.distance)
+
+
+def _fused_hits(
+    query,
+    query_embedding,
+    k: int,
+    vector_weight: float,
+    lexical_weight: float,
+    rrf_k: int,
+    candidates: int,
+    clauses: list,
+    precision: str,
+) -> Select:
+    """
+    The k best chunks as (id, score): the ANN scan and the GIN full-text scan
+    run as two subqueries whose ranks are fused with RRF. Each scan keeps its
+    own index: the candidate LIMITs are applied inside the subqueries, before
+    the FULL JOIN, and filters are applied inside both.
+    """
+    candidates = max(candidates, k)
+
+    vector_hits = _nearest(query_embedding, candidates, clauses, precision)
+    vector_ranked = select(
+        vector_hits.c.id,
+        func.row_number().over(order_by=vector_hits.c.distance).label("rank")
+    ).subquery("vector_ranked")
+
+    tsquery = func.websearch_to_tsquery(literal_column(f"'{FULLTEXT_CONFIG}'::regconfig"), query)
+    text_rank = func.ts_rank_cd(Embedding.chunk_tsv, tsquery)
+    lexical_hits = (
+        select(Embedding.id, text_rank.label("text_rank"))
+        .where(Embedding.chunk_tsv.op("@@", is_comparison=True)(tsquery), *clauses)
+        .order_by(text_rank.desc())
+        .limit(candidates)
+        .correlate_except(Embedding)
+        .subquery()
+    )
+    lexical_ranked = select(
+        lexical_hits.c.id,
+        func.row_number().over(order_by=lexical_hits.c.text_rank.desc()).label("rank")
+    ).subquery("lexical_ranked")
+
+    score = (
+        func.coalesce(literal(float(vector_weight)) / (rrf_k + vector_ranked.c.rank), 0.0)
+        + func.coalesce(literal(float(lexical_weight)) / (rrf_k + lexical_ranked.c.rank), 0.0)
+    ).label("score")
+    return (
+        select(func.coalesce(vector_ranked.c.id, lexical_ranked.c.id).label("id"), score)
+        .select_from(vector_ranked.join(lexical_ranked, vector_ranked.c.id == lexical_ranked.c.id, full=True))
+        .order_by(score.desc())
+        .limit(k)
+    )
+
+
+def hybrid_search_statement(
+    query: str,
+    query_embedding: List[float],
+    k: int,
+    vector_weight: float = HYBRID_VECTOR_WEIGHT,
+    lexical_weight: float = HYBRID_LEXICAL_WEIGHT,
+    rrf_k: int = HYBRID_RRF_K,
+    candidates: int = HYBRID_CANDIDATES,
+    filters: Optional[SearchFilters] = None,
+    precision: str = "full",
+) -> Select:
+    """
+    One statement that runs vector and full-text search, fuses their ranks
+    with RRF (see _fused_hits) and returns (Embedding, score) rows.
+    """
+    fused = _fused_hits(
+        query, query_embedding, k, vector_weight, lexical_weight, rrf_k, candidates,
+        filter_clauses(filters), precision
+    ).subquery()
+
+    return (
+        select(Embedding, fused.c.score)
+        .join(fused, Embedding.id == fused.c.id)
+        .order_by(fused.c.score.desc())
+    )
+
+
+def batch_search_statement(
+    queries: List[str],
+    query_embeddings: List[List[float]],
+    k: int,
+    vector_weight: float = HYBRID_VECTOR_WEIGHT,
+    lexical_weight: float = HYBRID_LEXICAL_WEIGHT,
+    rrf_k: int = HYBRID_RRF_K,
+    candidates: int = HYBRID_CANDIDATES,
+    filters: Optional[SearchFilters] = None,
+    precision: str = "full",
+) -> Select:
+    """
+    The top-k lists of many queries in one statement. The queries and their
+    vectors are unnested into rows and each row is searched by a LATERAL
+    subquery, the same hybrid (or, with a lexical weight of 0, vector-only)
+    search as the single-query statements, so every ANN scan still uses the
+    index. Returns (position, Embedding) rows ordered by query position
+    (1-based) and rank.
+
+    The vectors are bound as text and cast to vector[] once, before the
+    unnest: casting inside the LATERAL would re-parse every vector for each
+    candidate scored.
+    """
+    vectors = ["[" + ",".join(str(float(x)) for x in vector) + "]" for vector in query_embeddings]
+    batch = func.unnest(
+        literal(list(queries), ARRAY(Text)),
+        cast(literal(vectors, ARRAY(Text)), ARRAY(Vector(EMBEDDING_DIMENSIONS)))
+    ).table_valued(
+        column("query", Text), column("embedding", Vector(EMBEDDING_DIMENSIONS)), with_ordinality="position"
+    ).render_derived("batch")
+    query_embedding = batch.c.embedding
+    clauses = filter_clauses(filters)
+
+    if lexical_weight > 0:
+        hits = _fused_hits(
+            batch.c.query, query_embedding, k, vector_weight, lexical_weight, rrf_k, candidates, clauses, precision
+        ).lateral("hits")
+        rank = hits.c.score.desc()
+    else:
+        hits = select(_nearest(query_embedding, k, clauses, precision)).lateral("hits")
+        rank = hits.c.distance
+
+    return (
+        select(batch.c.position, Embedding)
+        .select_from(batch)
+        .join(hits, true())
+        .join(Embedding, Embedding.id == hits.c.id)
+        .order_by(batch.c.position, rank)
+    )
@@ -8,6 +8,8 @@ CREATE TABLE IF NOT EXISTS documents (
     title TEXT,
     content TEXT NOT NULL,
     metadata JSONB DEFAULT '{}',
+    content_hash VARCHAR(64),
+    source_updated_at TIMESTAMP WITH TIME ZONE,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
@@ -21,7 +23,9 @@ CREATE TABLE IF NOT EXISTS embeddings (
     chunk_index INTEGER NOT NULL,
     embedding vector(768) NOT NULL,
     metadata JSONB DEFAULT '{}',
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    -- Full-text search vector for hybrid (lexical + vector) retrieval
+    chunk_tsv tsvector GENERATED ALWAYS AS (to_tsvector('english', chunk_text)) STORED
 );
 
 -- Conversations table: Store chat sessions
@@ -42,13 +46,49 @@ CREATE TABLE IF NOT EXISTS messages (
     metadata JSONB DEFAULT '{}'
 );
 
+-- Sync jobs table: Background knowledge-base sync runs and their progress
+CREATE TABLE IF NOT EXISTS sync_jobs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    mode VARCHAR(20) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'succeeded', 'failed')),
+    phase VARCHAR(50) NOT NULL DEFAULT 'queued',
+    documents_total INTEGER,
+    documents_processed INTEGER NOT NULL DEFAULT 0,
+    chunks_embedded INTEGER NOT NULL DEFAULT 0,
+    errors JSONB DEFAULT '[]',
+    result JSONB,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP WITH TIME ZONE,
+    heartbeat_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Knowledge base state: single row whose version is bumped by every sync
+-- that changes the knowledge base (used to invalidate cached answers)
+CREATE TABLE IF NOT EXISTS knowledge_base_state (
+    id INTEGER PRIMARY KEY DEFAULT 1,
+    version INTEGER NOT NULL DEFAULT 0,
+    last_sync_started_at TIMESTAMP WITH TIME ZONE,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Indexes for performance
 CREATE INDEX IF NOT EXISTS idx_embeddings_document_id ON embeddings(document_id);
+-- Approximate nearest neighbour index for cosine similarity search
+-- (managed at runtime by db/vector_index.py, which can switch it to IVFFlat)
+CREATE INDEX IF NOT EXISTS idx_embeddings_embedding_ann ON embeddings
+    USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+CREATE INDEX IF NOT EXISTS idx_embeddings_chunk_tsv ON embeddings USING GIN (chunk_tsv);
 CREATE INDEX IF NOT EXISTS idx_documents_source_id ON documents(source_id);
 CREATE INDEX IF NOT EXISTS idx_documents_metadata ON documents USING GIN (metadata);
 CREATE INDEX IF NOT EXISTS idx_messages_conversation_id ON messages(conversation_id);
 CREATE INDEX IF NOT EXISTS idx_messages_created_at ON messages(created_at);
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_recent ON messages(conversation_id, created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_conversations_created_at ON conversations(created_at);
+CREATE INDEX IF NOT EXISTS idx_sync_jobs_created_at ON sync_jobs(created_at);
+-- At most one queued/running sync job at a time, across all workers
+CREATE UNIQUE INDEX IF NOT EXISTS uq_sync_jobs_active ON sync_jobs ((true))
+    WHERE status IN ('queued', 'running');
 
 -- Trigger to auto-update updated_at timestamp
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -0,0 +1,25 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+# Idempotent DDL applied at startup after `create_all`, which only creates
+# missing tables. Keep these in sync with init.sql, and append new statements
+# rather than editing old ones.
+SCHEMA_UPGRADES = [
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS source_updated_at TIMESTAMP WITH TIME ZONE",
+    # At most one queued/running sync job at a time, across all workers
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_sync_jobs_active ON sync_jobs ((true)) "
+    "WHERE status IN ('queued', 'running')",
+    "CREATE INDEX IF NOT EXISTS idx_messages_conversation_recent ON messages (conversation_id, created_at DESC)",
+    # Full-text side of hybrid retrieval (adding the column rewrites the table once)
+    "ALTER TABLE embeddings ADD COLUMN IF NOT EXISTS chunk_tsv tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('english', chunk_text)) STORED",
+    "CREATE INDEX IF NOT EXISTS idx_embeddings_chunk_tsv ON embeddings USING GIN (chunk_tsv)",
+    "ALTER TABLE knowledge_base_state ADD COLUMN IF NOT EXISTS last_sync_started_at TIMESTAMP WITH TIME ZONE",
+]
+
+
+async def apply_schema_upgrades(conn: AsyncConnection) -> None:
+    """Brings an existing database up to the current schema."""
+    for statement in SCHEMA_UPGRADES:
+        await conn.execute(text(statement))
@@ -1,11 +1,16 @@
-from sqlalchemy import Column, String, Text, Integer, ForeignKey, DateTime, CheckConstraint
-from sqlalchemy.dialects.postgresql import UUID, JSONB
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, Text, Integer, ForeignKey, DateTime, CheckConstraint, Index, Computed
+from sqlalchemy.dialects.postgresql import UUID, JSONB, TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from pgvector.sqlalchemy import Vector
 from datetime import datetime, timezone
 import uuid
 from db.database import Base
 
+# Text search configuration of embeddings.chunk_tsv; queries must use the same one.
+FULLTEXT_CONFIG = "english"
+# Gemini text-embedding-004 output size.
+EMBEDDING_DIMENSIONS = 768
+
 class Document(Base):
     __tablename__ = "documents"
 
@@ -14,6 +19,8 @@ class Document(Base):
     title = Column(Text)
     content = Column(Text, nullable=False)
     meta = Column("metadata", JSONB, default={})
+    content_hash = Column(String(64))  # sha256 of content, used by incremental sync
+    source_updated_at = Column(DateTime(timezone=True))  # Notion last_edited_time
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
     updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
 
@@ -26,12 +33,18 @@ class Embedding(Base):
     document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), nullable=False, index=True)
     chunk_text = Column(Text, nullable=False)
     chunk_index = Column(Integer, nullable=False)
-    embedding = Column(Vector(768), nullable=False)
+    embedding = Column(Vector(EMBEDDING_DIMENSIONS), nullable=False)
     meta = Column("metadata", JSONB, default={})
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    # Lexical side of hybrid search; maintained by Postgres, never loaded by default
+    chunk_tsv = deferred(Column(TSVECTOR, Computed(f"to_tsvector('{FULLTEXT_CONFIG}', chunk_text)", persisted=True)))
 
     document = relationship("Document", back_populates="embeddings")
 
+    __table_args__ = (
+        Index("idx_embeddings_chunk_tsv", "chunk_tsv", postgresql_using="gin"),
+    )
+
 class Conversation(Base):
     __tablename__ = "conversations"
 
@@ -56,4 +69,37 @@ class Message(Base):
 
     __table_args__ = (
         CheckConstraint("role IN ('user', 'assistant', 'system')", name="check_role"),
+        # Recent-window lookups: WHERE conversation_id = ? ORDER BY created_at DESC LIMIT n
+        Index("idx_messages_conversation_recent", "conversation_id", created_at.desc()),
+    )
+
+class SyncJob(Base):
+    __tablename__ = "sync_jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    mode = Column(String(20), nullable=False)
+    status = Column(String(20), nullable=False, default="queued")
+    phase = Column(String(50), nullable=False, default="queued")
+    documents_total = Column(Integer)
+    documents_processed = Column(Integer, nullable=False, default=0)
+    chunks_embedded = Column(Integer, nullable=False, default=0)
+    errors = Column(JSONB, default=list)
+    result = Column(JSONB)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), index=True)
+    started_at = Column(DateTime(timezone=True))
+    heartbeat_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        CheckConstraint("status IN ('queued', 'running', 'succeeded', 'failed')", name="check_sync_job_status"),
     )
+
+class KnowledgeBaseState(Base):
+    """Single-row table; `version` is bumped by every sync that changes the KB."""
+    __tablename__ = "knowledge_base_state"
+
+    id = Column(Integer, primary_key=True, default=1)
+    version = Column(Integer, nullable=False, default=0)
+    # Start of the last sync that loaded every page; later syncs skip pages last edited before it
+    last_sync_started_at = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
@@ -0,0 +1,164 @@
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from db.models import EMBEDDING_DIMENSIONS
+import os
+
+# Approximate nearest neighbour index on embeddings.embedding (cosine distance).
+# HNSW is the default: it can be built on an empty table and keeps good recall
+# as rows are added. IVFFlat builds faster and is smaller, but its lists are
+# trained on the rows present at build time, so build it after a sync.
+VECTOR_INDEX_NAME = "idx_embeddings_embedding_ann"
+VECTOR_INDEX_METHOD = os.getenv("VECTOR_INDEX_METHOD", "hnsw")
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+IVFFLAT_LISTS = int(os.getenv("IVFFLAT_LISTS", "0"))  # 0 = derive from row count
+# Iterative index scans (pgvector >= 0.8) for filtered searches: the index
+# keeps scanning until enough rows pass the filter instead of returning fewer
+# than k. "off" disables them (older pgvector).
+VECTOR_ITERATIVE_SCAN = os.getenv("VECTOR_ITERATIVE_SCAN", "relaxed_order")
+# Precision of the vectors stored in the index. The table always keeps the
+# full float32 vectors, so quantized indexes are expression indexes and their
+# candidates are re-ranked at full precision:
+#   full    - vector, cosine (4 bytes per dimension)
+#   halfvec - float16 copy, cosine (2 bytes per dimension)
+#   binary  - sign bits, Hamming distance (1 bit per dimension)
+VECTOR_INDEX_PRECISION = os.getenv("VECTOR_INDEX_PRECISION", "full")
+# Quantized searches fetch this many times more candidates for re-ranking.
+VECTOR_RERANK_FACTOR = int(os.getenv("VECTOR_RERANK_FACTOR", "4"))
+
+VECTOR_INDEX_METHODS = ("hnsw", "ivfflat")
+VECTOR_INDEX_PRECISIONS = ("full", "halfvec", "binary")
+
+_INDEX_KEYS = {
+    "full": "embedding vector_cosine_ops",
+    "halfvec": f"(embedding::halfvec({EMBEDDING_DIMENSIONS})) halfvec_cosine_ops",
+    "binary": f"(binary_quantize(embedding)::bit({EMBEDDING_DIMENSIONS})) bit_hamming_ops",
+}
+
+
+async def _suggested_ivfflat_lists(conn: AsyncConnection) -> int:
+    """pgvector guidance: rows / 1000 up to 1M rows, sqrt(rows) above."""
+    rows = await conn.scalar(text("SELECT count(*) FROM embeddings"))
+    if rows > 1_000_000:
+        return int(rows ** 0.5)
+    return max(rows // 1000, 1)
+
+
+async def get_vector_index_method(conn: AsyncConnection) -> Optional[str]:
+    """Returns the access method of the current ANN index, or None if missing."""
+    config = await get_vector_index_config(conn)
+    return config["method"] if config else None
+
+
+async def get_vector_index_config(conn: AsyncConnection) -> Optional[dict]:
+    """Returns {"method", "precision"} of the current ANN index, or None if missing."""
+    row = (await conn.execute(text(
+        """
+        SELECT am.amname, pg_get_indexdef(c.oid)
+        FROM pg_class c
+        JOIN pg_am am ON am.oid = c.relam
+        WHERE c.relname = :name AND c.relkind = 'i'
+        """
+    ), {"name": VECTOR_INDEX_NAME})).first()
+    if row is None:
+        return None
+    method, definition = row
+    if "halfvec_cosine_ops" in definition:
+        precision = "halfvec"
+    elif "bit_hamming_ops" in definition:
+        precision = "binary"
+    else:
+        precision = "full"
+    return {"method": method, "precision": precision}
+
+
+async def ensure_vector_index(
+    conn: AsyncConnection,
+    method: str = VECTOR_INDEX_METHOD,
+    rebuild: bool = False,
+    m: int = HNSW_M,
+    ef_construction: int = HNSW_EF_CONSTRUCTION,
+    lists: int = IVFFLAT_LISTS,
+    precision: str = VECTOR_INDEX_PRECISION,
+) -> dict:
+    """
+    Creates the ANN index on embeddings.embedding if it is missing, or
+    replaces it when the method or precision changes or a rebuild is requested.
+    """
+    if method not in VECTOR_INDEX_METHODS:
+        raise ValueError(f"Unknown vector index method: {method}")
+    if precision not in VECTOR_INDEX_PRECISIONS:
+        raise ValueError(f"Unknown vector index precision: {precision}")
+
+    current = await get_vector_index_config(conn)
+    if current == {"method": method, "precision": precision} and not rebuild:
+        return {"index": VECTOR_INDEX_NAME, "method": method, "precision": precision, "created": False}
+
+    if current is not None:
+        await conn.execute(text(f"DROP INDEX IF EXISTS {VECTOR_INDEX_NAME}"))
+
+    if method == "hnsw":
+        options = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+    else:
+        lists = int(lists) or await _suggested_ivfflat_lists(conn)
+        options = f"lists = {lists}"
+
+    await conn.execute(text(
+        f"CREATE INDEX {VECTOR_INDEX_NAME} ON embeddings "
+        f"USING {method} ({_INDEX_KEYS[precision]}) WITH ({options})"
+    ))
+    print(f"Created {method} vector index ({precision}, {options}).")
+
+    return {
+        "index": VECTOR_INDEX_NAME,
+        "method": method,
+        "precision": precision,
+        "created": True,
+        "options": options
+    }
+
+
+async def ensure_default_vector_index(conn: AsyncConnection) -> None:
+    """
+    Startup hook: creates the configured index only if no ANN index exists.
+    An index chosen later through the API is left untouched.
+    """
+    if await get_vector_index_method(conn) is not None:
+        return
+    if VECTOR_INDEX_METHOD == "ivfflat":
+        has_rows = await conn.scalar(text("SELECT EXISTS (SELECT 1 FROM embeddings)"))
+        if not has_rows:
+            print("Skipping ivfflat index creation: embeddings table is empty.")
+            return
+    await ensure_vector_index(conn)
+
+
+async def apply_search_params(
+    session: AsyncSession,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    filtered: bool = False,
+) -> None:
+    """
+    Sets per-query recall knobs for the current transaction only.
+    Higher ef_search (HNSW) / probes (IVFFlat) trade latency for recall.
+    Filtered searches also enable iterative index scans.
+    """
+    settings = {}
+    if ef_search is not None:
+        settings["hnsw.ef_search"] = str(int(ef_search))
+    if probes is not None:
+        settings["ivfflat.probes"] = str(int(probes))
+    if filtered and VECTOR_ITERATIVE_SCAN != "off":
+        settings["hnsw.iterative_scan"] = VECTOR_ITERATIVE_SCAN
+        settings["ivfflat.iterative_scan"] = "relaxed_order"
+    if not settings:
+        return
+
+    calls = ", ".join(f"set_config(:name{i}, :value{i}, true)" for i in range(len(settings)))
+    params = {}
+    for i, (name, value) in enumerate(settings.items()):
+        params[f"name{i}"] = name
+        params[f"value{i}"] = value
+    await session.execute(text(f"SELECT {calls}"), params)
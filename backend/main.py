@@ -1,22 +1,54 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from routers import chat, knowledge_base
+from routers import chat, knowledge_base, live
 from db.database import engine, Base
+from db.migrations import apply_schema_upgrades
+from db.vector_index import ensure_default_vector_index
+from services.sync_job_service import cancel_running_jobs
+from services.clients import get_client_registry, close_client_registry
+from services.chunking import close_chunker
+from services import metrics
+import time
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup: Create tables
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await apply_schema_upgrades(conn)
+        await ensure_default_vector_index(conn)
+    # Startup: Shared API clients for all requests and background jobs
+    app.state.clients = get_client_registry()
+    metrics.instrument_engine(engine)
     yield
-    # Shutdown: Close connections
+    # Shutdown: Stop background sync workers, then close connections
+    await cancel_running_jobs()
+    await close_client_registry()
+    close_chunker()
     await engine.dispose()
 
 app = FastAPI(lifespan=lifespan)
 
 app.include_router(chat.router, prefix="/api")
 app.include_router(knowledge_base.router, prefix="/api")
+app.include_router(live.router, prefix="/api")
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    if not metrics.enabled():
+        return await call_next(request)
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Route templates (e.g. /api/knowledge-base/sync/{job_id}) keep label cardinality bounded
+    route = request.scope.get("route")
+    metrics.observe_http(
+        request.method,
+        route.path if route is not None else "unmatched",
+        response.status_code,
+        time.perf_counter() - started
+    )
+    return response
 
 # Configure CORS - must be added after routers
 app.add_middleware(
@@ -34,3 +66,11 @@ def read_root():
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus scrape endpoint (404 when METRICS_ENABLED=false)."""
+    if not metrics.enabled():
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
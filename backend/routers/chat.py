@@ -1,30 +1,31 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
+from starlette.datastructures import UploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
 from sqlalchemy.ext.asyncio import AsyncSession
-from pydantic import BaseModel
-from typing import Optional
+from typing import AsyncIterator, Optional
 from uuid import UUID
+import os
+import json
+import tempfile
+from services.audio import (
+    AUDIO_SNIFF_BYTES, SUPPORTED_AUDIO_MIME_TYPES, detect_audio_mime_type, normalize_audio_mime_type
+)
 from services.chat_service import ChatService
-from db.database import get_db
+from services.clients import ClientRegistry, get_clients
+from schemas import ChatRequest, ChatResponse, ConversationHistoryResponse
+from services import metrics
+from db.database import get_db, AsyncSessionLocal
 
 router = APIRouter()
 
-class ChatRequest(BaseModel):
-    message: str
-    conversation_id: Optional[str] = None
-    model_type: str = "fast"
-    use_rag: bool = False
-
-class ChatResponse(BaseModel):
-    conversation_id: str
-    response: str
-    metadata: dict
-
-class ConversationHistoryResponse(BaseModel):
-    conversation_id: str
-    messages: list
+# Largest voice note accepted by /chat/audio
+AUDIO_MAX_UPLOAD_BYTES = int(os.getenv("AUDIO_MAX_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+# Uploads are kept in memory up to this size and spill to a temporary file beyond it
+AUDIO_SPOOL_MEMORY_BYTES = int(os.getenv("AUDIO_SPOOL_MEMORY_BYTES", str(1024 * 1024)))
 
 @router.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest, db: AsyncSession = Depends(get_db)):
+async def chat_endpoint(request: ChatRequest, db: AsyncSession = Depends(get_db), clients: ClientRegistry = Depends(get_clients)):
     """
     Chat endpoint with conversation history support.
 
@@ -33,7 +34,7 @@ async def chat_endpoint(request: ChatRequest, db: AsyncSession = Depends(get_db)
     - Optional RAG mode using knowledge base
     """
     try:
-        chat_service = ChatService(db)
+        chat_service = ChatService(db, clients)
 
         # Convert conversation_id to UUID if provided
         conversation_id = UUID(request.conversation_id) if request.conversation_id else None
@@ -42,28 +43,183 @@ async def chat_endpoint(request: ChatRequest, db: AsyncSession = Depends(get_db)
             conversation_id=conversation_id,
             user_message=request.message,
             model_type=request.model_type,
-            use_rag=request.use_rag
+            use_rag=request.use_rag,
+            filters=request.filters.to_search_filters() if request.filters else None
         )
 
         return ChatResponse(**result)
     except Exception as e:
+        metrics.count_error("chat", request.model_type)
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest, clients: ClientRegistry = Depends(get_clients)):
+    """
+    Streaming chat endpoint (server-sent events).
+
+    Emits `conversation`, `sources` (RAG only), `token` and `done` events,
+    or a single `error` event if generation fails mid-stream.
+    """
+    try:
+        conversation_id = UUID(request.conversation_id) if request.conversation_id else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def event_stream():
+        # The stream outlives the request dependencies, so it owns its session.
+        async with AsyncSessionLocal() as db:
+            try:
+                chat_service = ChatService(db, clients)
+                async for event in chat_service.chat_stream(
+                    conversation_id=conversation_id,
+                    user_message=request.message,
+                    model_type=request.model_type,
+                    use_rag=request.use_rag,
+                    filters=request.filters.to_search_filters() if request.filters else None
+                ):
+                    yield _format_sse(event["event"], event["data"])
+            except Exception as e:
+                await db.rollback()
+                metrics.count_error("chat_stream", request.model_type)
+                yield _format_sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _limited_body(request: Request) -> AsyncIterator[bytes]:
+    """The request body, failing with 413 as soon as it passes AUDIO_MAX_UPLOAD_BYTES."""
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > AUDIO_MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail=f"Audio larger than {AUDIO_MAX_UPLOAD_BYTES} bytes")
+        yield chunk
+
+async def _receive_audio(request: Request) -> tuple:
+    """
+    Returns (upload, form fields) for an audio upload, sent either as the
+    `audio` part of a multipart form or as the raw request body (plain or
+    chunked). Either way the audio is streamed into a spooled temporary file,
+    so only AUDIO_SPOOL_MEMORY_BYTES of it are ever held in memory, and the
+    size limit is checked while reading, so nothing past it is written.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > AUDIO_MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Audio larger than {AUDIO_MAX_UPLOAD_BYTES} bytes")
+
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        # Parsed directly rather than with request.form(), which reads the
+        # whole body into its spooled files before the size can be checked.
+        # The parser closes its files if the body is cut short.
+        try:
+            form = await MultiPartParser(request.headers, _limited_body(request), max_files=1).parse()
+        except MultiPartException as e:
+            raise HTTPException(status_code=400, detail=e.message)
+        upload = form.get("audio")
+        if not isinstance(upload, UploadFile):
+            await form.close()
+            raise HTTPException(status_code=400, detail="Missing 'audio' file part")
+        fields = {key: value for key, value in form.items() if isinstance(value, str)}
+        return upload, fields
+
+    upload = UploadFile(
+        file=tempfile.SpooledTemporaryFile(max_size=AUDIO_SPOOL_MEMORY_BYTES),
+        size=0,
+        headers=request.headers
+    )
+    try:
+        async for chunk in _limited_body(request):
+            # Written from a worker thread once the spool has rolled over to disk
+            await upload.write(chunk)
+    except BaseException:
+        await upload.close()
+        raise
+    return upload, {}
+
+
+async def _audio_mime_type(upload: UploadFile) -> str:
+    """Format from the file's magic bytes, falling back to the declared Content-Type."""
+    await upload.seek(0)
+    header = await upload.read(AUDIO_SNIFF_BYTES)
+    await upload.seek(0)
+    if not header:
+        raise HTTPException(status_code=400, detail="Empty audio upload")
+    mime_type = detect_audio_mime_type(header) or normalize_audio_mime_type(upload.content_type)
+    if mime_type not in SUPPORTED_AUDIO_MIME_TYPES:
+        raise HTTPException(
+            status_code=415,
+            detail=f"Unsupported audio format {mime_type or 'unknown'}; use one of {', '.join(SUPPORTED_AUDIO_MIME_TYPES)}"
+        )
+    return mime_type
+
+@router.post("/chat/audio", response_model=ChatResponse)
+async def chat_audio_endpoint(
+    request: Request,
+    prompt: Optional[str] = None,
+    conversation_id: Optional[str] = None,
+    model_type: str = "fast",
+    db: AsyncSession = Depends(get_db),
+    clients: ClientRegistry = Depends(get_clients)
+):
+    """
+    Chat turn with a voice note (WAV, MP3, AIFF, AAC, OGG or FLAC).
+
+    Send either multipart/form-data with an `audio` file part and optional
+    `prompt`, `conversation_id` and `model_type` fields, or the raw audio as
+    the request body (chunked transfer encoding is fine) with those as query
+    parameters. The format is detected from the file itself; large files go
+    to Gemini through the Files API.
+    """
+    upload, fields = await _receive_audio(request)
+    try:
+        prompt = fields.get("prompt", prompt)
+        model_type = fields.get("model_type", model_type)
+        conversation_id = fields.get("conversation_id", conversation_id)
+        mime_type = await _audio_mime_type(upload)
+        try:
+            conversation_uuid = UUID(conversation_id) if conversation_id else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        chat_service = ChatService(db, clients)
+        result = await chat_service.chat_audio(
+            conversation_id=conversation_uuid,
+            audio=upload.file,
+            mime_type=mime_type,
+            prompt=prompt,
+            model_type=model_type
+        )
+        return ChatResponse(**result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        metrics.count_error("chat_audio", model_type)
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await upload.close()
 
 @router.post("/conversation/new")
-async def create_conversation(db: AsyncSession = Depends(get_db)):
+async def create_conversation(db: AsyncSession = Depends(get_db), clients: ClientRegistry = Depends(get_clients)):
     """Creates a new conversation session."""
     try:
-        chat_service = ChatService(db)
+        chat_service = ChatService(db, clients)
         conversation_id = await chat_service.create_conversation()
         return {"conversation_id": str(conversation_id)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/conversation/{conversation_id}/history", response_model=ConversationHistoryResponse)
-async def get_conversation_history(conversation_id: str, db: AsyncSession = Depends(get_db)):
+async def get_conversation_history(conversation_id: str, db: AsyncSession = Depends(get_db), clients: ClientRegistry = Depends(get_clients)):
     """Retrieves conversation history."""
     try:
-        chat_service = ChatService(db)
+        chat_service = ChatService(db, clients)
         messages = await chat_service.get_conversation_history(UUID(conversation_id))
         return {
             "conversation_id": conversation_id,
@@ -1,7 +1,12 @@
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
-from pydantic import BaseModel
+from typing import Optional
 from services.knowledge_base_service import KnowledgeBaseService
+from services.sync_job_service import SyncJobService, SyncAlreadyRunningError
+from services.cache import query_embedding_cache, answer_cache
+from schemas import QueryRequest, BatchQueryRequest, VectorIndexRequest
+from uuid import UUID
+from services.clients import ClientRegistry, get_clients
 from db.database import get_db
 
 router = APIRouter(
@@ -9,31 +14,118 @@ router = APIRouter(
     tags=["knowledge-base"]
 )
 
-class QueryRequest(BaseModel):
-    query: str
-    model_type: str = "fast"
-
-@router.post("/sync")
-async def sync_knowledge_base(db: AsyncSession = Depends(get_db)):
+@router.post("/sync", status_code=202)
+async def sync_knowledge_base(
+    mode: str = "incremental",
+    vector_precision: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
     """
-    Synchronously syncs the knowledge base from Notion to PostgreSQL.
-    This is a heavy operation.
+    Submits a Notion -> PostgreSQL sync as a background job and returns its id.
+    Poll GET /knowledge-base/sync/{job_id} for progress.
+
+    - mode=incremental (default): only re-embeds changed pages and removes deleted ones
+    - mode=full: rebuilds the whole knowledge base
+    - vector_precision=full|halfvec|binary: switches the ANN index precision
+      after the sync (quantized indexes are re-ranked at full precision)
+
+    Returns 409 if a sync is already queued or running.
     """
     try:
-        kb_service = KnowledgeBaseService(db)
-        result = await kb_service.sync_knowledge_base()
-        return result
+        job_service = SyncJobService(db)
+        return await job_service.submit(mode, vector_precision)
+    except SyncAlreadyRunningError as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "job_id": str(e.job_id)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/sync/{job_id}")
+async def get_sync_job(job_id: UUID, db: AsyncSession = Depends(get_db)):
+    """
+    Returns a sync job's status, phase, documents processed, chunks embedded,
+    throughput and errors.
+    """
+    job = await SyncJobService(db).get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Sync job not found")
+    return job
+
 @router.post("/query")
-async def query_knowledge_base(request: QueryRequest, db: AsyncSession = Depends(get_db)):
+async def query_knowledge_base(request: QueryRequest, db: AsyncSession = Depends(get_db), clients: ClientRegistry = Depends(get_clients)):
     """
     Queries the knowledge base using RAG.
     """
     try:
-        kb_service = KnowledgeBaseService(db)
-        result = await kb_service.query_with_rag(request.query, request.model_type)
+        kb_service = KnowledgeBaseService(db, clients)
+        result = await kb_service.query_with_rag(
+            request.query,
+            request.model_type,
+            ef_search=request.ef_search,
+            probes=request.probes,
+            k=request.k,
+            vector_weight=request.vector_weight,
+            lexical_weight=request.lexical_weight,
+            filters=request.filters.to_search_filters() if request.filters else None
+        )
         return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/query/batch")
+async def batch_query_knowledge_base(request: BatchQueryRequest, db: AsyncSession = Depends(get_db), clients: ClientRegistry = Depends(get_clients)):
+    """
+    Retrieves context for many queries at once: one embedding call and one
+    SQL statement for the whole batch. With generate=true, RAG answers are
+    generated concurrently; otherwise only the chunks are returned.
+    """
+    try:
+        kb_service = KnowledgeBaseService(db, clients)
+        return await kb_service.batch_query(
+            request.queries,
+            request.model_type,
+            generate=request.generate,
+            ef_search=request.ef_search,
+            probes=request.probes,
+            k=request.k,
+            vector_weight=request.vector_weight,
+            lexical_weight=request.lexical_weight,
+            filters=request.filters.to_search_filters() if request.filters else None
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/index")
+async def rebuild_vector_index(request: VectorIndexRequest, db: AsyncSession = Depends(get_db), clients: ClientRegistry = Depends(get_clients)):
+    """
+    Rebuilds the approximate nearest neighbour index (HNSW or IVFFlat), at
+    full, halfvec or binary precision. Build IVFFlat after a sync so its
+    lists are trained on real data.
+    """
+    try:
+        kb_service = KnowledgeBaseService(db, clients)
+        return await kb_service.rebuild_vector_index(
+            request.method,
+            m=request.m,
+            ef_construction=request.ef_construction,
+            lists=request.lists,
+            precision=request.precision
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/cache/stats")
+async def get_cache_stats(clients: ClientRegistry = Depends(get_clients)):
+    """Hit/miss counters for the process-local query-embedding, answer and Gemini context caches."""
+    return {
+        "query_embeddings": query_embedding_cache.stats(),
+        "answers": answer_cache.stats(),
+        "context_caches": clients.context_cache.stats()
+    }
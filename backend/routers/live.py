@@ -0,0 +1,39 @@
+from fastapi import APIRouter, WebSocket
+from services.chat_service import CHAT_SYSTEM_PROMPT
+from services.live_relay import LiveRelay, LiveSessionLimitReached
+
+router = APIRouter()
+
+# Model types whose models accept Gemini Live connections
+LIVE_MODEL_TYPES = ("live",)
+
+@router.websocket("/live")
+async def live_endpoint(websocket: WebSocket, model_type: str = "live"):
+    """
+    Real-time voice chat: relays audio between the browser and a Gemini Live
+    session (see LiveRelay for the frame protocol). The browser streams
+    16 kHz 16-bit PCM as binary frames and plays back the 24 kHz PCM it
+    receives. The session always uses the server's chat system prompt.
+    Closes with 1008 for a model type that cannot run live sessions and
+    with 1013 when the server is at LIVE_MAX_SESSIONS.
+    """
+    await websocket.accept()
+    if model_type not in LIVE_MODEL_TYPES:
+        await websocket.send_json({
+            "type": "error",
+            "detail": f"Model type {model_type!r} does not support live sessions; use one of {', '.join(LIVE_MODEL_TYPES)}"
+        })
+        await websocket.close(code=1008, reason="Unsupported model type")
+        return
+
+    relay = LiveRelay(
+        websocket,
+        websocket.app.state.clients.gemini,
+        model_type=model_type,
+        system_instruction=CHAT_SYSTEM_PROMPT
+    )
+    try:
+        await relay.run()
+    except LiveSessionLimitReached as e:
+        await websocket.send_json({"type": "error", "detail": str(e)})
+        await websocket.close(code=1013, reason="Too many live sessions")
@@ -0,0 +1,68 @@
+"""
+Request and response models of the HTTP API, shared by the routers.
+"""
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime
+from uuid import UUID
+from db.hybrid_search import RAG_TOP_K, RAG_MAX_K, HYBRID_VECTOR_WEIGHT, HYBRID_LEXICAL_WEIGHT, SearchFilters
+
+class QueryFilters(BaseModel):
+    metadata: Optional[dict] = None  # JSONB containment on document metadata, e.g. {"tags": ["pricing"]}
+    title: Optional[str] = None  # case-insensitive substring of the page title
+    updated_after: Optional[datetime] = None  # Notion last-edited time range
+    updated_before: Optional[datetime] = None
+    document_ids: Optional[List[UUID]] = None
+
+    def to_search_filters(self) -> SearchFilters:
+        return SearchFilters(
+            metadata=self.metadata,
+            title=self.title,
+            updated_after=self.updated_after,
+            updated_before=self.updated_before,
+            document_ids=self.document_ids
+        )
+
+class QueryRequest(BaseModel):
+    query: str
+    model_type: str = "fast"
+    ef_search: Optional[int] = None  # HNSW recall knob (pgvector default: 40)
+    probes: Optional[int] = None  # IVFFlat recall knob (pgvector default: 1)
+    k: int = Field(RAG_TOP_K, ge=1, le=RAG_MAX_K)  # chunks passed to the model
+    vector_weight: float = HYBRID_VECTOR_WEIGHT  # RRF weight of vector search
+    lexical_weight: float = HYBRID_LEXICAL_WEIGHT  # RRF weight of full-text search (0 = vector only)
+    filters: Optional[QueryFilters] = None
+
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+    model_type: str = "fast"
+    generate: bool = False  # retrieval only unless set
+    ef_search: Optional[int] = None
+    probes: Optional[int] = None
+    k: int = Field(RAG_TOP_K, ge=1, le=RAG_MAX_K)  # per query
+    vector_weight: float = HYBRID_VECTOR_WEIGHT
+    lexical_weight: float = HYBRID_LEXICAL_WEIGHT
+    filters: Optional[QueryFilters] = None  # applies to every query
+
+class VectorIndexRequest(BaseModel):
+    method: str = "hnsw"
+    m: int = 16
+    ef_construction: int = 64
+    lists: int = 0  # IVFFlat only; 0 derives it from the row count
+    precision: Optional[str] = None  # "full", "halfvec" or "binary"; default keeps the current one
+
+class ChatRequest(BaseModel):
+    message: str
+    conversation_id: Optional[str] = None
+    model_type: str = "fast"
+    use_rag: bool = False
+    filters: Optional[QueryFilters] = None  # RAG mode only: restricts retrieval to matching documents
+
+class ChatResponse(BaseModel):
+    conversation_id: str
+    response: str
+    metadata: dict
+
+class ConversationHistoryResponse(BaseModel):
+    conversation_id: str
+    messages: list
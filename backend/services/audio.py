@@ -0,0 +1,53 @@
+from typing import Optional
+
+# Formats Gemini accepts as audio input (https://ai.google.dev/gemini-api/docs/audio)
+SUPPORTED_AUDIO_MIME_TYPES = ("audio/wav", "audio/mp3", "audio/aiff", "audio/aac", "audio/ogg", "audio/flac")
+# Bytes needed to recognise any of the formats below
+AUDIO_SNIFF_BYTES = 12
+
+# Common aliases sent as Content-Type by browsers and recorders
+_MIME_ALIASES = {
+    "audio/mpeg": "audio/mp3",
+    "audio/x-wav": "audio/wav",
+    "audio/wave": "audio/wav",
+    "audio/x-aiff": "audio/aiff",
+    "audio/x-flac": "audio/flac",
+    "audio/vorbis": "audio/ogg",
+}
+
+
+def detect_audio_mime_type(header: bytes) -> Optional[str]:
+    """
+    MIME type of an audio file from its first AUDIO_SNIFF_BYTES bytes, or
+    None if the format is not recognised. Containers Gemini does not take
+    (WebM, MP4) are recognised too, so callers can say what was sent.
+    """
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return "audio/wav"
+    if header[:4] == b"FORM" and header[8:12] in (b"AIFF", b"AIFC"):
+        return "audio/aiff"
+    if header[:4] == b"fLaC":
+        return "audio/flac"
+    if header[:4] == b"OggS":
+        return "audio/ogg"
+    if header[:3] == b"ID3":
+        return "audio/mp3"
+    if header[:4] == b"\x1a\x45\xdf\xa3":
+        return "audio/webm"
+    if header[4:8] == b"ftyp":
+        return "audio/mp4"
+    if len(header) >= 2 and header[0] == 0xFF:
+        # ADTS (AAC) frames have layer bits 00; MPEG audio frames (MP3) do not
+        if header[1] & 0xF6 == 0xF0:
+            return "audio/aac"
+        if header[1] & 0xE0 == 0xE0:
+            return "audio/mp3"
+    return None
+
+
+def normalize_audio_mime_type(content_type: Optional[str]) -> Optional[str]:
+    """Declared Content-Type without parameters, mapped to the names Gemini uses."""
+    if not content_type:
+        return None
+    mime_type = content_type.split(";", 1)[0].strip().lower()
+    return _MIME_ALIASES.get(mime_type, mime_type)
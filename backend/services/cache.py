@@ -0,0 +1,393 @@
+from typing import Any, Awaitable, Callable, List, Optional
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+import os
+import re
+import json
+import asyncio
+import time
+import numpy as np
+from services import metrics
+
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "10000"))
+QUERY_EMBEDDING_CACHE_TTL_SECONDS = float(os.getenv("QUERY_EMBEDDING_CACHE_TTL_SECONDS", "86400"))
+# Optional shared backend, e.g. redis://redis:6379/0 (requires the `redis` package).
+QUERY_EMBEDDING_CACHE_URL = os.getenv("QUERY_EMBEDDING_CACHE_URL")
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", "0.97"))
+
+
+class CacheBackend(ABC):
+    """Interface for shared cache backends (values must be JSON-serializable)."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        ...
+
+
+class LRUCache:
+    """Bounded in-process cache with least-recently-used eviction and per-entry TTL."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries: OrderedDict = OrderedDict()
+
+    def get(self, key) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key, value) -> None:
+        self.entries[key] = (value, time.monotonic() + self.ttl_seconds)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class RedisCacheBackend(CacheBackend):
+    """Shared backend so all workers reuse each other's query embeddings."""
+
+    def __init__(self, url: str, prefix: str = "qemb:"):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(url)
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        await self.client.set(self.prefix + key, json.dumps(value), ex=int(ttl_seconds))
+
+
+class QueryEmbeddingCache:
+    """
+    Caches query embeddings keyed by embedding model and normalized query text.
+    Lookups go to the in-process LRU first, then to the optional shared
+    backend. Concurrent misses for the same key share one embedding call.
+    Errors from the shared backend are logged and treated as misses, so a
+    cache outage only costs extra embedding calls.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = QUERY_EMBEDDING_CACHE_SIZE,
+        ttl_seconds: float = QUERY_EMBEDDING_CACHE_TTL_SECONDS,
+        backend: Optional[CacheBackend] = None,
+    ):
+        self.local = LRUCache(max_entries, ttl_seconds)
+        self.ttl_seconds = ttl_seconds
+        self.backend = backend
+        self.in_flight = {}
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return re.sub(r"\s+", " ", query).strip().casefold()
+
+    def key(self, model: str, query: str) -> str:
+        return f"{model}:{self.normalize(query)}"
+
+    async def _backend_get(self, key: str) -> Optional[list]:
+        try:
+            return await self.backend.get(key)
+        except Exception as e:
+            self._backend_error("get", e)
+            return None
+
+    async def _backend_set(self, key: str, vector: list) -> None:
+        try:
+            await self.backend.set(key, vector, self.ttl_seconds)
+        except Exception as e:
+            self._backend_error("set", e)
+
+    @staticmethod
+    def _backend_error(operation: str, error: Exception) -> None:
+        print(f"Query embedding cache backend {operation} failed: {error}")
+        metrics.count_error("query_embedding_cache")
+
+    async def get_or_compute(
+        self,
+        model: str,
+        query: str,
+        compute: Callable[[], Awaitable[list]],
+    ) -> list:
+        key = self.key(model, query)
+
+        vector = self.local.get(key)
+        if vector is not None:
+            self.hits += 1
+            metrics.count_cache("query_embedding", "hit")
+            return vector
+
+        pending = self.in_flight.get(key)
+        if pending is not None:
+            try:
+                vector = await asyncio.shield(pending)
+                self.hits += 1
+                metrics.count_cache("query_embedding", "hit")
+                return vector
+            except asyncio.CancelledError:
+                # Only swallow the cancellation of the request that was computing
+                if not pending.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        try:
+            vector = await self._backend_get(key) if self.backend else None
+            if vector is not None:
+                self.shared_hits += 1
+                metrics.count_cache("query_embedding", "shared_hit")
+            else:
+                self.misses += 1
+                metrics.count_cache("query_embedding", "miss")
+                vector = list(await compute())
+                if self.backend:
+                    await self._backend_set(key, vector)
+            self.local.set(key, vector)
+            future.set_result(vector)
+            return vector
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the error as retrieved so it is not logged when nobody waits
+            future.exception()
+            raise
+        finally:
+            if self.in_flight.get(key) is future:
+                del self.in_flight[key]
+
+    async def get_or_compute_many(
+        self,
+        model: str,
+        queries: List[str],
+        compute: Callable[[List[str]], Awaitable[List[list]]],
+    ) -> List[list]:
+        """
+        Batch variant of get_or_compute: the queries that miss both cache
+        levels are embedded with a single `compute(texts)` call. Keys already
+        being computed by other requests are awaited, and single lookups for
+        keys of this batch wait for it. Returns one vector per query, in order.
+        """
+        keys = [self.key(model, query) for query in queries]
+        vectors, pending, owned = {}, {}, {}
+        for key, query in zip(keys, queries):
+            if key in vectors or key in pending or key in owned:
+                continue
+            vector = self.local.get(key)
+            if vector is not None:
+                self.hits += 1
+                metrics.count_cache("query_embedding", "hit")
+                vectors[key] = vector
+            elif key in self.in_flight:
+                pending[key] = self.in_flight[key]
+            else:
+                future = asyncio.get_running_loop().create_future()
+                self.in_flight[key] = future
+                owned[key] = (query, future)
+
+        if owned:
+            await self._compute_owned(owned, vectors, compute)
+
+        for key, future in pending.items():
+            try:
+                vectors[key] = await asyncio.shield(future)
+                self.hits += 1
+                metrics.count_cache("query_embedding", "hit")
+            except asyncio.CancelledError:
+                # The request computing it was cancelled, not this one
+                if not future.cancelled():
+                    raise
+                query = queries[keys.index(key)]
+                vectors[key] = await self.get_or_compute(
+                    model, query, lambda: self._first(compute([query]))
+                )
+        return [vectors[key] for key in keys]
+
+    async def _compute_owned(self, owned: dict, vectors: dict, compute) -> None:
+        """Resolves the keys this batch registered as in flight: shared backend, then `compute`."""
+        try:
+            if self.backend:
+                shared = await asyncio.gather(*(self._backend_get(key) for key in owned))
+                for key, vector in zip(owned, shared):
+                    if vector is not None:
+                        self.shared_hits += 1
+                        metrics.count_cache("query_embedding", "shared_hit")
+                        vectors[key] = vector
+
+            missing = [key for key in owned if key not in vectors]
+            if missing:
+                self.misses += len(missing)
+                for _ in missing:
+                    metrics.count_cache("query_embedding", "miss")
+                computed = await compute([owned[key][0] for key in missing])
+                for key, vector in zip(missing, computed):
+                    vectors[key] = list(vector)
+                if self.backend:
+                    await asyncio.gather(*(self._backend_set(key, vectors[key]) for key in missing))
+
+            for key, (_, future) in owned.items():
+                self.local.set(key, vectors[key])
+                future.set_result(vectors[key])
+        except asyncio.CancelledError:
+            for _, future in owned.values():
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in owned.values():
+                if not future.done():
+                    future.set_exception(e)
+                    future.exception()
+            raise
+        finally:
+            for key, (_, future) in owned.items():
+                if self.in_flight.get(key) is future:
+                    del self.in_flight[key]
+
+    @staticmethod
+    async def _first(vectors: Awaitable[List[list]]) -> list:
+        return (await vectors)[0]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.shared_hits + self.misses
+        return {
+            "entries": len(self.local),
+            "max_entries": self.local.max_entries,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.shared_hits) / lookups, 4) if lookups else 0.0,
+            "shared_backend": type(self.backend).__name__ if self.backend else None,
+        }
+
+
+class SemanticAnswerCache:
+    """
+    Caches RAG answers and looks them up by cosine similarity of the query
+    embedding. Entries are partitioned (e.g. by model type) and tagged with
+    the knowledge-base version they were generated against; entries from
+    another version never match.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = ANSWER_CACHE_SIZE,
+        ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+        threshold: float = ANSWER_CACHE_SIMILARITY_THRESHOLD,
+        enabled: bool = ANSWER_CACHE_ENABLED,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self.enabled = enabled
+        self.entries: OrderedDict = OrderedDict()
+        self.next_id = 0
+        self.index = None  # (entry ids, unit-vector matrix), rebuilt lazily
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    def lookup(self, vector, partition: str, version: int) -> Optional[tuple]:
+        """Returns (cached value, similarity) for the best match above the threshold."""
+        if not self.enabled or not self.entries:
+            self.misses += 1
+            metrics.count_cache("answer", "miss")
+            return None
+
+        if self.index is None:
+            ids = list(self.entries)
+            self.index = (ids, np.stack([self.entries[i]["vector"] for i in ids]))
+        ids, matrix = self.index
+
+        similarities = matrix @ self._unit(vector)
+        now = time.monotonic()
+        for position in np.argsort(-similarities):
+            similarity = float(similarities[position])
+            if similarity < self.threshold:
+                break
+            entry = self.entries.get(ids[position])
+            if entry is None or entry["partition"] != partition or entry["version"] != version:
+                continue
+            if entry["expires_at"] < now:
+                continue
+            self.entries.move_to_end(ids[position])
+            self.hits += 1
+            metrics.count_cache("answer", "hit")
+            return entry["value"], similarity
+
+        self.misses += 1
+        metrics.count_cache("answer", "miss")
+        return None
+
+    def store(self, vector, partition: str, version: int, value: Any) -> None:
+        if not self.enabled:
+            return
+        self.entries[self.next_id] = {
+            "vector": self._unit(vector),
+            "partition": partition,
+            "version": version,
+            "value": value,
+            "expires_at": time.monotonic() + self.ttl_seconds,
+        }
+        self.next_id += 1
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self.index = None
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.index = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def _default_backend() -> Optional[CacheBackend]:
+    if QUERY_EMBEDDING_CACHE_URL:
+        return RedisCacheBackend(QUERY_EMBEDDING_CACHE_URL)
+    return None
+
+
+# Process-wide caches shared by all requests.
+query_embedding_cache = QueryEmbeddingCache(backend=_default_backend())
+answer_cache = SemanticAnswerCache()
@@ -1,16 +1,46 @@
-from typing import List, Optional
-from sqlalchemy import select
+from typing import AsyncIterator, BinaryIO, List, NamedTuple, Optional
+from sqlalchemy import select, update, func, type_coerce
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timezone
 from db.models import Conversation, Message
-from services.gemini_service import GeminiService
+from services.clients import ClientRegistry, get_client_registry
 from services.knowledge_base_service import KnowledgeBaseService
+from db.hybrid_search import SearchFilters
+from services.conversation_cache import conversation_window_cache
+from services.context_manager import ConversationContextManager, PromptContext
+from services.timing import StageTimer
 from uuid import UUID
+import asyncio
+import os
+import uuid
+
+CHAT_SYSTEM_PROMPT = "You are a helpful assistant for the 'Growth with Flow' project."
+# Instruction sent with a voice note that comes without a text prompt
+AUDIO_DEFAULT_PROMPT = "Listen to the attached voice note and reply to it."
+
+class RagTurn(NamedTuple):
+    context: PromptContext
+    query_embedding: List[float]
+    kb_version: int  # read before retrieval; the answer is cached under it
+    cached: Optional[dict]  # answer-cache hit, if any
+    docs: List[dict]
+    prompt: str
+
+    @property
+    def sources(self) -> List[dict]:
+        return [doc["metadata"] for doc in self.docs]
 
 class ChatService:
-    def __init__(self, db_session: AsyncSession):
+    def __init__(self, db_session: AsyncSession, clients: Optional[ClientRegistry] = None):
         self.db = db_session
-        self.gemini_service = GeminiService()
-        self.kb_service = KnowledgeBaseService(db_session)
+        clients = clients or get_client_registry()
+        self.gemini_service = clients.gemini
+        self.context_cache = clients.context_cache
+        self.kb_service = KnowledgeBaseService(db_session, clients)
+        self.context_manager = ConversationContextManager(
+            self.gemini_service, max_messages=conversation_window_cache.window_size
+        )
 
     async def create_conversation(self, metadata: dict = None) -> UUID:
         """Creates a new conversation session."""
@@ -21,23 +51,76 @@ class ChatService:
         return conversation.id
 
     async def get_conversation_history(self, conversation_id: UUID, limit: int = 50) -> List[dict]:
-        """Retrieves conversation history."""
+        """Retrieves the most recent `limit` messages, oldest first."""
+        # Newest first so the limit keeps the latest messages; served by
+        # the (conversation_id, created_at DESC) index
         stmt = select(Message).where(
             Message.conversation_id == conversation_id
-        ).order_by(Message.created_at).limit(limit)
+        ).order_by(Message.created_at.desc()).limit(limit)
 
         result = await self.db.execute(stmt)
-        messages = result.scalars().all()
-
-        return [
-            {
-                "role": msg.role,
-                "content": msg.content,
-                "created_at": msg.created_at.isoformat(),
-                "metadata": msg.meta
-            }
-            for msg in messages
-        ]
+        messages = reversed(result.scalars().all())
+
+        return [self._message_to_dict(msg) for msg in messages]
+
+    async def get_recent_window(self, conversation_id: UUID) -> PromptContext:
+        """
+        Rolling summary and the messages after it, for prompt building: served
+        from the in-memory window cache, cold-loaded from the database on a miss.
+        """
+        cached = conversation_window_cache.get(conversation_id)
+        if cached is not None:
+            messages, summary = cached
+            return PromptContext(messages=messages, summary=summary)
+
+        meta = await self.db.scalar(select(Conversation.meta).where(Conversation.id == conversation_id))
+        summary = (meta or {}).get("summary")
+
+        stmt = select(Message).where(Message.conversation_id == conversation_id)
+        if summary:
+            # Messages already folded into the summary are not loaded again
+            stmt = stmt.where(Message.created_at > datetime.fromisoformat(summary["covered_until"]))
+        stmt = stmt.order_by(Message.created_at.desc()).limit(conversation_window_cache.window_size)
+
+        result = await self.db.execute(stmt)
+        messages = [self._message_to_dict(msg) for msg in reversed(result.scalars().all())]
+
+        conversation_window_cache.put(conversation_id, messages, summary)
+        return PromptContext(messages=messages, summary=summary)
+
+    async def _load_prompt_context(self, conversation_id: UUID, is_new_conversation: bool) -> PromptContext:
+        """History for a non-RAG prompt, compacted to the token budget."""
+        if is_new_conversation:
+            return PromptContext()
+        context = await self.get_recent_window(conversation_id)
+        return await self.context_manager.fit(context)
+
+    async def _prepare_chat_prompt(
+        self,
+        conversation_id: UUID,
+        context: PromptContext,
+        user_message: str,
+        model_type: str
+    ) -> tuple:
+        """
+        Returns (prompt, generation kwargs). When the conversation's stable
+        prefix is in a Gemini context cache, the prompt only holds the part
+        after it and the cache is passed as `cached_content`.
+        """
+        segments = self._history_segments(context.messages, context.summary_text)
+        cached = await self.context_cache.prefix_for(conversation_id, model_type, CHAT_SYSTEM_PROMPT, segments)
+        if cached is None:
+            return self._build_prompt_with_history(context.messages, user_message, context.summary_text), {}
+        prompt = "\n".join(segments[cached.segments:] + [self._current_turn(user_message)])
+        return prompt, {"cached_content": cached.name}
+
+    def _message_to_dict(self, msg: Message) -> dict:
+        return {
+            "role": msg.role,
+            "content": msg.content,
+            "created_at": msg.created_at.isoformat(),
+            "metadata": msg.meta
+        }
 
     async def add_message(self, conversation_id: UUID, role: str, content: str, metadata: dict = None):
         """Adds a message to a conversation."""
@@ -55,63 +138,365 @@ class ChatService:
         conversation_id: Optional[UUID],
         user_message: str,
         model_type: str = "fast",
-        use_rag: bool = False
+        use_rag: bool = False,
+        filters: Optional[SearchFilters] = None
     ) -> dict:
         """
         Main chat endpoint with conversation history.
 
+        The turn (new conversation, user message, assistant message) is
+        written in a single transaction once the answer is ready.
+        metadata.timings_ms reports how long each stage took.
+
         Args:
             conversation_id: Existing conversation ID or None to create new
             user_message: User's message
             model_type: Gemini model type ("fast" or "intelligent")
             use_rag: Whether to use RAG with knowledge base
+            filters: Optional document filters for RAG retrieval
         """
-        # Create new conversation if needed
-        if not conversation_id:
-            conversation_id = await self.create_conversation()
-
-        # Store user message
-        await self.add_message(conversation_id, "user", user_message)
-
-        # Get conversation history for context
-        history = await self.get_conversation_history(conversation_id, limit=10)
+        timer = StageTimer("chat", model_type)
+        user_message_at = datetime.now(timezone.utc)
+        is_new_conversation = not conversation_id
+        if is_new_conversation:
+            conversation_id = uuid.uuid4()
 
         # Build prompt with history
         if use_rag:
-            # RAG mode: Use knowledge base
-            rag_result = await self.kb_service.query_with_rag(user_message, model_type)
-            assistant_response = rag_result["answer"]
+            # RAG mode: knowledge-base context plus the conversation so far
+            rag = await self._prepare_rag_turn(
+                conversation_id, is_new_conversation, user_message, model_type, filters, timer
+            )
+            context = rag.context
+            if rag.cached is not None:
+                assistant_response = rag.cached["answer"]
+            else:
+                assistant_response = await timer.measure(
+                    "generate", self.gemini_service.agenerate_content(rag.prompt, model_type)
+                )
+                await self._store_rag_answer(rag, user_message, model_type, assistant_response, filters)
             metadata = {
-                "sources": rag_result["sources"],
+                "sources": rag.sources,
                 "model_type": model_type,
-                "rag_enabled": True
+                "rag_enabled": True,
+                "cache_hit": rag.cached is not None
             }
         else:
-            # Regular chat mode with history
-            prompt = self._build_prompt_with_history(history, user_message)
-            assistant_response = self.gemini_service.generate_content(prompt, model_type)
+            # Regular chat mode with history (a new conversation has none)
+            context = await timer.measure(
+                "history", self._load_prompt_context(conversation_id, is_new_conversation)
+            )
+            prompt, generation_kwargs = await timer.measure(
+                "prompt", self._prepare_chat_prompt(conversation_id, context, user_message, model_type)
+            )
+            assistant_response = await timer.measure(
+                "generate", self.gemini_service.agenerate_content(prompt, model_type, **generation_kwargs)
+            )
             metadata = {
                 "model_type": model_type,
                 "rag_enabled": False
             }
 
-        # Store assistant response
-        await self.add_message(conversation_id, "assistant", assistant_response, metadata)
+        await timer.measure("persist", self._persist_turn(
+            conversation_id, is_new_conversation, user_message, user_message_at, assistant_response, metadata,
+            context
+        ))
+
+        return {
+            "conversation_id": str(conversation_id),
+            "response": assistant_response,
+            "metadata": {**metadata, "timings_ms": timer.as_dict()}
+        }
+
+    async def chat_audio(
+        self,
+        conversation_id: Optional[UUID],
+        audio: BinaryIO,
+        mime_type: str,
+        prompt: Optional[str] = None,
+        model_type: str = "fast"
+    ) -> dict:
+        """
+        Chat turn whose user message is a voice note.
+
+        The recording (a seekable binary file, see
+        GeminiService.agenerate_with_audio) is sent with the conversation
+        history and `prompt`. The stored user message is the prompt marked as
+        a voice note; the audio itself is not kept.
+        """
+        timer = StageTimer("chat_audio", model_type)
+        audio_bytes = audio.seek(0, os.SEEK_END)
+        user_message_at = datetime.now(timezone.utc)
+        is_new_conversation = not conversation_id
+        if is_new_conversation:
+            conversation_id = uuid.uuid4()
+
+        context = await timer.measure(
+            "history", self._load_prompt_context(conversation_id, is_new_conversation)
+        )
+        instruction = prompt or AUDIO_DEFAULT_PROMPT
+        assistant_response = await timer.measure(
+            "generate", self.gemini_service.agenerate_with_audio(
+                audio,
+                mime_type,
+                self._build_prompt_with_history(context.messages, instruction, context.summary_text),
+                model_type
+            )
+        )
+        metadata = {
+            "model_type": model_type,
+            "rag_enabled": False,
+            "audio": {"mime_type": mime_type, "bytes": audio_bytes}
+        }
+        user_message = f"[Voice note] {prompt}" if prompt else "[Voice note]"
+
+        await timer.measure("persist", self._persist_turn(
+            conversation_id, is_new_conversation, user_message, user_message_at, assistant_response, metadata,
+            context
+        ))
 
         return {
             "conversation_id": str(conversation_id),
             "response": assistant_response,
-            "metadata": metadata
+            "metadata": {**metadata, "timings_ms": timer.as_dict()}
+        }
+
+    async def chat_stream(
+        self,
+        conversation_id: Optional[UUID],
+        user_message: str,
+        model_type: str = "fast",
+        use_rag: bool = False,
+        filters: Optional[SearchFilters] = None
+    ) -> AsyncIterator[dict]:
+        """
+        Streaming variant of `chat`. Yields events as they become available:
+
+        - {"event": "conversation", "data": {"conversation_id": ...}}
+        - {"event": "sources", "data": {"sources": [...]}} (RAG mode only, before any token)
+        - {"event": "token", "data": {"text": ...}} for each generated chunk
+        - {"event": "done", "data": {"conversation_id": ..., "response": ..., "metadata": ...}}
+
+        The turn is persisted in a single transaction once the stream completes.
+        """
+        timer = StageTimer("chat_stream", model_type)
+        user_message_at = datetime.now(timezone.utc)
+        is_new_conversation = not conversation_id
+        if is_new_conversation:
+            conversation_id = uuid.uuid4()
+
+        yield {"event": "conversation", "data": {"conversation_id": str(conversation_id)}}
+
+        rag = None
+        generation_kwargs = {}
+        if use_rag:
+            rag = await self._prepare_rag_turn(
+                conversation_id, is_new_conversation, user_message, model_type, filters, timer
+            )
+            yield {"event": "sources", "data": {"sources": rag.sources}}
+            context, prompt = rag.context, rag.prompt
+            metadata = {
+                "sources": rag.sources,
+                "model_type": model_type,
+                "rag_enabled": True,
+                "cache_hit": rag.cached is not None
+            }
+        else:
+            context = await timer.measure(
+                "history", self._load_prompt_context(conversation_id, is_new_conversation)
+            )
+            prompt, generation_kwargs = await timer.measure(
+                "prompt", self._prepare_chat_prompt(conversation_id, context, user_message, model_type)
+            )
+            metadata = {
+                "model_type": model_type,
+                "rag_enabled": False
+            }
+
+        if rag is not None and rag.cached is not None:
+            assistant_response = rag.cached["answer"]
+            timer.mark("first_token")
+            yield {"event": "token", "data": {"text": assistant_response}}
+        else:
+            response_parts = []
+            with timer.stage("generate"):
+                async for text in self.gemini_service.astream_content(prompt, model_type, **generation_kwargs):
+                    if not response_parts:
+                        timer.mark("first_token")
+                    response_parts.append(text)
+                    yield {"event": "token", "data": {"text": text}}
+
+            assistant_response = "".join(response_parts)
+            if rag is not None:
+                await self._store_rag_answer(rag, user_message, model_type, assistant_response, filters)
+
+        await timer.measure("persist", self._persist_turn(
+            conversation_id, is_new_conversation, user_message, user_message_at, assistant_response, metadata,
+            context
+        ))
+
+        yield {
+            "event": "done",
+            "data": {
+                "conversation_id": str(conversation_id),
+                "response": assistant_response,
+                "metadata": {**metadata, "timings_ms": timer.as_dict()}
+            }
         }
 
-    def _build_prompt_with_history(self, history: List[dict], current_message: str) -> str:
-        """Builds a prompt including conversation history."""
-        prompt_parts = ["You are a helpful assistant for the 'Growth with Flow' project.\n\nConversation history:"]
+    async def _prepare_rag_turn(
+        self,
+        conversation_id: UUID,
+        is_new_conversation: bool,
+        user_message: str,
+        model_type: str,
+        filters: Optional[SearchFilters],
+        timer: StageTimer
+    ) -> RagTurn:
+        """
+        Everything a RAG turn needs before generation. The query embedding
+        (an API call) and the history load run concurrently; retrieval then
+        reuses the embedding. Nothing is written here: the turn is persisted
+        once the answer is ready.
+        """
+        query_embedding, context = await asyncio.gather(
+            timer.measure("embed_query", self.kb_service.embed_query(user_message)),
+            timer.measure("history", self._load_prompt_context(conversation_id, is_new_conversation)),
+        )
+
+        # Cached answers only fit questions that do not follow up on a conversation
+        has_history = bool(context.messages or context.summary)
+        kb_version = await self.kb_service.get_kb_version()
+        cached = None
+        if not has_history:
+            cached = await timer.measure(
+                "answer_cache", self.kb_service.lookup_cached_answer(query_embedding, model_type, kb_version, filters=filters)
+            )
+
+        if cached is not None:
+            docs = [
+                {"page_content": text, "metadata": source}
+                for text, source in zip(cached["context_used"], cached["sources"])
+            ]
+        else:
+            docs = await timer.measure("retrieve", self.kb_service.get_relevant_context(
+                user_message, query_embedding=query_embedding, filters=filters
+            ))
+
+        history = "\n".join(self._history_segments(context.messages, context.summary_text)) if has_history else None
+        prompt = self.kb_service.build_rag_prompt(user_message, docs, history=history)
+        return RagTurn(context, query_embedding, kb_version, cached, docs, prompt)
+
+    async def _store_rag_answer(
+        self,
+        rag: RagTurn,
+        user_message: str,
+        model_type: str,
+        assistant_response: str,
+        filters: Optional[SearchFilters]
+    ):
+        if rag.context.messages or rag.context.summary:
+            return
+        await self.kb_service.store_answer(user_message, rag.query_embedding, model_type, {
+            "answer": assistant_response,
+            "context_used": [doc["page_content"] for doc in rag.docs],
+            "sources": rag.sources
+        }, rag.kb_version, filters=filters)
+
+    async def _persist_turn(
+        self,
+        conversation_id: UUID,
+        is_new_conversation: bool,
+        user_message: str,
+        user_message_at: datetime,
+        assistant_response: str,
+        metadata: dict,
+        context: Optional[PromptContext] = None
+    ):
+        """
+        Writes a whole chat turn in one transaction: the conversation and both
+        messages, which SQLAlchemy batches into a single INSERT, plus the
+        conversation's rolling summary if the prompt context was compacted.
+        Timestamps are set explicitly so the user message sorts first.
+        The conversation window cache is updated after the commit.
+
+        The conversation row is upserted even when the client sent an id:
+        chat_stream hands out the id of a new conversation before its first
+        turn is saved, so a failed first turn leaves the client holding an id
+        with no row behind it.
+        """
+        await self.db.execute(
+            pg_insert(Conversation)
+            .values(id=conversation_id, meta={})
+            .on_conflict_do_nothing(index_elements=[Conversation.id])
+        )
+        messages = [
+            Message(
+                conversation_id=conversation_id,
+                role="user",
+                content=user_message,
+                created_at=user_message_at,
+                meta={}
+            ),
+            Message(
+                conversation_id=conversation_id,
+                role="assistant",
+                content=assistant_response,
+                created_at=datetime.now(timezone.utc),
+                meta=metadata
+            ),
+        ]
+        self.db.add_all(messages)
+        if context is not None and context.summary_changed:
+            # Patch only the summary key so other metadata is left untouched
+            await self.db.execute(
+                update(Conversation)
+                .where(Conversation.id == conversation_id)
+                .values(meta=func.coalesce(Conversation.meta, type_coerce({}, JSONB)).op("||")(
+                    type_coerce({"summary": context.summary}, JSONB)
+                ))
+            )
+        await self.db.commit()
 
-        for msg in history[:-1]:  # Exclude the current message we just added
+        # Write-through to the window cache once the turn is durable. The
+        # history in `context` was loaded before generation, so it is not put
+        # back: a turn committed meanwhile would be dropped from the window.
+        new_messages = [self._message_to_dict(msg) for msg in messages]
+        if is_new_conversation:
+            conversation_window_cache.put(conversation_id, new_messages)
+        elif context is not None and context.summary_changed:
+            # Compacted: the next turn reloads the window after the new summary
+            conversation_window_cache.discard(conversation_id)
+        else:
+            conversation_window_cache.append(conversation_id, new_messages)
+
+    def _history_segments(self, history: List[dict], summary: Optional[str] = None) -> List[str]:
+        """
+        Prompt lines before the current turn, oldest first. They only grow at
+        the end until the history is compacted, so a leading run of them can
+        be served from a context cache.
+        """
+        segments = []
+        if summary:
+            segments.append(f"Summary of earlier conversation:\n{summary}\n")
+        segments.append("Conversation history:")
+        for msg in history:
             role_label = "User" if msg["role"] == "user" else "Assistant"
-            prompt_parts.append(f"{role_label}: {msg['content']}")
+            segments.append(f"{role_label}: {msg['content']}")
+        return segments
+
+    def _current_turn(self, current_message: str) -> str:
+        return f"\nUser: {current_message}\n\nAssistant:"
 
-        prompt_parts.append(f"\nUser: {current_message}\n\nAssistant:")
+    def _build_prompt_with_history(
+        self,
+        history: List[dict],
+        current_message: str,
+        summary: Optional[str] = None
+    ) -> str:
+        """Builds a prompt including the rolling summary and recent conversation history."""
+        prompt_parts = [f"{CHAT_SYSTEM_PROMPT}\n"]
+        prompt_parts.extend(self._history_segments(history, summary))
+        prompt_parts.append(self._current_turn(current_message))
 
         return "\n".join(prompt_parts)
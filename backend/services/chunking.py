@@ -0,0 +1,201 @@
+from typing import Any, AsyncIterable, AsyncIterator, Callable, List, NamedTuple, Optional, Tuple
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+import os
+import re
+import asyncio
+import unicodedata
+import multiprocessing
+
+# "characters" (the original splitter) or "tokens", which measures chunks with
+# approximate_tokens so they stay well under the embedding model's input
+# limit (2,048 tokens for text-embedding-004) whatever the script or markup.
+CHUNK_LENGTH_UNIT = os.getenv("CHUNK_LENGTH_UNIT", "characters")
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "250" if CHUNK_LENGTH_UNIT == "tokens" else "1000"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "50" if CHUNK_LENGTH_UNIT == "tokens" else "200"))
+# Processes splitting pages during a sync; 0 splits in a thread of this process instead.
+CHUNK_WORKERS = int(os.getenv("CHUNK_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Pages being split at once, per worker, so the pool never waits for the next page.
+CHUNK_PENDING_PER_WORKER = int(os.getenv("CHUNK_PENDING_PER_WORKER", "2"))
+
+LENGTH_UNITS = ("characters", "tokens")
+SEPARATORS = ["\n\n", "\n", " ", ""]
+
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+_TRAILING_SPACE = re.compile(r"[ \t]+\n")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def approximate_tokens(text: str) -> int:
+    """
+    Token count estimate without calling the API: every punctuation mark is a
+    token and words take one token per ~4 characters, which tracks
+    SentencePiece tokenizers far better than len(text) / 4 on code, URLs and
+    non-English text.
+    """
+    return sum(1 if len(piece) <= 4 else (len(piece) + 3) // 4 for piece in _TOKEN_PIECES.findall(text))
+
+
+def normalize_text(text: str) -> str:
+    """NFC-normalizes page text and drops the whitespace Notion exports leave behind."""
+    text = unicodedata.normalize("NFC", text.replace("\r\n", "\n").replace("\r", "\n"))
+    text = _TRAILING_SPACE.sub("\n", text)
+    return _BLANK_LINES.sub("\n\n", text).strip()
+
+
+def make_splitter(chunk_size: int, chunk_overlap: int, length_unit: str) -> RecursiveCharacterTextSplitter:
+    if length_unit not in LENGTH_UNITS:
+        raise ValueError(f"Unknown chunk length unit: {length_unit}")
+    length_function: Callable[[str], int] = approximate_tokens if length_unit == "tokens" else len
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=length_function,
+        separators=SEPARATORS
+    )
+
+
+# Set in each worker process by _init_worker
+_worker_splitter: Optional[RecursiveCharacterTextSplitter] = None
+
+
+def _init_worker(chunk_size: int, chunk_overlap: int, length_unit: str):
+    global _worker_splitter
+    _worker_splitter = make_splitter(chunk_size, chunk_overlap, length_unit)
+
+
+def _split_in_worker(text: str) -> List[str]:
+    return _worker_splitter.split_text(normalize_text(text))
+
+
+class ChunkResult(NamedTuple):
+    key: Any
+    chunks: Optional[List[str]]
+    error: Optional[Exception]
+
+
+class TextChunker:
+    """
+    Splits page text into chunks off the event loop.
+
+    With `workers` > 0 pages are split in a process pool, so a sync over
+    large pages neither blocks nor competes for the GIL with the requests
+    being served meanwhile; with 0 they are split in a thread. The pool is
+    started on first use and kept for later syncs.
+    """
+
+    def __init__(
+        self,
+        workers: int = CHUNK_WORKERS,
+        chunk_size: int = CHUNK_SIZE,
+        chunk_overlap: int = CHUNK_OVERLAP,
+        length_unit: str = CHUNK_LENGTH_UNIT,
+        pending_per_worker: int = CHUNK_PENDING_PER_WORKER,
+    ):
+        self.workers = workers
+        self.settings = (chunk_size, chunk_overlap, length_unit)
+        self.max_pending = max(1, workers) * pending_per_worker
+        # Also validates the settings before any worker is started
+        self.splitter = make_splitter(*self.settings)
+        self.executor: Optional[Executor] = None
+
+    def _executor(self) -> Executor:
+        if self.executor is None:
+            # Not fork: the server process has running threads and an event loop
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=self.settings
+            )
+        return self.executor
+
+    def _split_local(self, text: str) -> List[str]:
+        return self.splitter.split_text(normalize_text(text))
+
+    async def split(self, text: str) -> List[str]:
+        if self.workers <= 0:
+            return await asyncio.to_thread(self._split_local, text)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor(), _split_in_worker, text)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool next time
+            self.close()
+            raise
+
+    async def split_stream(self, items: AsyncIterable[Tuple[Any, str]]) -> AsyncIterator[ChunkResult]:
+        """
+        `items` yields (key, text) pairs, one per page. Pages are split
+        concurrently, up to `max_pending` at a time, and a ChunkResult is
+        yielded per page in completion order; `error` is set if it could
+        not be split. A page keeps its slot until its result is queued, and
+        at most `max_pending` results wait for the consumer, so the source
+        is not read ahead of a slow consumer.
+        """
+        results: asyncio.Queue = asyncio.Queue(maxsize=self.max_pending)
+        slots = asyncio.Semaphore(self.max_pending)
+        split_tasks = set()
+        done = object()
+
+        async def split_one(key, text: str):
+            try:
+                try:
+                    chunks, error = await self.split(text), None
+                except Exception as e:
+                    chunks, error = None, e
+                # Blocks while the consumer is behind, holding the slot
+                await results.put(ChunkResult(key, chunks, error))
+            finally:
+                slots.release()
+
+        async def produce():
+            try:
+                async for key, text in items:
+                    await slots.acquire()
+                    task = asyncio.create_task(split_one(key, text))
+                    split_tasks.add(task)
+                    task.add_done_callback(split_tasks.discard)
+                if split_tasks:
+                    await asyncio.gather(*split_tasks)
+                await results.put(done)
+            except Exception as e:
+                await results.put(e)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                item = await results.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+            await producer
+        finally:
+            producer.cancel()
+            for task in list(split_tasks):
+                task.cancel()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+_chunker: Optional[TextChunker] = None
+
+
+def get_chunker() -> TextChunker:
+    """Returns the process-wide chunker, creating it on first use."""
+    global _chunker
+    if _chunker is None:
+        _chunker = TextChunker()
+    return _chunker
+
+
+def close_chunker():
+    global _chunker
+    if _chunker is not None:
+        _chunker.close()
+        _chunker = None
@@ -0,0 +1,59 @@
+from typing import Optional
+from fastapi import Request
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from services.gemini_service import GeminiService
+from services.context_cache import ContextCacheManager
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EMBEDDING_MODEL = "models/text-embedding-004"
+
+
+class ClientRegistry:
+    """
+    Application-scoped API clients. Built once per process (in the FastAPI
+    lifespan) so requests reuse the same Gemini client and embeddings client,
+    and with them their pooled keep-alive connections, as well as the Gemini
+    context caches of active conversations.
+    """
+
+    def __init__(self):
+        self.gemini_api_key = os.getenv("GEMINI_API_KEY")
+        if not self.gemini_api_key:
+            raise ValueError("GEMINI_API_KEY not found in environment variables")
+
+        self.gemini = GeminiService()
+        self.embeddings = GoogleGenerativeAIEmbeddings(
+            model=EMBEDDING_MODEL,
+            google_api_key=self.gemini_api_key
+        )
+        self.context_cache = ContextCacheManager(self.gemini)
+
+    async def aclose(self):
+        await self.context_cache.aclose()
+        await self.gemini.aclose()
+
+
+_registry: Optional[ClientRegistry] = None
+
+
+def get_client_registry() -> ClientRegistry:
+    """Returns the process-wide registry, creating it on first use (scripts, workers)."""
+    global _registry
+    if _registry is None:
+        _registry = ClientRegistry()
+    return _registry
+
+
+async def close_client_registry():
+    global _registry
+    if _registry is not None:
+        await _registry.aclose()
+        _registry = None
+
+
+def get_clients(request: Request) -> ClientRegistry:
+    """FastAPI dependency: the registry created in the app lifespan."""
+    return request.app.state.clients
@@ -0,0 +1,201 @@
+from typing import Hashable, List, NamedTuple, Optional
+from collections import OrderedDict
+from services.context_manager import estimate_tokens
+from services import metrics
+import os
+import asyncio
+import hashlib
+import time
+
+GEMINI_CONTEXT_CACHE_ENABLED = os.getenv("GEMINI_CONTEXT_CACHE_ENABLED", "true").lower() == "true"
+GEMINI_CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL_SECONDS", "600"))
+GEMINI_CONTEXT_CACHE_MAX_ENTRIES = int(os.getenv("GEMINI_CONTEXT_CACHE_MAX_ENTRIES", "1000"))
+# Gemini rejects caches below a per-model minimum input size
+# (https://ai.google.dev/gemini-api/docs/caching); smaller prefixes are sent inline.
+GEMINI_CONTEXT_CACHE_MIN_TOKENS = {
+    "fast": int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_TOKENS_FAST", "1024")),
+    "intelligent": int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_TOKENS_INTELLIGENT", "4096")),
+}
+# Entries are treated as expired this long before the provider drops them, so
+# a request never references a cache that disappears mid-flight.
+_EXPIRY_MARGIN_SECONDS = 30
+
+
+class CachedPrefix(NamedTuple):
+    name: str  # provider handle, passed as `cached_content`
+    segments: int  # number of leading prompt segments stored in the cache
+
+
+class _Entry:
+    def __init__(self, name: str, model_type: str, fingerprint: str, segments: int, ttl_seconds: int):
+        self.name = name
+        self.model_type = model_type
+        self.fingerprint = fingerprint
+        self.segments = segments
+        self.ttl_seconds = ttl_seconds
+        self.expires_at = time.monotonic() + ttl_seconds
+
+    def remaining(self) -> float:
+        return self.expires_at - _EXPIRY_MARGIN_SECONDS - time.monotonic()
+
+
+def _fingerprint(model_type: str, system_instruction: str, segments: List[str]) -> str:
+    digest = hashlib.sha256(f"{model_type}\0{system_instruction}".encode("utf-8"))
+    for segment in segments:
+        digest.update(b"\0" + segment.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ContextCacheManager:
+    """
+    Keeps Gemini context caches for stable prompt prefixes.
+
+    A prompt is passed as a system instruction plus ordered text segments
+    (e.g. rolling summary, then older messages) that only ever grow at the
+    end until the history is compacted. Each owner (a conversation) has at
+    most one cache. It is reused while the prompt still starts with the
+    cached segments, its TTL is extended when it is used close to expiry, and
+    it is replaced by a longer one once the uncached tail itself reaches the
+    provider minimum. Replaced and least-recently-used caches are deleted.
+    """
+
+    def __init__(
+        self,
+        gemini_service,
+        enabled: bool = GEMINI_CONTEXT_CACHE_ENABLED,
+        ttl_seconds: int = GEMINI_CONTEXT_CACHE_TTL_SECONDS,
+        max_entries: int = GEMINI_CONTEXT_CACHE_MAX_ENTRIES,
+    ):
+        self.gemini_service = gemini_service
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries: OrderedDict = OrderedDict()  # owner -> _Entry
+        self.locks = {}  # owner -> (lock, number of users)
+        self.background_tasks = set()
+        self.hits = 0
+        self.created = 0
+        self.refreshed = 0
+        self.skipped = 0
+
+    def min_tokens(self, model_type: str) -> int:
+        return GEMINI_CONTEXT_CACHE_MIN_TOKENS.get(model_type, GEMINI_CONTEXT_CACHE_MIN_TOKENS["fast"])
+
+    async def prefix_for(
+        self,
+        owner: Hashable,
+        model_type: str,
+        system_instruction: str,
+        segments: List[str],
+    ) -> Optional[CachedPrefix]:
+        """
+        Returns the cache covering the longest usable prefix of `segments`,
+        creating or refreshing it as needed, or None to send the prompt inline.
+        """
+        if not self.enabled:
+            return None
+
+        # One conversation's turns are sequential, but guard against double submits
+        lock, users = self.locks.get(owner, (asyncio.Lock(), 0))
+        self.locks[owner] = (lock, users + 1)
+        try:
+            async with lock:
+                return await self._prefix_for(owner, model_type, system_instruction, segments)
+        except Exception as e:
+            # Caching is an optimization: fall back to the full prompt
+            print(f"Context cache unavailable for {owner}: {e}")
+            self._drop(owner)
+            return None
+        finally:
+            lock, users = self.locks[owner]
+            if users == 1:
+                del self.locks[owner]
+            else:
+                self.locks[owner] = (lock, users - 1)
+
+    async def _prefix_for(self, owner, model_type, system_instruction, segments) -> Optional[CachedPrefix]:
+        min_tokens = self.min_tokens(model_type)
+        entry = self.entries.get(owner)
+
+        if entry is not None and not self._matches(entry, model_type, system_instruction, segments):
+            self._drop(owner)
+            entry = None
+
+        if entry is not None:
+            uncached = sum(estimate_tokens(segment) for segment in segments[entry.segments:])
+            if uncached < min_tokens:
+                self.entries.move_to_end(owner)
+                if entry.remaining() < entry.ttl_seconds / 2:
+                    await self.gemini_service.aupdate_cached_content_ttl(entry.name, self.ttl_seconds)
+                    entry.expires_at = time.monotonic() + self.ttl_seconds
+                    self.refreshed += 1
+                self.hits += 1
+                metrics.count_cache("gemini_context", "hit")
+                return CachedPrefix(entry.name, entry.segments)
+
+        prefix_tokens = estimate_tokens(system_instruction) + sum(estimate_tokens(s) for s in segments)
+        if prefix_tokens < min_tokens:
+            self.skipped += 1
+            metrics.count_cache("gemini_context", "below_minimum")
+            return None
+
+        cached_content = await self.gemini_service.acreate_cached_content(
+            "\n".join(segments),
+            model_type,
+            ttl_seconds=self.ttl_seconds,
+            system_instruction=system_instruction
+        )
+        self._drop(owner)
+        self.entries[owner] = _Entry(
+            cached_content.name,
+            model_type,
+            _fingerprint(model_type, system_instruction, segments),
+            len(segments),
+            self.ttl_seconds
+        )
+        self.created += 1
+        metrics.count_cache("gemini_context", "created")
+        while len(self.entries) > self.max_entries:
+            self._drop(next(iter(self.entries)))
+        return CachedPrefix(cached_content.name, len(segments))
+
+    def _matches(self, entry: _Entry, model_type: str, system_instruction: str, segments: List[str]) -> bool:
+        if entry.model_type != model_type or entry.remaining() <= 0 or entry.segments > len(segments):
+            return False
+        return entry.fingerprint == _fingerprint(model_type, system_instruction, segments[:entry.segments])
+
+    def _drop(self, owner) -> None:
+        """Forgets an owner's cache and deletes it on the provider in the background."""
+        entry = self.entries.pop(owner, None)
+        if entry is None or entry.remaining() <= 0:
+            return
+        task = asyncio.create_task(self._delete(entry.name))
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+
+    async def _delete(self, name: str):
+        try:
+            await self.gemini_service.adelete_cached_content(name)
+        except Exception as e:
+            print(f"Failed to delete context cache {name}: {e}")
+
+    def discard(self, owner) -> None:
+        self._drop(owner)
+
+    async def aclose(self):
+        """Deletes all live caches (shutdown), so they stop accruing storage."""
+        for owner in list(self.entries):
+            self._drop(owner)
+        if self.background_tasks:
+            await asyncio.gather(*self.background_tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "created": self.created,
+            "refreshed": self.refreshed,
+            "skipped_below_minimum": self.skipped,
+        }
@@ -0,0 +1,122 @@
+from typing import List, Optional
+from dataclasses import dataclass, field
+import os
+
+# Token budget for conversation history in a prompt (summary + raw messages).
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "2000"))
+# When the budget is exceeded, older messages are folded into the summary
+# until the remaining ones fit in this fraction of the budget. The headroom
+# means the summary is only rewritten every few turns, not on every turn.
+HISTORY_COMPACT_RATIO = float(os.getenv("HISTORY_COMPACT_RATIO", "0.5"))
+SUMMARY_MAX_WORDS = int(os.getenv("SUMMARY_MAX_WORDS", "200"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)."""
+    return max(1, len(text) // 4)
+
+
+@dataclass
+class PromptContext:
+    """History that goes into a prompt: a rolling summary plus recent messages."""
+    messages: List[dict] = field(default_factory=list)
+    summary: Optional[dict] = None  # {"text", "covered_until", "summarized_messages"}
+    summary_changed: bool = False
+
+    @property
+    def summary_text(self) -> Optional[str]:
+        return self.summary["text"] if self.summary else None
+
+
+class ConversationContextManager:
+    """
+    Fits conversation history into a token budget.
+
+    Older turns are replaced by an incrementally maintained summary that is
+    stored in Conversation.meta["summary"]. The summary is only rewritten
+    when the window slides, i.e. when the history outgrows the budget (or the
+    message cap), and then enough is folded in to leave headroom for the
+    next few turns.
+    """
+
+    def __init__(
+        self,
+        gemini_service,
+        token_budget: int = HISTORY_TOKEN_BUDGET,
+        compact_ratio: float = HISTORY_COMPACT_RATIO,
+        max_messages: Optional[int] = None,
+    ):
+        self.gemini_service = gemini_service
+        self.token_budget = token_budget
+        self.compact_ratio = compact_ratio
+        self.max_messages = max_messages
+
+    def history_tokens(self, context: PromptContext) -> int:
+        tokens = sum(estimate_tokens(msg["content"]) for msg in context.messages)
+        if context.summary_text:
+            tokens += estimate_tokens(context.summary_text)
+        return tokens
+
+    def _needs_compaction(self, context: PromptContext) -> bool:
+        # Each turn appends two messages; compact before the window would overflow
+        if self.max_messages is not None and len(context.messages) + 2 > self.max_messages:
+            return True
+        return self.history_tokens(context) > self.token_budget
+
+    async def fit(self, context: PromptContext) -> PromptContext:
+        """Returns the context unchanged if it fits, else a compacted one."""
+        if not context.messages or not self._needs_compaction(context):
+            return context
+
+        target = self.token_budget * self.compact_ratio
+        message_cap = self.max_messages // 2 if self.max_messages else None
+        remaining = sum(estimate_tokens(msg["content"]) for msg in context.messages)
+
+        # Fold the oldest messages in, always keeping the latest exchange
+        split = 0
+        while split < len(context.messages) - 2:
+            over_tokens = remaining > target
+            over_count = message_cap is not None and len(context.messages) - split > message_cap
+            if not (over_tokens or over_count):
+                break
+            remaining -= estimate_tokens(context.messages[split]["content"])
+            split += 1
+
+        if split == 0:
+            return context
+
+        folded = context.messages[:split]
+        previous = context.summary or {}
+        summary_text = await self._summarize(previous.get("text"), folded)
+
+        return PromptContext(
+            messages=context.messages[split:],
+            summary={
+                "text": summary_text,
+                "covered_until": folded[-1]["created_at"],
+                "summarized_messages": previous.get("summarized_messages", 0) + len(folded),
+            },
+            summary_changed=True,
+        )
+
+    async def _summarize(self, previous_summary: Optional[str], messages: List[dict]) -> str:
+        transcript = "\n".join(
+            f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}"
+            for msg in messages
+        )
+        prompt = f"""
+You maintain a running summary of a conversation between a user and an assistant
+for the 'Growth with Flow' project. Update the summary with the new messages.
+Keep facts, decisions, names, numbers and open questions; drop pleasantries.
+Answer with the updated summary only, in at most {SUMMARY_MAX_WORDS} words.
+
+Current summary:
+{previous_summary or "(none)"}
+
+New messages:
+{transcript}
+
+Updated summary:
+"""
+        summary = await self.gemini_service.agenerate_content(prompt, "fast")
+        return summary.strip()
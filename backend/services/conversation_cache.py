@@ -0,0 +1,82 @@
+from typing import Iterable, Optional
+from collections import OrderedDict, deque
+from uuid import UUID
+import os
+
+# Upper bound on messages kept after the rolling summary; the context manager
+# compacts before a window would overflow.
+CONVERSATION_WINDOW_SIZE = int(os.getenv("CONVERSATION_WINDOW_SIZE", "50"))
+CONVERSATION_CACHE_MAX_CONVERSATIONS = int(os.getenv("CONVERSATION_CACHE_MAX_CONVERSATIONS", "10000"))
+
+
+class ConversationWindow:
+    """A conversation's rolling summary and the messages it does not cover yet."""
+
+    def __init__(self, messages: Iterable[dict], summary: Optional[dict], window_size: int):
+        self.messages = deque(messages, maxlen=window_size)
+        self.summary = summary
+
+
+class ConversationWindowCache:
+    """
+    Keeps the most recent messages of recently active conversations in memory.
+
+    Each conversation gets a ring buffer of its last `window_size` messages
+    (those after its rolling summary, see ConversationContextManager);
+    conversations are evicted least-recently-used. ChatService writes through
+    to it after every committed turn, so prompts for hot conversations are
+    built without reading `messages`. The cache is per process: with several
+    workers, a conversation should be served by one worker (sticky routing)
+    or the window may miss turns handled elsewhere until it is evicted.
+    """
+
+    def __init__(
+        self,
+        window_size: int = CONVERSATION_WINDOW_SIZE,
+        max_conversations: int = CONVERSATION_CACHE_MAX_CONVERSATIONS,
+    ):
+        self.window_size = window_size
+        self.max_conversations = max_conversations
+        self.windows: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, conversation_id: UUID) -> Optional[tuple]:
+        """Returns (messages, summary) or None if the conversation is not cached."""
+        window = self.windows.get(conversation_id)
+        if window is None:
+            self.misses += 1
+            return None
+        self.windows.move_to_end(conversation_id)
+        self.hits += 1
+        return list(window.messages), window.summary
+
+    def put(self, conversation_id: UUID, messages: Iterable[dict], summary: Optional[dict] = None) -> None:
+        """Replaces a conversation's window (e.g. after a cold load or a compaction)."""
+        self.windows[conversation_id] = ConversationWindow(messages, summary, self.window_size)
+        self.windows.move_to_end(conversation_id)
+        while len(self.windows) > self.max_conversations:
+            self.windows.popitem(last=False)
+
+    def append(self, conversation_id: UUID, messages: Iterable[dict]) -> None:
+        """Write-through for committed messages; ignored for uncached conversations."""
+        window = self.windows.get(conversation_id)
+        if window is not None:
+            window.messages.extend(messages)
+            self.windows.move_to_end(conversation_id)
+
+    def discard(self, conversation_id: UUID) -> None:
+        self.windows.pop(conversation_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "conversations": len(self.windows),
+            "max_conversations": self.max_conversations,
+            "window_size": self.window_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# Process-wide cache shared by all requests.
+conversation_window_cache = ConversationWindowCache()
@@ -0,0 +1,199 @@
+from typing import Any, AsyncIterable, AsyncIterator, Iterable, List, NamedTuple, Optional, Union
+import os
+import asyncio
+import random
+import time
+
+# Gemini's batchEmbedContents accepts up to 100 texts per request.
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+# Embedding API calls per minute allowed by our quota (one call per batch).
+EMBEDDING_REQUESTS_PER_MINUTE = float(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE", "150"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))
+# With a streaming job source, a partial batch is sent once no new job has
+# arrived for this long instead of waiting to be filled.
+EMBEDDING_FLUSH_SECONDS = float(os.getenv("EMBEDDING_FLUSH_SECONDS", "0.5"))
+
+RETRYABLE_MARKERS = ("429", "resource_exhausted", "rate limit", "503", "unavailable", "internal error")
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, tokens: float = 1):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+
+class EmbeddingResult(NamedTuple):
+    key: Any
+    vectors: Optional[List[List[float]]]
+    error: Optional[Exception]
+
+
+class _JobState:
+    def __init__(self, key, size: int):
+        self.key = key
+        self.vectors = [None] * size
+        self.remaining = size
+        self.error = None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Rate-limit (429) and transient server errors are retried with backoff."""
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if code in (429, 500, 503):
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in RETRYABLE_MARKERS)
+
+
+class EmbeddingPipeline:
+    """
+    Embeds the chunks of many documents concurrently.
+
+    Chunks from consecutive documents are packed into full provider-sized
+    batches, up to `max_concurrency` batches are in flight at once, calls are
+    paced by a token bucket and retried with exponential backoff on 429s.
+    Each document is yielded as soon as all of its chunks are embedded, so
+    the caller can write it to the database while later batches are running.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        max_concurrency: int = EMBEDDING_MAX_CONCURRENCY,
+        requests_per_minute: float = EMBEDDING_REQUESTS_PER_MINUTE,
+        max_retries: int = EMBEDDING_MAX_RETRIES,
+        flush_seconds: float = EMBEDDING_FLUSH_SECONDS,
+    ):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.flush_seconds = flush_seconds
+        self.rate_limiter = TokenBucket(
+            rate=requests_per_minute / 60,
+            capacity=max(1.0, float(max_concurrency))
+        )
+
+    async def run(self, jobs: Union[Iterable[tuple], AsyncIterable[tuple]]) -> AsyncIterator[EmbeddingResult]:
+        """
+        `jobs` yields (key, texts) pairs, synchronously or asynchronously
+        (e.g. straight from a streaming source). Yields an EmbeddingResult per
+        job in completion order; `error` is set if any of the job's batches failed.
+        Jobs are only pulled while a batch slot is free, so a streaming source
+        is not read further ahead than the embedder can keep up with.
+        """
+        results: asyncio.Queue = asyncio.Queue()
+        slots = asyncio.Semaphore(self.max_concurrency)
+        batch_tasks = set()
+        done = object()
+
+        async def embed_batch(batch: list):
+            try:
+                vectors, error = await self._embed_with_retry([text for _, _, text in batch]), None
+            except Exception as e:
+                vectors, error = None, e
+            finally:
+                slots.release()
+
+            for i, (state, position, _) in enumerate(batch):
+                if error is not None:
+                    state.error = state.error or error
+                else:
+                    state.vectors[position] = vectors[i]
+                state.remaining -= 1
+                if state.remaining == 0:
+                    results.put_nowait(EmbeddingResult(
+                        state.key,
+                        None if state.error else state.vectors,
+                        state.error
+                    ))
+
+        async def dispatch(batch: list):
+            await slots.acquire()
+            task = asyncio.create_task(embed_batch(batch))
+            batch_tasks.add(task)
+            task.add_done_callback(batch_tasks.discard)
+
+        async def produce():
+            batch = []
+
+            async def add(key, texts: List[str]):
+                nonlocal batch
+                if not texts:
+                    results.put_nowait(EmbeddingResult(key, [], None))
+                    return
+                state = _JobState(key, len(texts))
+                for position, text in enumerate(texts):
+                    batch.append((state, position, text))
+                    if len(batch) == self.batch_size:
+                        await dispatch(batch)
+                        batch = []
+
+            try:
+                if hasattr(jobs, "__aiter__"):
+                    iterator = jobs.__aiter__()
+                    while True:
+                        next_job = asyncio.ensure_future(iterator.__anext__())
+                        try:
+                            if batch and not (await asyncio.wait({next_job}, timeout=self.flush_seconds))[0]:
+                                # The source is slower than the embedder: don't leave chunks waiting
+                                pending, batch = batch, []
+                                await dispatch(pending)
+                            key, texts = await next_job
+                        except StopAsyncIteration:
+                            break
+                        finally:
+                            next_job.cancel()
+                        await add(key, texts)
+                else:
+                    for key, texts in jobs:
+                        await add(key, texts)
+                if batch:
+                    await dispatch(batch)
+                if batch_tasks:
+                    await asyncio.gather(*batch_tasks)
+            finally:
+                results.put_nowait(done)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                item = await results.get()
+                if item is done:
+                    break
+                yield item
+            await producer
+        finally:
+            producer.cancel()
+            for task in list(batch_tasks):
+                task.cancel()
+
+    async def _embed_with_retry(self, texts: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.acquire()
+            try:
+                return await self.embeddings.aembed_documents(texts)
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                delay = min(60.0, 2 ** attempt) + random.uniform(0, 1)
+                print(f"Embedding batch failed ({e}); retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
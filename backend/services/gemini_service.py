@@ -1,11 +1,28 @@
 import os
+import time
+import asyncio
+from typing import BinaryIO
 from google import genai
 from google.genai import types
 from dotenv import load_dotenv
+from services import metrics
+from services.audio import AUDIO_SNIFF_BYTES, detect_audio_mime_type
 import json
 
 load_dotenv()
 
+# Per-process cap on in-flight async generations and the overall deadline for
+# each one (time spent waiting for a slot counts towards the deadline).
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "256"))
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "60"))
+
+# Requests with inline data must stay under 20 MB in total, so larger audio
+# is uploaded through the Files API and referenced by URI instead.
+GEMINI_INLINE_AUDIO_MAX_BYTES = int(os.getenv("GEMINI_INLINE_AUDIO_MAX_BYTES", str(15 * 1024 * 1024)))
+GEMINI_FILE_POLL_SECONDS = float(os.getenv("GEMINI_FILE_POLL_SECONDS", "1"))
+
+_generation_semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+
 class GeminiService:
     def __init__(self):
         self.api_key = os.getenv("GEMINI_API_KEY")
@@ -16,10 +33,19 @@ class GeminiService:
         # Model definitions
         self.FAST_MODEL = "gemini-2.5-flash-lite" # As requested
         self.INTELLIGENT_MODEL = "gemini-3.0-pro-exp" # As requested, defaulting to pro-exp for 3.0
+        # Only Live API models accept live.connect
+        self.LIVE_MODEL = os.getenv("GEMINI_LIVE_MODEL", "gemini-live-2.5-flash-preview")
         
+    async def aclose(self):
+        """Closes the pooled HTTP connections of both the async and sync clients."""
+        await self.client.aio.aclose()
+        self.client.close()
+
     def _get_model_name(self, model_type: str = "fast") -> str:
         if model_type == "intelligent":
             return self.INTELLIGENT_MODEL
+        if model_type == "live":
+            return self.LIVE_MODEL
         return self.FAST_MODEL
 
     def generate_content(self, prompt: str, model_type: str = "fast", **kwargs):
@@ -35,26 +61,198 @@ class GeminiService:
         )
         return response.text
 
+    async def agenerate_content(self, prompt, model_type: str = "fast", **kwargs) -> str:
+        """
+        Async text generation on the SDK's `client.aio` surface.
+        Bounded by GEMINI_MAX_CONCURRENCY and GEMINI_TIMEOUT_SECONDS.
+        """
+        model = self._get_model_name(model_type)
+        try:
+            response = await self._run_limited(
+                lambda: self.client.aio.models.generate_content(
+                    model=model,
+                    contents=prompt,
+                    config=types.GenerateContentConfig(**kwargs)
+                )
+            )
+        except Exception:
+            metrics.count_error("gemini", model_type)
+            raise
+        metrics.count_tokens(model_type, response.usage_metadata)
+        return response.text
+
+    async def astream_content(self, prompt, model_type: str = "fast", **kwargs):
+        """
+        Async streaming text generation. Yields text chunks as Gemini produces them.
+        https://ai.google.dev/gemini-api/docs/text-generation#generate-a-text-stream
+        """
+        model = self._get_model_name(model_type)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + GEMINI_TIMEOUT_SECONDS
+
+        usage = None
+        async with _generation_semaphore:
+            try:
+                stream = await self._with_deadline(
+                    self.client.aio.models.generate_content_stream(
+                        model=model,
+                        contents=prompt,
+                        config=types.GenerateContentConfig(**kwargs)
+                    ),
+                    deadline
+                )
+                iterator = stream.__aiter__()
+                while True:
+                    try:
+                        chunk = await self._with_deadline(iterator.__anext__(), deadline)
+                    except StopAsyncIteration:
+                        break
+                    # Usage is cumulative; the last chunk carries the totals
+                    usage = chunk.usage_metadata or usage
+                    if chunk.text:
+                        yield chunk.text
+            except Exception:
+                metrics.count_error("gemini", model_type)
+                raise
+        metrics.count_tokens(model_type, usage)
+
+    async def _with_deadline(self, awaitable, deadline: float):
+        remaining = deadline - asyncio.get_running_loop().time()
+        try:
+            return await asyncio.wait_for(awaitable, timeout=max(remaining, 0))
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Gemini generation timed out after {GEMINI_TIMEOUT_SECONDS}s")
+
+    async def _run_limited(self, call):
+        """Awaits `call()` under the process-wide concurrency limit and timeout."""
+        async def _limited():
+            async with _generation_semaphore:
+                return await call()
+
+        try:
+            return await asyncio.wait_for(_limited(), timeout=GEMINI_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Gemini generation timed out after {GEMINI_TIMEOUT_SECONDS}s")
+
     def generate_with_audio(self, audio_path: str, prompt: str, model_type: str = "fast"):
         """
         Audio input processing.
         https://ai.google.dev/gemini-api/docs/audio
         """
         model = self._get_model_name(model_type)
-        
-        # Read audio file
-        with open(audio_path, "rb") as f:
-            audio_content = f.read()
-            
-        response = self.client.models.generate_content(
-            model=model,
-            contents=[
-                types.Part.from_bytes(data=audio_content, mime_type="audio/mp3"), # Assuming mp3, can be parameterized
-                prompt
-            ]
-        )
+
+        uploaded = None
+        try:
+            with open(audio_path, "rb") as f:
+                mime_type = detect_audio_mime_type(f.read(AUDIO_SNIFF_BYTES)) or "audio/mp3"
+                if os.path.getsize(audio_path) > GEMINI_INLINE_AUDIO_MAX_BYTES:
+                    uploaded = self._upload_file(audio_path, mime_type)
+                    audio_part = types.Part.from_uri(file_uri=uploaded.uri, mime_type=uploaded.mime_type)
+                else:
+                    f.seek(0)
+                    audio_part = types.Part.from_bytes(data=f.read(), mime_type=mime_type)
+
+            response = self.client.models.generate_content(
+                model=model,
+                contents=[audio_part, prompt]
+            )
+        finally:
+            if uploaded is not None:
+                self._delete_file(uploaded.name)
+        return response.text
+
+    def _upload_file(self, path: str, mime_type: str) -> types.File:
+        """Sync counterpart of _aupload_file."""
+        uploaded = self.client.files.upload(file=path, config=types.UploadFileConfig(mime_type=mime_type))
+        deadline = time.monotonic() + GEMINI_TIMEOUT_SECONDS
+        while uploaded.state == types.FileState.PROCESSING:
+            if time.monotonic() >= deadline:
+                self._delete_file(uploaded.name)
+                raise TimeoutError(f"Gemini file processing timed out after {GEMINI_TIMEOUT_SECONDS}s")
+            time.sleep(GEMINI_FILE_POLL_SECONDS)
+            uploaded = self.client.files.get(name=uploaded.name)
+        if uploaded.state == types.FileState.FAILED:
+            self._delete_file(uploaded.name)
+            raise RuntimeError(f"Gemini could not process the uploaded file: {uploaded.error}")
+        return uploaded
+
+    def _delete_file(self, name: str):
+        try:
+            self.client.files.delete(name=name)
+        except Exception as e:
+            print(f"Failed to delete Gemini file {name}: {e}")
+
+    async def agenerate_with_audio(
+        self,
+        audio: BinaryIO,
+        mime_type: str,
+        prompt: str,
+        model_type: str = "fast",
+        **kwargs
+    ) -> str:
+        """
+        Async audio input processing. `audio` is a seekable binary file (e.g.
+        a spooled upload), read from the start. Up to
+        GEMINI_INLINE_AUDIO_MAX_BYTES it is sent inline; larger files are
+        streamed to the Files API, referenced by URI and deleted afterwards,
+        so they are never held in memory as a whole.
+        https://ai.google.dev/gemini-api/docs/audio
+        """
+        model = self._get_model_name(model_type)
+        size = audio.seek(0, os.SEEK_END)
+        audio.seek(0)
+
+        uploaded = None
+        try:
+            if size > GEMINI_INLINE_AUDIO_MAX_BYTES:
+                uploaded = await self._aupload_file(audio, mime_type)
+                audio_part = types.Part.from_uri(file_uri=uploaded.uri, mime_type=uploaded.mime_type)
+            else:
+                audio_part = types.Part.from_bytes(data=await asyncio.to_thread(audio.read), mime_type=mime_type)
+            response = await self._run_limited(
+                lambda: self.client.aio.models.generate_content(
+                    model=model,
+                    contents=[audio_part, prompt],
+                    config=types.GenerateContentConfig(**kwargs)
+                )
+            )
+        except Exception:
+            metrics.count_error("gemini", model_type)
+            raise
+        finally:
+            if uploaded is not None:
+                await self._adelete_file(uploaded.name)
+        metrics.count_tokens(model_type, response.usage_metadata)
         return response.text
 
+    async def _aupload_file(self, file: BinaryIO, mime_type: str) -> types.File:
+        """Uploads `file` to the Files API and waits until it can be used in a prompt."""
+        uploaded = await self.client.aio.files.upload(file=file, config=types.UploadFileConfig(mime_type=mime_type))
+
+        async def _wait_until_active():
+            current = uploaded
+            while current.state == types.FileState.PROCESSING:
+                await asyncio.sleep(GEMINI_FILE_POLL_SECONDS)
+                current = await self.client.aio.files.get(name=current.name)
+            return current
+
+        try:
+            uploaded = await asyncio.wait_for(_wait_until_active(), timeout=GEMINI_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            await self._adelete_file(uploaded.name)
+            raise TimeoutError(f"Gemini file processing timed out after {GEMINI_TIMEOUT_SECONDS}s")
+        if uploaded.state == types.FileState.FAILED:
+            await self._adelete_file(uploaded.name)
+            raise RuntimeError(f"Gemini could not process the uploaded file: {uploaded.error}")
+        return uploaded
+
+    async def _adelete_file(self, name: str):
+        # Uploads expire after 48 hours anyway; a failed delete is not worth failing the request
+        try:
+            await self.client.aio.files.delete(name=name)
+        except Exception as e:
+            print(f"Failed to delete Gemini file {name}: {e}")
+
     def generate_thinking(self, prompt: str, model_type: str = "intelligent"):
         """
         Enable thinking/reasoning features.
@@ -133,15 +331,23 @@ class GeminiService:
         )
         return response
 
-    def create_live_session(self, model_type: str = "fast"):
+    def create_live_session(self, model_type: str = "live", resumption_handle: str = None, system_instruction: str = None):
         """
-        Setup for live sessions.
+        Setup for live sessions: an async context manager yielding the
+        session. Session resumption is enabled; passing the latest handle the
+        server sent (session_resumption_update.new_handle) continues that
+        conversation on a new connection.
         https://ai.google.dev/gemini-api/docs/live-session
         """
         model = self._get_model_name(model_type)
-        # This usually involves a WebSocket connection or similar async stream
-        # Returning the config or session object to be used by the caller
-        return self.client.aio.live.connect(model=model, config=types.LiveConnectConfig(response_modalities=["AUDIO"]))
+        return self.client.aio.live.connect(
+            model=model,
+            config=types.LiveConnectConfig(
+                response_modalities=["AUDIO"],
+                system_instruction=system_instruction,
+                session_resumption=types.SessionResumptionConfig(handle=resumption_handle)
+            )
+        )
 
     def create_ephemeral_token(self, ttl_seconds: int = 3600):
         """
@@ -171,3 +377,38 @@ class GeminiService:
             )
         )
         return cached_content
+
+    async def acreate_cached_content(
+        self,
+        content: str,
+        model_type: str = "fast",
+        ttl_seconds: int = 300,
+        system_instruction: str = None
+    ):
+        """
+        Async context caching. The returned cache's `name` is passed as
+        `cached_content=` to generation calls, which then only send the suffix.
+        """
+        model = self._get_model_name(model_type)
+        return await self._run_limited(
+            lambda: self.client.aio.caches.create(
+                model=model,
+                config=types.CreateCachedContentConfig(
+                    contents=[content],
+                    system_instruction=system_instruction,
+                    ttl=f"{ttl_seconds}s"
+                )
+            )
+        )
+
+    async def aupdate_cached_content_ttl(self, name: str, ttl_seconds: int):
+        """Extends a context cache's lifetime to `ttl_seconds` from now."""
+        return await self._run_limited(
+            lambda: self.client.aio.caches.update(
+                name=name,
+                config=types.UpdateCachedContentConfig(ttl=f"{ttl_seconds}s")
+            )
+        )
+
+    async def adelete_cached_content(self, name: str):
+        await self._run_limited(lambda: self.client.aio.caches.delete(name=name))
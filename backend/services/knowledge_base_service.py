@@ -1,190 +1,854 @@
-from typing import List
-from sqlalchemy import select, delete
+from typing import Any, List, Optional
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from sqlalchemy import select, insert, delete, update, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from langchain_community.document_loaders import NotionDBLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from db.models import Document, Embedding
-from services.gemini_service import GeminiService
+from db.bulk import copy_embeddings
+from db.models import Document, Embedding, KnowledgeBaseState
+from db.vector_index import (
+    VECTOR_INDEX_METHOD, VECTOR_INDEX_PRECISIONS, apply_search_params, ensure_vector_index, get_vector_index_config
+)
+from db.hybrid_search import (
+    RAG_TOP_K, HYBRID_VECTOR_WEIGHT, HYBRID_LEXICAL_WEIGHT, SearchFilters, batch_search_statement,
+    hybrid_search_statement, vector_search_statement
+)
+from services.clients import ClientRegistry, EMBEDDING_MODEL, get_client_registry
+from services.chunking import TextChunker, get_chunker
+from services.embedding_pipeline import EmbeddingPipeline
+from services.notion_source import NotionDatabaseSource
+from services.cache import LRUCache, query_embedding_cache, answer_cache
+from services.timing import StageTimer
 import os
 import asyncio
+import hashlib
+import uuid
 from dotenv import load_dotenv
 
 load_dotenv()
 
+SYNC_MODES = ("incremental", "full")
+# How long a worker trusts its cached KB version before re-reading it.
+KB_VERSION_TTL_SECONDS = float(os.getenv("KB_VERSION_TTL_SECONDS", "5"))
+# Embedded pages are written in batches of roughly this many chunks.
+SYNC_WRITE_BATCH_CHUNKS = int(os.getenv("SYNC_WRITE_BATCH_CHUNKS", "2000"))
+# Upper bound on the number of queries in one batch request.
+KB_BATCH_MAX_QUERIES = int(os.getenv("KB_BATCH_MAX_QUERIES", "100"))
+
+_kb_version_cache = LRUCache(max_entries=1, ttl_seconds=KB_VERSION_TTL_SECONDS)
+# Precision of the current ANN index, which decides the shape of search queries.
+_index_precision_cache = LRUCache(max_entries=1, ttl_seconds=KB_VERSION_TTL_SECONDS)
+
+class SyncProgress:
+    """Receives progress from `sync_knowledge_base`. The default ignores it."""
+
+    async def update(self, **fields):
+        pass
+
+    async def error(self, message: str):
+        pass
+
+@dataclass
+class DocumentPlan:
+    """What a sync has to do for one Notion page."""
+    doc: Any
+    source_id: str
+    stored: Any
+    title: str
+    content_hash: str
+    source_updated_at: Optional[datetime]
+    outcome: str = ""
+    chunks: List[str] = field(default_factory=list)
+    reusable: dict = field(default_factory=dict)
+    to_embed: List[str] = field(default_factory=list)
+    new_vectors: List[List[float]] = field(default_factory=list)
+
 class KnowledgeBaseService:
-    def __init__(self, db_session: AsyncSession):
+    def __init__(
+        self,
+        db_session: AsyncSession,
+        clients: Optional[ClientRegistry] = None,
+        chunker: Optional[TextChunker] = None
+    ):
         self.db = db_session
         self.notion_token = os.getenv("NOTION_TOKEN")
         self.database_id = os.getenv("NOTION_KNOWLEDGE_DATABASE_ID")
-        self.gemini_api_key = os.getenv("GEMINI_API_KEY")
-
-        if not self.gemini_api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment variables")
-
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/text-embedding-004",
-            google_api_key=self.gemini_api_key
-        )
-
-        self.gemini_service = GeminiService()
-
-    async def sync_knowledge_base(self):
+        # Alternative API endpoint, e.g. the fake Notion server used by the benchmarks
+        self.notion_base_url = os.getenv("NOTION_BASE_URL")
+
+        clients = clients or get_client_registry()
+        self.embeddings = clients.embeddings
+        self.gemini_service = clients.gemini
+        self.chunker = chunker or get_chunker()
+
+    async def sync_knowledge_base(
+        self,
+        mode: str = "incremental",
+        progress: Optional[SyncProgress] = None,
+        vector_precision: Optional[str] = None
+    ):
         """
         Syncs data from Notion to PostgreSQL with pgvector embeddings.
-        Full sync: deletes all existing data and re-indexes.
+
+        - incremental: compares each page's source_id and content hash with
+          the stored Document, only embeds chunks whose text changed and
+          deletes pages that no longer exist in Notion. Pages Notion reports
+          as last edited well before the previous sync are not fetched at all.
+        - full: deletes all existing data and re-indexes everything.
+
+        Pages are streamed from Notion (see NotionDatabaseSource), split in
+        worker processes (see TextChunker) and embedded while later pages are
+        still loading, so memory use does not grow with the size of the
+        workspace and the event loop stays free for other requests.
+
+        All changes are committed in a single transaction, so readers keep
+        seeing the previous knowledge base until the sync completes.
+        `progress` receives phase and counter updates (see SyncProgress).
+        `vector_precision` ("full", "halfvec" or "binary") switches the ANN
+        index to that precision once the new data is committed.
         """
+        if mode not in SYNC_MODES:
+            raise ValueError(f"Unknown sync mode: {mode}")
+        if vector_precision is not None and vector_precision not in VECTOR_INDEX_PRECISIONS:
+            raise ValueError(f"Unknown vector index precision: {vector_precision}")
+
         if not self.notion_token or not self.database_id:
             raise ValueError("Cannot sync: Notion credentials missing.")
 
-        print("Loading data from Notion...")
-        loader = NotionDBLoader(
-            integration_token=self.notion_token,
-            database_id=self.database_id,
-            request_timeout_sec=30,
-        )
+        progress = progress or SyncProgress()
+        started_at = datetime.now(timezone.utc)
+
+        if mode == "full":
+            # Clear existing data (full sync approach); rolled back if Notion has no pages
+            await self.db.execute(delete(Document))
+            existing = {}
+            last_sync_started_at = None
+            print("Cleared existing knowledge base.")
+        else:
+            existing = await self._load_existing_documents()
+            last_sync_started_at = await self.db.scalar(
+                select(KnowledgeBaseState.last_sync_started_at).where(KnowledgeBaseState.id == 1)
+            )
 
-        # NotionDBLoader.load() is synchronous, run in thread pool
-        docs = await asyncio.to_thread(loader.load)
-        print(f"Loaded {len(docs)} documents from Notion.")
+        print("Streaming pages from Notion...")
+        await progress.update(phase="streaming")
+        source = self._document_source(existing, last_sync_started_at)
 
-        if not docs:
+        stats = {"added": 0, "updated": 0, "unchanged": 0, "deleted": 0, "failed": 0}
+        total_chunks = 0
+        chunks_embedded = 0
+        documents_processed = 0
+        seen_source_ids = set()
+        # Planning and writing share the session, and run concurrently
+        db_lock = asyncio.Lock()
+
+        async def plan_documents():
+            """
+            Works out what each page needs as it arrives from Notion. Unchanged
+            pages are settled here; the rest are passed on to be split.
+            """
+            nonlocal total_chunks, documents_processed
+            async with aclosing(source.documents()) as docs:
+                async for doc in docs:
+                    source_id = doc.metadata.get("id", str(hash(doc.page_content)))
+                    if source_id in seen_source_ids:
+                        continue
+                    seen_source_ids.add(source_id)
+
+                    # A failing page is rolled back on its own and the sync carries on
+                    try:
+                        async with db_lock, self.db.begin_nested():
+                            plan = await self._plan_document(doc, source_id, existing.get(source_id))
+                    except Exception as e:
+                        stats["failed"] += 1
+                        print(f"Failed to process document {source_id}: {e}")
+                        await progress.error(f"{source_id}: {e}")
+                        continue
+
+                    if plan.outcome == "unchanged":
+                        stats["unchanged"] += 1
+                        total_chunks += plan.stored.chunk_count
+                        documents_processed += 1
+                    else:
+                        yield plan, doc.page_content
+
+        async def chunk_documents():
+            """
+            Splits changed pages in the chunker's worker processes, several at
+            a time, and lists the chunks that have no stored vector yet.
+            """
+            async with aclosing(self.chunker.split_stream(plan_documents())) as results:
+                async for plan, chunks, error in results:
+                    try:
+                        if error is not None:
+                            raise error
+                        async with db_lock:
+                            await self._plan_chunks(plan, chunks)
+                    except Exception as e:
+                        stats["failed"] += 1
+                        print(f"Failed to split document {plan.source_id}: {e}")
+                        await progress.error(f"{plan.source_id}: {e}")
+                        continue
+                    yield plan, plan.to_embed
+
+        # Pages are split and embedded concurrently while later pages are
+        # still loading, and written as soon as their vectors are ready.
+        pipeline = EmbeddingPipeline(self.embeddings)
+
+        write_batch = []
+
+        async def flush_writes():
+            nonlocal total_chunks, chunks_embedded, documents_processed
+            async with db_lock:
+                written, failures = await self._write_document_batch(write_batch)
+            for plan in written:
+                stats[plan.outcome] += 1
+                total_chunks += len(plan.chunks)
+                chunks_embedded += len(plan.to_embed)
+                documents_processed += 1
+            for plan, error in failures:
+                stats["failed"] += 1
+                print(f"Failed to process document {plan.source_id}: {error}")
+                await progress.error(f"{plan.source_id}: {error}")
+            write_batch.clear()
+            await progress.update(
+                documents_total=source.pages_found,
+                documents_processed=documents_processed,
+                chunks_embedded=chunks_embedded
+            )
+
+        async for result in pipeline.run(chunk_documents()):
+            plan = result.key
+            if result.error is not None:
+                stats["failed"] += 1
+                print(f"Failed to embed document {plan.source_id}: {result.error}")
+                await progress.error(f"{plan.source_id}: {result.error}")
+                continue
+
+            plan.new_vectors = result.vectors
+            write_batch.append(plan)
+            if sum(len(p.chunks) for p in write_batch) >= SYNC_WRITE_BATCH_CHUNKS:
+                await flush_writes()
+
+        if write_batch:
+            await flush_writes()
+
+        # Pages skipped because Notion reports them unedited since the last complete sync
+        for source_id in source.unchanged:
+            seen_source_ids.add(source_id)
+            stats["unchanged"] += 1
+            total_chunks += existing[source_id].chunk_count
+            documents_processed += 1
+        # Pages that could not be loaded are kept as they are
+        for source_id, error in source.failed:
+            seen_source_ids.add(source_id)
+            stats["failed"] += 1
+            print(f"Failed to load document {source_id}: {error}")
+            await progress.error(f"{source_id}: {error}")
+        print(f"Loaded {source.pages_found} documents from Notion.")
+
+        if not seen_source_ids:
+            await self.db.rollback()
             print("No documents found in Notion database.")
             return {"status": "success", "message": "No documents found to sync."}
 
-        # Split text into chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            separators=["\n\n", "\n", " ", ""]
-        )
+        await progress.update(documents_total=source.pages_found, documents_processed=documents_processed)
+
+        # Remove pages that no longer exist in Notion
+        removed = [source_id for source_id in existing if source_id not in seen_source_ids]
+        if removed:
+            await self.db.execute(delete(Document).where(Document.source_id.in_(removed)))
+            stats["deleted"] = len(removed)
+
+        changed = mode == "full" or stats["added"] or stats["updated"] or stats["deleted"]
+        if changed:
+            version = await self._bump_kb_version()
+        if not stats["failed"]:
+            # Pages that failed keep their old content, so they must not be skipped next time
+            await self._record_sync_start(started_at)
 
-        # Clear existing data (full sync approach)
-        await self.db.execute(delete(Document))
+        await progress.update(phase="committing")
         await self.db.commit()
-        print("Cleared existing knowledge base.")
 
-        total_chunks = 0
+        if changed:
+            # Answers generated against the previous knowledge base are stale
+            _kb_version_cache.set("version", version)
+            answer_cache.clear()
+
+        vector_index = None
+        if vector_precision is not None:
+            await progress.update(phase="indexing")
+            vector_index = await self.set_index_precision(vector_precision)
+        print(
+            f"Knowledge base sync complete ({mode}). {len(seen_source_ids)} documents, "
+            f"{total_chunks} chunks indexed, {chunks_embedded} chunks embedded. {stats}"
+        )
+
+        return {
+            "status": "success",
+            "mode": mode,
+            "documents_loaded": len(seen_source_ids),
+            "chunks_created": total_chunks,
+            "chunks_embedded": chunks_embedded,
+            **stats,
+            "vector_index": vector_index
+        }
+
+    def _document_source(self, existing: dict, last_sync_started_at: Optional[datetime]) -> NotionDatabaseSource:
+        """
+        Streaming source over the Notion knowledge database. Stored pages last
+        edited before the previous complete sync started are not fetched again.
+        """
+        return NotionDatabaseSource(
+            self.notion_token,
+            self.database_id,
+            base_url=self.notion_base_url,
+            known_ids=existing.keys(),
+            edited_before=last_sync_started_at
+        )
 
-        for doc in docs:
-            # Extract Notion page metadata
-            source_id = doc.metadata.get("id", str(hash(doc.page_content)))
-            title = doc.metadata.get("title", "Untitled")
-
-            # Create document record
-            db_doc = Document(
-                source_id=source_id,
-                title=title,
-                content=doc.page_content,
-                meta=self._filter_metadata(doc.metadata)
+    async def _plan_document(self, doc, source_id: str, stored) -> DocumentPlan:
+        """
+        Compares a Notion page with its stored row (if any). Unchanged pages
+        only get their metadata refreshed; otherwise the page is marked as
+        added or updated and is split afterwards (see _plan_chunks).
+        """
+        title = doc.metadata.get("title", "Untitled")
+        content_hash = self._content_hash(doc.page_content)
+        source_updated_at = self._source_updated_at(doc.metadata)
+        plan = DocumentPlan(
+            doc=doc,
+            source_id=source_id,
+            stored=stored,
+            title=title,
+            content_hash=content_hash,
+            source_updated_at=source_updated_at
+        )
+
+        if stored is not None and self._is_unchanged(stored, content_hash):
+            # Content is identical: refresh metadata only, no re-embedding
+            await self.db.execute(
+                update(Document).where(Document.id == stored.id).values(
+                    title=title,
+                    meta=self._filter_metadata(doc.metadata),
+                    source_updated_at=source_updated_at
+                )
             )
-            self.db.add(db_doc)
-            await self.db.flush()
-
-            # Split into chunks
-            chunks = text_splitter.split_text(doc.page_content)
-
-            # Generate embeddings for all chunks (batch operation)
-            embeddings_list = await self._generate_embeddings_batch(chunks)
-
-            # Store embeddings
-            for idx, (chunk_text, embedding_vector) in enumerate(zip(chunks, embeddings_list)):
-                db_embedding = Embedding(
-                    document_id=db_doc.id,
-                    chunk_text=chunk_text,
-                    chunk_index=idx,
-                    embedding=embedding_vector,
-                    meta={"source_title": title}
+            if stored.title != title:
+                await self.db.execute(
+                    update(Embedding).where(Embedding.document_id == stored.id).values(
+                        meta={"source_title": title}
+                    )
                 )
-                self.db.add(db_embedding)
+            plan.outcome = "unchanged"
+            return plan
 
-            total_chunks += len(chunks)
-            print(f"Processed document: {title} ({len(chunks)} chunks)")
+        plan.outcome = "added" if stored is None else "updated"
+        return plan
 
-        await self.db.commit()
-        print(f"Knowledge base sync complete. {len(docs)} documents, {total_chunks} chunks indexed.")
+    async def _plan_chunks(self, plan: DocumentPlan, chunks: List[str]):
+        """Lists the chunks of a changed page whose text has no stored vector."""
+        plan.chunks = chunks
+        if plan.stored is not None:
+            plan.reusable = await self._load_chunk_embeddings(plan.stored.id)
+        plan.to_embed = [chunk for chunk in dict.fromkeys(plan.chunks) if chunk not in plan.reusable]
 
-        return {
-            "status": "success",
-            "documents_loaded": len(docs),
-            "chunks_created": total_chunks
-        }
+    async def _write_document_batch(self, plans: List[DocumentPlan]) -> tuple:
+        """
+        Writes a batch of planned pages in one savepoint. If the batch fails,
+        pages are retried one by one so a single bad page does not sink the rest.
+        Returns (written plans, [(failed plan, error)]).
+        """
+        try:
+            async with self.db.begin_nested():
+                await self._write_documents(plans)
+            return list(plans), []
+        except Exception as e:
+            if len(plans) == 1:
+                return [], [(plans[0], e)]
+
+        written, failures = [], []
+        for plan in plans:
+            try:
+                async with self.db.begin_nested():
+                    await self._write_documents([plan])
+                written.append(plan)
+            except Exception as e:
+                failures.append((plan, e))
+        return written, failures
+
+    async def _write_documents(self, plans: List[DocumentPlan]):
+        """
+        Bulk-writes planned pages: one multi-row INSERT for new documents, one
+        executemany UPDATE for changed ones, one DELETE of their old chunks and
+        a single binary COPY for all chunk embeddings.
+        """
+        now = datetime.now(timezone.utc)
+        new_rows, updated_rows, embedding_rows = [], [], []
+
+        for plan in plans:
+            doc = plan.doc
+            row = {
+                "title": plan.title,
+                "content": doc.page_content,
+                "meta": self._filter_metadata(doc.metadata),
+                "content_hash": plan.content_hash,
+                "source_updated_at": plan.source_updated_at,
+                "updated_at": now
+            }
+            if plan.stored is None:
+                document_id = uuid.uuid4()
+                new_rows.append({**row, "id": document_id, "source_id": plan.source_id, "created_at": now})
+            else:
+                document_id = plan.stored.id
+                updated_rows.append({**row, "id": document_id})
+
+            vectors = {**plan.reusable, **dict(zip(plan.to_embed, plan.new_vectors))}
+            for idx, chunk_text in enumerate(plan.chunks):
+                embedding_rows.append({
+                    "id": uuid.uuid4(),
+                    "document_id": document_id,
+                    "chunk_text": chunk_text,
+                    "chunk_index": idx,
+                    "embedding": vectors[chunk_text],
+                    "meta": {"source_title": plan.title},
+                    "created_at": now
+                })
+
+        if new_rows:
+            await self.db.execute(insert(Document), new_rows)
+        if updated_rows:
+            await self.db.execute(
+                delete(Embedding).where(Embedding.document_id.in_([row["id"] for row in updated_rows]))
+            )
+            await self.db.execute(update(Document), updated_rows)
+        if embedding_rows:
+            await copy_embeddings(self.db, embedding_rows)
+
+        for plan in plans:
+            print(f"Processed document: {plan.title} ({len(plan.chunks)} chunks, {len(plan.to_embed)} embedded)")
+
+    async def _load_existing_documents(self) -> dict:
+        """Returns stored documents keyed by source_id (without their content)."""
+        chunk_count = (
+            select(func.count(Embedding.id))
+            .where(Embedding.document_id == Document.id)
+            .correlate(Document)
+            .scalar_subquery()
+        )
+        stmt = select(
+            Document.id,
+            Document.source_id,
+            Document.title,
+            Document.content_hash,
+            Document.source_updated_at,
+            chunk_count.label("chunk_count")
+        )
+        result = await self.db.execute(stmt)
+        return {row.source_id: row for row in result}
 
-    async def _generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for multiple texts (batch operation)."""
-        embeddings = await self.embeddings.aembed_documents(texts)
-        return embeddings
+    async def _load_chunk_embeddings(self, document_id) -> dict:
+        """Maps chunk text to its stored vector so unchanged chunks are not re-embedded."""
+        stmt = select(Embedding.chunk_text, Embedding.embedding).where(
+            Embedding.document_id == document_id
+        )
+        result = await self.db.execute(stmt)
+        return {row.chunk_text: row.embedding for row in result}
+
+    def _content_hash(self, content: str) -> str:
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def _source_updated_at(self, metadata: dict) -> Optional[datetime]:
+        """Parses Notion's last_edited_time from page metadata, if present."""
+        for key in ("last_edited_time", "last edited time", "last edited"):
+            value = metadata.get(key)
+            if isinstance(value, str):
+                try:
+                    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+                except ValueError:
+                    continue
+        return None
+
+    def _is_unchanged(self, stored, content_hash: str) -> bool:
+        # Not last_edited_time: Notion rounds it to the minute, so an edit made
+        # in the same minute as the previous sync would keep its old vectors.
+        return stored.content_hash == content_hash
 
     def _filter_metadata(self, metadata: dict) -> dict:
-        """Filter out complex metadata types that can't be stored in JSONB."""
+        """
+        Filter out complex metadata types that can't be stored in JSONB.
+        Lists of scalars (e.g. Notion multi-select tags) are kept so they can
+        be matched by metadata filters.
+        """
+        scalars = (str, int, float, bool, type(None))
         filtered = {}
         for key, value in metadata.items():
-            if isinstance(value, (str, int, float, bool, type(None))):
+            if isinstance(value, scalars):
                 filtered[key] = value
             elif isinstance(value, dict):
                 filtered[key] = self._filter_metadata(value)
+            elif isinstance(value, (list, tuple)) and all(isinstance(item, scalars) for item in value):
+                filtered[key] = list(value)
         return filtered
 
-    async def get_relevant_context(self, query: str, k: int = 4) -> List[dict]:
+    async def rebuild_vector_index(self, method: str, precision: Optional[str] = None, **options) -> dict:
         """
-        Retrieves relevant document chunks using pgvector cosine similarity.
+        (Re)builds the ANN index on embeddings using the given method, at the
+        given precision (default: keep the current one).
         """
-        # Generate embedding for the query
-        query_embedding = await self.embeddings.aembed_query(query)
+        conn = await self.db.connection()
+        if precision is None:
+            current = await get_vector_index_config(conn)
+            precision = current["precision"] if current else "full"
+        result = await ensure_vector_index(conn, method=method, rebuild=True, precision=precision, **options)
+        await self.db.commit()
+        _index_precision_cache.set("precision", precision)
+        return result
+
+    async def set_index_precision(self, precision: str) -> dict:
+        """Switches the ANN index to `precision`, keeping its method (no-op if unchanged)."""
+        conn = await self.db.connection()
+        current = await get_vector_index_config(conn)
+        method = current["method"] if current else VECTOR_INDEX_METHOD
+        result = await ensure_vector_index(conn, method=method, precision=precision)
+        await self.db.commit()
+        _index_precision_cache.set("precision", precision)
+        return result
+
+    async def get_index_precision(self) -> str:
+        """Precision of the current ANN index, cached in-process like the KB version."""
+        precision = _index_precision_cache.get("precision")
+        if precision is None:
+            current = await get_vector_index_config(await self.db.connection())
+            precision = current["precision"] if current else "full"
+            _index_precision_cache.set("precision", precision)
+        return precision
+
+    async def _bump_kb_version(self) -> int:
+        stmt = pg_insert(KnowledgeBaseState).values(id=1, version=1).on_conflict_do_update(
+            index_elements=[KnowledgeBaseState.id],
+            set_={"version": KnowledgeBaseState.version + 1, "updated_at": func.now()}
+        ).returning(KnowledgeBaseState.version)
+        return await self.db.scalar(stmt)
+
+    async def _record_sync_start(self, started_at: datetime):
+        stmt = pg_insert(KnowledgeBaseState).values(id=1, last_sync_started_at=started_at).on_conflict_do_update(
+            index_elements=[KnowledgeBaseState.id],
+            set_={"last_sync_started_at": started_at}
+        )
+        await self.db.execute(stmt)
+
+    async def get_kb_version(self) -> int:
+        """Current knowledge-base version, cached in-process for KB_VERSION_TTL_SECONDS."""
+        version = _kb_version_cache.get("version")
+        if version is None:
+            version = await self.db.scalar(
+                select(KnowledgeBaseState.version).where(KnowledgeBaseState.id == 1)
+            ) or 0
+            _kb_version_cache.set("version", version)
+        return version
+
+    async def embed_query(self, query: str) -> List[float]:
+        """Embeds a query (cached across requests)."""
+        return await query_embedding_cache.get_or_compute(
+            EMBEDDING_MODEL,
+            query,
+            lambda: self.embeddings.aembed_query(query)
+        )
 
-        # Perform vector similarity search using pgvector
-        stmt = select(Embedding).order_by(
-            Embedding.embedding.cosine_distance(query_embedding)
-        ).limit(k)
+    async def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embeds many queries in one batched call; cached queries are not re-embedded."""
+        # RETRIEVAL_QUERY is the task type aembed_query uses, so both paths share cache entries
+        return await query_embedding_cache.get_or_compute_many(
+            EMBEDDING_MODEL,
+            queries,
+            lambda texts: self.embeddings.aembed_documents(texts, task_type="RETRIEVAL_QUERY")
+        )
 
+    @staticmethod
+    def _answer_partition(
+        model_type: str,
+        k: int = RAG_TOP_K,
+        vector_weight: float = HYBRID_VECTOR_WEIGHT,
+        lexical_weight: float = HYBRID_LEXICAL_WEIGHT,
+        filters: Optional[SearchFilters] = None
+    ) -> str:
+        """Answers are only reused for the same model, retrieval settings and filters."""
+        partition = f"{model_type}:k={k}:w={vector_weight:g},{lexical_weight:g}"
+        if filters is not None and not filters.is_empty():
+            partition += f":f={filters.cache_key()}"
+        return partition
+
+    async def lookup_cached_answer(
+        self,
+        query_embedding: List[float],
+        model_type: str,
+        version: int,
+        **retrieval
+    ) -> Optional[dict]:
+        """
+        Returns a previous RAG result for a near-identical query against KB
+        `version`. Callers read the version (get_kb_version) once, before
+        retrieval, and store the answer they generate under that same version.
+        """
+        match = answer_cache.lookup(query_embedding, self._answer_partition(model_type, **retrieval), version)
+        if match is None:
+            return None
+        cached, similarity = match
+        return {
+            **cached,
+            "metadata": {
+                "cache_hit": True,
+                "similarity": round(similarity, 4),
+                "cached_query": cached["query"],
+                "kb_version": version
+            }
+        }
+
+    async def store_answer(
+        self,
+        query: str,
+        query_embedding: List[float],
+        model_type: str,
+        result: dict,
+        version: int,
+        **retrieval
+    ):
+        answer_cache.store(query_embedding, self._answer_partition(model_type, **retrieval), version, {
+            "query": query,
+            "answer": result["answer"],
+            "context_used": result["context_used"],
+            "sources": result["sources"]
+        })
+
+    async def get_relevant_context(
+        self,
+        query: str,
+        k: int = RAG_TOP_K,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        query_embedding: Optional[List[float]] = None,
+        vector_weight: float = HYBRID_VECTOR_WEIGHT,
+        lexical_weight: float = HYBRID_LEXICAL_WEIGHT,
+        filters: Optional[SearchFilters] = None
+    ) -> List[dict]:
+        """
+        Retrieves relevant document chunks with hybrid search: pgvector cosine
+        similarity and Postgres full-text search, fused by reciprocal rank in
+        a single statement. A lexical_weight of 0 runs vector search only.
+        ef_search / probes tune ANN recall for this query only; `filters`
+        restrict the search to matching documents inside the same statement.
+        """
+        if k < 1:
+            raise ValueError("k must be at least 1")
+        if vector_weight < 0 or lexical_weight < 0:
+            raise ValueError("Fusion weights must not be negative")
+
+        if query_embedding is None:
+            query_embedding = await self.embed_query(query)
+
+        filtered = filters is not None and not filters.is_empty()
+        precision = await self.get_index_precision()
+        await apply_search_params(self.db, ef_search=ef_search, probes=probes, filtered=filtered)
+        if lexical_weight > 0 and query.strip():
+            stmt = hybrid_search_statement(
+                query, query_embedding, k,
+                vector_weight=vector_weight, lexical_weight=lexical_weight, filters=filters, precision=precision
+            )
+            result = await self.db.execute(stmt)
+            embeddings = [row[0] for row in result.all()]
+        else:
+            stmt = vector_search_statement(query_embedding, k, filters=filters, precision=precision)
+            result = await self.db.execute(stmt)
+            embeddings = result.scalars().all()
+
+        return [self._context_doc(emb) for emb in embeddings]
+
+    async def get_relevant_contexts(
+        self,
+        queries: List[str],
+        k: int = RAG_TOP_K,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        query_embeddings: Optional[List[List[float]]] = None,
+        vector_weight: float = HYBRID_VECTOR_WEIGHT,
+        lexical_weight: float = HYBRID_LEXICAL_WEIGHT,
+        filters: Optional[SearchFilters] = None
+    ) -> List[List[dict]]:
+        """
+        Batch version of get_relevant_context: the top-k chunks of every query
+        are resolved by a single statement (one LATERAL search per query).
+        Returns one list of chunks per query, in order.
+        """
+        if k < 1:
+            raise ValueError("k must be at least 1")
+        if vector_weight < 0 or lexical_weight < 0:
+            raise ValueError("Fusion weights must not be negative")
+
+        if query_embeddings is None:
+            query_embeddings = await self.embed_queries(queries)
+
+        filtered = filters is not None and not filters.is_empty()
+        precision = await self.get_index_precision()
+        await apply_search_params(self.db, ef_search=ef_search, probes=probes, filtered=filtered)
+        stmt = batch_search_statement(
+            queries, query_embeddings, k,
+            vector_weight=vector_weight, lexical_weight=lexical_weight, filters=filters, precision=precision
+        )
         result = await self.db.execute(stmt)
-        embeddings = result.scalars().all()
 
-        # Format results similar to LangChain Document format
-        context_docs = []
-        for emb in embeddings:
-            context_docs.append({
-                "page_content": emb.chunk_text,
-                "metadata": {
-                    **emb.meta,
-                    "document_id": str(emb.document_id),
-                    "chunk_index": emb.chunk_index
-                }
-            })
+        contexts = [[] for _ in queries]
+        for position, emb in result.all():
+            contexts[position - 1].append(self._context_doc(emb))
+        return contexts
 
-        return context_docs
+    @staticmethod
+    def _context_doc(emb: Embedding) -> dict:
+        """Formats a chunk similar to LangChain's Document format."""
+        return {
+            "page_content": emb.chunk_text,
+            "metadata": {
+                **emb.meta,
+                "document_id": str(emb.document_id),
+                "chunk_index": emb.chunk_index
+            }
+        }
 
-    async def query_with_rag(self, query: str, model_type: str = "fast"):
-        """
-        Queries the Gemini model with context from the knowledge base (RAG).
-        """
-        # 1. Retrieve context
-        docs = await self.get_relevant_context(query)
+    def build_rag_prompt(self, query: str, docs: List[dict], history: Optional[str] = None) -> str:
+        """Builds the RAG prompt from retrieved context chunks and, in chat, the conversation so far."""
         context_text = "\n\n".join([doc["page_content"] for doc in docs])
+        history_text = f"\nConversation so far:\n{history}\n" if history else ""
 
-        # 2. Construct Prompt
-        prompt = f"""
+        return f"""
 You are a helpful assistant for the 'Growth with Flow' project.
 Use the following pieces of context to answer the user's question.
 If you don't know the answer based on the context, say so. Do not make up information.
 
 Context:
 {context_text}
-
+{history_text}
 Question:
 {query}
 
 Answer:
 """
 
+    async def query_with_rag(
+        self,
+        query: str,
+        model_type: str = "fast",
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        k: int = RAG_TOP_K,
+        vector_weight: float = HYBRID_VECTOR_WEIGHT,
+        lexical_weight: float = HYBRID_LEXICAL_WEIGHT,
+        filters: Optional[SearchFilters] = None
+    ):
+        """
+        Queries the Gemini model with context from the knowledge base (RAG).
+        Near-identical questions against an unchanged KB are served from the
+        semantic answer cache (metadata.cache_hit).
+        """
+        timer = StageTimer("kb_query", model_type)
+        retrieval = {"k": k, "vector_weight": vector_weight, "lexical_weight": lexical_weight, "filters": filters}
+        query_embedding = await timer.measure("embed_query", self.embed_query(query))
+        # Read once: a sync committing during generation must not get this answer cached under its version
+        kb_version = await self.get_kb_version()
+        cached = await timer.measure(
+            "answer_cache", self.lookup_cached_answer(query_embedding, model_type, kb_version, **retrieval)
+        )
+        if cached is not None:
+            cached["metadata"]["timings_ms"] = timer.as_dict()
+            return cached
+
+        # 1. Retrieve context
+        docs = await timer.measure("retrieve", self.get_relevant_context(
+            query, ef_search=ef_search, probes=probes, query_embedding=query_embedding, **retrieval
+        ))
+
+        # 2. Construct Prompt
+        prompt = self.build_rag_prompt(query, docs)
+
         # 3. Generate Answer using Gemini
-        response = self.gemini_service.generate_content(
+        response = await timer.measure("generate", self.gemini_service.agenerate_content(
             prompt=prompt,
             model_type=model_type
-        )
+        ))
 
-        return {
+        result = {
             "answer": response,
             "context_used": [doc["page_content"] for doc in docs],
             "sources": [doc["metadata"] for doc in docs]
         }
+        await self.store_answer(query, query_embedding, model_type, result, kb_version, **retrieval)
+
+        return {**result, "metadata": {"cache_hit": False, "timings_ms": timer.as_dict()}}
+
+    async def batch_query(
+        self,
+        queries: List[str],
+        model_type: str = "fast",
+        generate: bool = False,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        k: int = RAG_TOP_K,
+        vector_weight: float = HYBRID_VECTOR_WEIGHT,
+        lexical_weight: float = HYBRID_LEXICAL_WEIGHT,
+        filters: Optional[SearchFilters] = None
+    ):
+        """
+        Retrieval for many queries with one embedding call and one SQL
+        statement. With `generate`, RAG answers are then produced concurrently
+        (answer cache first); a failed generation only fails its own result.
+        """
+        if not queries:
+            raise ValueError("queries must not be empty")
+        if len(queries) > KB_BATCH_MAX_QUERIES:
+            raise ValueError(f"At most {KB_BATCH_MAX_QUERIES} queries per batch")
+
+        timer = StageTimer("kb_query_batch", model_type)
+        retrieval = {"k": k, "vector_weight": vector_weight, "lexical_weight": lexical_weight, "filters": filters}
+        query_embeddings = await timer.measure("embed_query", self.embed_queries(queries))
+        kb_version = await self.get_kb_version()
+        contexts = await timer.measure("retrieve", self.get_relevant_contexts(
+            queries, ef_search=ef_search, probes=probes, query_embeddings=query_embeddings, **retrieval
+        ))
+        results = [
+            {
+                "query": query,
+                "context_used": [doc["page_content"] for doc in docs],
+                "sources": [doc["metadata"] for doc in docs]
+            }
+            for query, docs in zip(queries, contexts)
+        ]
+
+        if generate:
+            with timer.stage("answer_cache"):
+                cached = [
+                    await self.lookup_cached_answer(query_embedding, model_type, kb_version, **retrieval)
+                    for query_embedding in query_embeddings
+                ]
+            pending = [i for i, hit in enumerate(cached) if hit is None]
+            answers = await timer.measure("generate", asyncio.gather(
+                *(
+                    self.gemini_service.agenerate_content(
+                        self.build_rag_prompt(queries[i], contexts[i]), model_type
+                    )
+                    for i in pending
+                ),
+                return_exceptions=True
+            ))
+
+            for i, hit in enumerate(cached):
+                if hit is not None:
+                    results[i] = {"query": queries[i], **hit}
+            for i, answer in zip(pending, answers):
+                if isinstance(answer, BaseException):
+                    results[i].update(answer=None, error=str(answer))
+                    continue
+                results[i]["answer"] = answer
+                await self.store_answer(queries[i], query_embeddings[i], model_type, results[i], kb_version, **retrieval)
+                results[i]["metadata"] = {"cache_hit": False}
+
+        return {"results": results, "metadata": {"queries": len(queries), "timings_ms": timer.as_dict()}}
@@ -0,0 +1,352 @@
+from typing import Optional
+from collections import deque
+from dataclasses import dataclass, field
+from fastapi import WebSocketDisconnect
+from google.genai import types
+from services import metrics
+from services.gemini_service import GeminiService
+import os
+import json
+import time
+import uuid
+import asyncio
+
+# Live relays open at once in this process; further connections are refused
+# (close code 1013, try again later) rather than queued.
+LIVE_MAX_SESSIONS = int(os.getenv("LIVE_MAX_SESSIONS", "32"))
+# Format of the browser's binary frames (16-bit little-endian PCM, mono).
+LIVE_INPUT_MIME_TYPE = os.getenv("LIVE_INPUT_MIME_TYPE", "audio/pcm;rate=16000")
+# Frames buffered in each direction. When a queue is full the relay stops
+# reading from that side, so a slow peer slows the sender down instead of
+# growing memory or latency without bound.
+LIVE_INPUT_QUEUE_FRAMES = int(os.getenv("LIVE_INPUT_QUEUE_FRAMES", "64"))
+LIVE_OUTPUT_QUEUE_FRAMES = int(os.getenv("LIVE_OUTPUT_QUEUE_FRAMES", "64"))
+# Browser frames (often 10-20 ms each) are coalesced for up to this long, or
+# this many bytes, before being sent to Gemini.
+LIVE_BATCH_MS = float(os.getenv("LIVE_BATCH_MS", "40"))
+LIVE_BATCH_MAX_BYTES = int(os.getenv("LIVE_BATCH_MAX_BYTES", str(32 * 1024)))
+# A Gemini connection is replaced (resuming the same conversation) at the
+# first turn boundary after this long or this many turns; Gemini itself ends
+# connections after about 10 minutes.
+LIVE_UPSTREAM_MAX_SECONDS = float(os.getenv("LIVE_UPSTREAM_MAX_SECONDS", "540"))
+LIVE_UPSTREAM_MAX_TURNS = int(os.getenv("LIVE_UPSTREAM_MAX_TURNS", "50"))
+# Limits of one browser session.
+LIVE_MAX_SESSION_SECONDS = float(os.getenv("LIVE_MAX_SESSION_SECONDS", "1800"))
+LIVE_IDLE_SECONDS = float(os.getenv("LIVE_IDLE_SECONDS", "60"))
+
+CONTROL_TYPES = ("text", "end")
+
+_active_sessions = 0
+
+
+@dataclass
+class LiveSessionStats:
+    """Counters and latencies of one relay session, sent to the browser when it ends."""
+    frames_in: int = 0
+    bytes_in: int = 0
+    batches_sent: int = 0
+    chunks_out: int = 0
+    bytes_out: int = 0
+    turns: int = 0
+    interruptions: int = 0
+    upstream_connections: int = 0
+    latencies: dict = field(default_factory=dict)  # stage -> [count, total seconds, max seconds]
+
+    def observe(self, stage: str, seconds: float, model_type: str):
+        count, total, worst = self.latencies.get(stage, (0, 0.0, 0.0))
+        self.latencies[stage] = (count + 1, total + seconds, max(worst, seconds))
+        metrics.observe_stage("live", stage, seconds, model_type)
+
+    def as_dict(self) -> dict:
+        return {
+            "frames_in": self.frames_in,
+            "bytes_in": self.bytes_in,
+            "batches_sent": self.batches_sent,
+            "chunks_out": self.chunks_out,
+            "bytes_out": self.bytes_out,
+            "turns": self.turns,
+            "interruptions": self.interruptions,
+            "upstream_connections": self.upstream_connections,
+            "latency_ms": {
+                stage: {"count": count, "mean": round(total / count * 1000, 1), "max": round(worst * 1000, 1)}
+                for stage, (count, total, worst) in self.latencies.items()
+            },
+        }
+
+
+class LiveSessionLimitReached(Exception):
+    pass
+
+
+class LiveRelay:
+    """
+    Relays one browser WebSocket to a Gemini Live session.
+
+    Browser -> Gemini: binary frames are raw audio (LIVE_INPUT_MIME_TYPE),
+    batched before sending. Text frames are JSON controls:
+    {"type": "text", "text": ...} sends a text turn and {"type": "end"}
+    marks the end of the audio stream.
+
+    Gemini -> browser: binary frames are the model's audio (24 kHz PCM).
+    Text frames are JSON events: ready, interrupted, turn_complete,
+    reconnected, error and, when the session ends, stats.
+
+    Latencies (also recorded as app_stage_duration_seconds{operation="live"}):
+    connect (opening a Gemini connection), input_queue (browser frame
+    received until sent to Gemini), output_queue (Gemini audio received
+    until sent to the browser) and first_response (text or end-of-audio
+    until the first audio of the answer; turns ended by Gemini's own voice
+    activity detection have no such marker).
+    """
+
+    def __init__(
+        self,
+        websocket,
+        gemini: GeminiService,
+        model_type: str = "live",
+        system_instruction: Optional[str] = None,
+        input_mime_type: str = LIVE_INPUT_MIME_TYPE,
+        batch_ms: float = LIVE_BATCH_MS,
+        batch_max_bytes: int = LIVE_BATCH_MAX_BYTES,
+        upstream_max_seconds: float = LIVE_UPSTREAM_MAX_SECONDS,
+        upstream_max_turns: int = LIVE_UPSTREAM_MAX_TURNS,
+        max_session_seconds: float = LIVE_MAX_SESSION_SECONDS,
+        idle_seconds: float = LIVE_IDLE_SECONDS,
+    ):
+        self.websocket = websocket
+        self.gemini = gemini
+        self.model_type = model_type
+        self.system_instruction = system_instruction
+        self.input_mime_type = input_mime_type
+        self.batch_seconds = batch_ms / 1000
+        self.batch_max_bytes = batch_max_bytes
+        self.upstream_max_seconds = upstream_max_seconds
+        self.upstream_max_turns = upstream_max_turns
+        self.max_session_seconds = max_session_seconds
+        self.idle_seconds = idle_seconds
+
+        self.session_id = str(uuid.uuid4())
+        self.stats = LiveSessionStats()
+        # Items are (received_at, bytes frame or control dict)
+        self.inbound: asyncio.Queue = asyncio.Queue(maxsize=LIVE_INPUT_QUEUE_FRAMES)
+        # Items are (queued_at, bytes audio or event dict)
+        self.outbound: asyncio.Queue = asyncio.Queue(maxsize=LIVE_OUTPUT_QUEUE_FRAMES)
+        # Inbound items to handle before the queue: read past the end of a
+        # batch, or not sent when a Gemini connection was replaced
+        self.pending: deque = deque()
+        self.resumption_handle: Optional[str] = None
+        self.awaiting_response_since: Optional[float] = None
+
+    async def run(self):
+        """Relays until either side closes, the session limits are hit or Gemini fails."""
+        global _active_sessions
+        if _active_sessions >= LIVE_MAX_SESSIONS:
+            raise LiveSessionLimitReached(f"{LIVE_MAX_SESSIONS} live sessions already open")
+        _active_sessions += 1
+        metrics.live_session_opened()
+
+        tasks = [
+            asyncio.create_task(self._read_client()),
+            asyncio.create_task(self._write_client()),
+            asyncio.create_task(self._relay_upstream()),
+        ]
+        close_code, close_reason = 1000, ""
+        try:
+            done, _ = await asyncio.wait(
+                tasks, timeout=self.max_session_seconds, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                close_reason = "Session time limit reached"
+            for task in done:
+                if isinstance(task.exception(), WebSocketDisconnect):
+                    close_code = None
+                elif task.exception() is not None:
+                    close_code, close_reason = 1011, str(task.exception())
+                    metrics.count_error("live", self.model_type)
+                elif task.result() == "idle":
+                    close_reason = "Idle timeout"
+                elif task.result() == "disconnected":
+                    close_code = None
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            _active_sessions -= 1
+            metrics.live_session_closed()
+
+        stats = self.stats.as_dict()
+        print(f"Live session {self.session_id} ended ({close_reason or 'closed'}): {stats}")
+        if close_code is not None:
+            try:
+                if close_code != 1000:
+                    await self.websocket.send_json({"type": "error", "detail": close_reason})
+                await self.websocket.send_json({"type": "stats", **stats})
+                await self.websocket.close(code=close_code, reason=close_reason[:120])
+            except Exception:
+                pass  # The browser went away meanwhile
+        return stats
+
+    async def _emit(self, item):
+        # Blocks while the browser is behind, which stops reading from Gemini
+        await self.outbound.put((time.monotonic(), item))
+
+    async def _read_client(self) -> str:
+        while True:
+            try:
+                message = await asyncio.wait_for(self.websocket.receive(), timeout=self.idle_seconds)
+            except asyncio.TimeoutError:
+                return "idle"
+            if message["type"] == "websocket.disconnect":
+                return "disconnected"
+            received_at = time.monotonic()
+
+            if message.get("bytes") is not None:
+                frame = message["bytes"]
+                self.stats.frames_in += 1
+                self.stats.bytes_in += len(frame)
+                metrics.count_live_audio("in", len(frame))
+                # Blocks while Gemini is behind, which stops reading from the browser
+                await self.inbound.put((received_at, frame))
+                continue
+
+            try:
+                control = json.loads(message.get("text") or "")
+                if control.get("type") not in CONTROL_TYPES:
+                    raise ValueError(f"unknown type {control.get('type')!r}")
+            except (ValueError, AttributeError) as e:
+                await self._emit({"type": "error", "detail": f"Invalid control message: {e}"})
+                continue
+            await self.inbound.put((received_at, control))
+
+    async def _write_client(self):
+        while True:
+            queued_at, item = await self.outbound.get()
+            if isinstance(item, bytes):
+                await self.websocket.send_bytes(item)
+                self.stats.observe("output_queue", time.monotonic() - queued_at, self.model_type)
+            else:
+                await self.websocket.send_json(item)
+
+    async def _relay_upstream(self):
+        """Runs Gemini connections one after another, resuming the conversation on each."""
+        while True:
+            connect_started = time.monotonic()
+            async with self.gemini.create_live_session(
+                self.model_type, self.resumption_handle, self.system_instruction
+            ) as session:
+                self.stats.observe("connect", time.monotonic() - connect_started, self.model_type)
+                self.stats.upstream_connections += 1
+                if self.stats.upstream_connections == 1:
+                    await self._emit({"type": "ready", "session_id": self.session_id})
+                else:
+                    await self._emit({"type": "reconnected", "resumed": self.resumption_handle is not None})
+
+                sender = asyncio.create_task(self._send_upstream(session))
+                receiver = asyncio.create_task(self._receive_upstream(session))
+                try:
+                    done, _ = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    sender.cancel()
+                    receiver.cancel()
+                    await asyncio.gather(sender, receiver, return_exceptions=True)
+                for task in done:
+                    task.result()  # Re-raises Gemini errors; a clean finish means reconnect
+
+    async def _next_item(self, timeout: Optional[float] = None) -> tuple:
+        if self.pending:
+            return self.pending.popleft()
+        if timeout is None:
+            return await self.inbound.get()
+        return await asyncio.wait_for(self.inbound.get(), timeout)
+
+    async def _next_batch(self) -> tuple:
+        """
+        The next control message, or audio frames joined up to
+        batch_max_bytes: whatever is already queued, plus what arrives
+        within batch_ms of the oldest frame.
+        """
+        received_at, first = await self._next_item()
+        if not isinstance(first, bytes):
+            return received_at, first
+        taken, size = [(received_at, first)], len(first)
+        deadline = received_at + self.batch_seconds
+        try:
+            while size < self.batch_max_bytes:
+                if self.pending or not self.inbound.empty():
+                    item = await self._next_item()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await self._next_item(remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if not isinstance(item[1], bytes):
+                    self.pending.appendleft(item)
+                    break
+                taken.append(item)
+                size += len(item[1])
+        except asyncio.CancelledError:
+            # Cancelled for a reconnect: the frames go to the next connection
+            self.pending.extendleft(reversed(taken))
+            raise
+        return received_at, b"".join(frame for _, frame in taken)
+
+    async def _send_upstream(self, session):
+        while True:
+            received_at, item = await self._next_batch()
+            # Kept until sent, so a batch interrupted by a reconnect goes to the next connection
+            self.pending.appendleft((received_at, item))
+            if isinstance(item, bytes):
+                await session.send_realtime_input(audio=types.Blob(data=item, mime_type=self.input_mime_type))
+                self.stats.batches_sent += 1
+                self.stats.observe("input_queue", time.monotonic() - received_at, self.model_type)
+            elif item["type"] == "text":
+                await session.send_realtime_input(text=str(item.get("text", "")))
+                self.awaiting_response_since = time.monotonic()
+            else:
+                await session.send_realtime_input(audio_stream_end=True)
+                self.awaiting_response_since = time.monotonic()
+            self.pending.popleft()
+
+    async def _receive_upstream(self, session):
+        """Forwards Gemini's output; returns when the connection should be replaced."""
+        connected_at = time.monotonic()
+        turns = 0
+        while True:
+            async for message in session.receive():
+                update = message.session_resumption_update
+                if update is not None and update.resumable and update.new_handle:
+                    self.resumption_handle = update.new_handle
+                metrics.count_tokens(self.model_type, message.usage_metadata)
+                if message.go_away is not None:
+                    # Gemini is about to close this connection
+                    return
+
+                content = message.server_content
+                if content is None:
+                    continue
+                if content.model_turn is not None:
+                    for part in content.model_turn.parts or []:
+                        if part.inline_data is None or not part.inline_data.data:
+                            continue
+                        if self.awaiting_response_since is not None:
+                            self.stats.observe(
+                                "first_response", time.monotonic() - self.awaiting_response_since, self.model_type
+                            )
+                            self.awaiting_response_since = None
+                        audio = part.inline_data.data
+                        self.stats.chunks_out += 1
+                        self.stats.bytes_out += len(audio)
+                        metrics.count_live_audio("out", len(audio))
+                        await self._emit(audio)
+                if content.interrupted:
+                    self.stats.interruptions += 1
+                    await self._emit({"type": "interrupted"})
+                if content.turn_complete:
+                    self.stats.turns += 1
+                    turns += 1
+                    await self._emit({"type": "turn_complete"})
+                    if turns >= self.upstream_max_turns or time.monotonic() - connected_at >= self.upstream_max_seconds:
+                        return
@@ -0,0 +1,150 @@
+from typing import Optional
+from contextlib import contextmanager
+import os
+
+# Prometheus metrics, exposed at /metrics. When disabled every helper below
+# returns immediately and prometheus_client is never imported.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Optional OpenTelemetry spans around the same stages (requires the
+# opentelemetry-api package plus an SDK/exporter configured by the deployment).
+OTEL_TRACING_ENABLED = os.getenv("OTEL_TRACING_ENABLED", "false").lower() == "true"
+
+# Seconds; covers fast cache hits up to long generations.
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class _Metrics:
+    def __init__(self):
+        from prometheus_client import Counter, Gauge, Histogram
+
+        self.Gauge = Gauge
+        self.instrumented_engines = set()
+        self.stage_seconds = Histogram(
+            "app_stage_duration_seconds",
+            "Duration of request stages (embed_query, retrieve, generate, persist, ...)",
+            ["operation", "stage", "model_type"],
+            buckets=STAGE_BUCKETS,
+        )
+        self.http_seconds = Histogram(
+            "app_http_request_duration_seconds",
+            "HTTP request duration until the response starts",
+            ["method", "route", "status"],
+            buckets=STAGE_BUCKETS,
+        )
+        self.tokens = Counter(
+            "app_gemini_tokens_total",
+            "Gemini tokens by model type and kind (prompt, cached, output)",
+            ["model_type", "kind"],
+        )
+        self.cache_lookups = Counter(
+            "app_cache_lookups_total",
+            "Cache lookups by cache and result",
+            ["cache", "result"],
+        )
+        self.errors = Counter(
+            "app_errors_total",
+            "Errors by component and model type",
+            ["component", "model_type"],
+        )
+        self.live_sessions = Gauge(
+            "app_live_sessions",
+            "Open live-audio relay sessions",
+        )
+        self.live_audio_bytes = Counter(
+            "app_live_audio_bytes_total",
+            "Audio relayed by live sessions, by direction (in: browser to Gemini, out: Gemini to browser)",
+            ["direction"],
+        )
+
+
+_metrics: Optional[_Metrics] = _Metrics() if METRICS_ENABLED else None
+_tracer = None
+if OTEL_TRACING_ENABLED:
+    from opentelemetry import trace
+
+    _tracer = trace.get_tracer("growthflow-backend")
+
+
+def observe_stage(operation: str, stage: str, seconds: float, model_type: str = "none") -> None:
+    if _metrics is not None:
+        _metrics.stage_seconds.labels(operation, stage, model_type).observe(seconds)
+
+
+def observe_http(method: str, route: str, status: int, seconds: float) -> None:
+    if _metrics is not None:
+        _metrics.http_seconds.labels(method, route, str(status)).observe(seconds)
+
+
+def count_tokens(model_type: str, usage) -> None:
+    """Records token usage from a Gemini response's (or Live API message's) usage_metadata."""
+    if _metrics is None or usage is None:
+        return
+    for kind, value in (
+        ("prompt", usage.prompt_token_count),
+        ("cached", getattr(usage, "cached_content_token_count", None)),
+        # Live API messages report response_token_count instead
+        ("output", getattr(usage, "candidates_token_count", None) or getattr(usage, "response_token_count", None)),
+    ):
+        if value:
+            _metrics.tokens.labels(model_type, kind).inc(value)
+
+
+def count_cache(cache: str, result: str) -> None:
+    if _metrics is not None:
+        _metrics.cache_lookups.labels(cache, result).inc()
+
+
+def count_error(component: str, model_type: str = "none") -> None:
+    if _metrics is not None:
+        _metrics.errors.labels(component, model_type).inc()
+
+
+def live_session_opened() -> None:
+    if _metrics is not None:
+        _metrics.live_sessions.inc()
+
+
+def live_session_closed() -> None:
+    if _metrics is not None:
+        _metrics.live_sessions.dec()
+
+
+def count_live_audio(direction: str, size: int) -> None:
+    if _metrics is not None:
+        _metrics.live_audio_bytes.labels(direction).inc(size)
+
+
+def instrument_engine(engine) -> None:
+    """Exposes the SQLAlchemy connection pool of `engine` as gauges."""
+    if _metrics is None or id(engine) in _metrics.instrumented_engines:
+        return
+    _metrics.instrumented_engines.add(id(engine))
+    pool = engine.sync_engine.pool
+    for name, description, read in (
+        ("app_db_pool_size", "Connections kept in the pool", pool.size),
+        ("app_db_pool_checked_out", "Connections currently in use", pool.checkedout),
+        ("app_db_pool_overflow", "Connections opened beyond pool_size", pool.overflow),
+    ):
+        _metrics.Gauge(name, description).set_function(read)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """OpenTelemetry span if tracing is enabled, otherwise a no-op."""
+    if _tracer is None:
+        yield
+        return
+    with _tracer.start_as_current_span(name, attributes=attributes):
+        yield
+
+
+def render() -> tuple:
+    """Returns (body, content type) for the /metrics endpoint."""
+    from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def enabled() -> bool:
+    return _metrics is not None
+
@@ -0,0 +1,229 @@
+from typing import Any, AsyncIterator, Collection, Dict, List, Optional
+from datetime import datetime, timedelta
+from langchain_core.documents import Document as SourceDocument
+from notion_client import AsyncClient
+from notion_client.errors import HTTPResponseError, RequestTimeoutError
+from services.embedding_pipeline import TokenBucket
+import os
+import asyncio
+import random
+import httpx
+
+# Notion allows an average of three requests per second per integration.
+NOTION_REQUESTS_PER_SECOND = float(os.getenv("NOTION_REQUESTS_PER_SECOND", "3"))
+# Pages whose blocks are fetched concurrently.
+NOTION_MAX_CONCURRENCY = int(os.getenv("NOTION_MAX_CONCURRENCY", "4"))
+# Fetched pages buffered ahead of the sync. Together with the concurrency this
+# bounds how many pages are held in memory, whatever the size of the workspace.
+NOTION_PREFETCH_PAGES = int(os.getenv("NOTION_PREFETCH_PAGES", "16"))
+NOTION_MAX_RETRIES = int(os.getenv("NOTION_MAX_RETRIES", "5"))
+NOTION_TIMEOUT_SECONDS = float(os.getenv("NOTION_TIMEOUT_SECONDS", "30"))
+# The databases/{id}/query endpoint belongs to this API version (newer ones
+# query data sources instead); NotionDBLoader used it as well.
+NOTION_API_VERSION = "2022-06-28"
+NOTION_PAGE_SIZE = 100
+
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+
+def retry_delay(error: Exception, attempt: int) -> Optional[float]:
+    """Seconds to wait before retrying a failed Notion request, or None if it should not be retried."""
+    if isinstance(error, HTTPResponseError):
+        if error.status not in RETRYABLE_STATUSES:
+            return None
+        retry_after = error.headers.get("retry-after") if error.headers else None
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+    elif not isinstance(error, (RequestTimeoutError, httpx.TransportError)):
+        return None
+    return min(60.0, 2 ** attempt) + random.uniform(0, 1)
+
+
+def _rich_text(items: list) -> str:
+    return "".join(item.get("plain_text", "") for item in items)
+
+
+def page_metadata(page: dict) -> dict:
+    """Page properties as document metadata, keyed by lower-cased property name (as NotionDBLoader did)."""
+    metadata: Dict[str, Any] = {}
+    for name, prop in page.get("properties", {}).items():
+        kind = prop["type"]
+        data = prop.get(kind)
+        if kind in ("rich_text", "title"):
+            value = _rich_text(data or [])
+        elif kind in ("multi_select", "people"):
+            value = [item.get("name") for item in data or []]
+        elif kind in ("select", "status"):
+            value = data["name"] if data else None
+        elif kind == "unique_id":
+            value = f"{data['prefix']}-{data['number']}" if data else None
+        elif kind in ("url", "date", "checkbox", "email", "number", "last_edited_time", "created_time"):
+            value = data
+        else:
+            value = None
+        metadata[name.lower()] = value
+    metadata["id"] = page["id"]
+    metadata.setdefault("last_edited_time", page.get("last_edited_time"))
+    return metadata
+
+
+class NotionDatabaseSource:
+    """
+    Streams the pages of a Notion database as LangChain Documents.
+
+    The database query is paged through and the blocks of up to
+    `max_concurrency` pages are fetched at the same time, all requests
+    sharing one rate limit and retrying 429s / server errors with backoff.
+    Documents are yielded as soon as their blocks are loaded; at most
+    `prefetch` finished pages wait for the consumer.
+
+    Pages in `known_ids` whose last_edited_time is more than a minute before
+    `edited_before` (Notion rounds it to the minute) are not fetched and are
+    listed in `unchanged` instead. Pages whose blocks could
+    not be loaded are listed in `failed` as (page_id, error). Both lists are
+    complete once iteration ends.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        database_id: str,
+        base_url: Optional[str] = None,
+        known_ids: Collection[str] = (),
+        edited_before: Optional[datetime] = None,
+        max_concurrency: int = NOTION_MAX_CONCURRENCY,
+        requests_per_second: float = NOTION_REQUESTS_PER_SECOND,
+        prefetch: int = NOTION_PREFETCH_PAGES,
+        max_retries: int = NOTION_MAX_RETRIES,
+    ):
+        self.client_options = {
+            "auth": token,
+            "timeout_ms": int(NOTION_TIMEOUT_SECONDS * 1000),
+            "notion_version": NOTION_API_VERSION,
+        }
+        if base_url:
+            self.client_options["base_url"] = base_url
+        self.database_id = database_id
+        self.known_ids = known_ids
+        self.edited_before = edited_before
+        self.max_concurrency = max_concurrency
+        self.prefetch = prefetch
+        self.max_retries = max_retries
+        self.rate_limiter = TokenBucket(rate=requests_per_second, capacity=max(1.0, requests_per_second))
+        self.client: Optional[AsyncClient] = None
+        self.pages_found = 0
+        self.unchanged: List[str] = []
+        self.failed: List[tuple] = []
+
+    async def documents(self) -> AsyncIterator[SourceDocument]:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.prefetch)
+        slots = asyncio.Semaphore(self.max_concurrency)
+        fetch_tasks = set()
+        done = object()
+
+        async def fetch(page: dict):
+            try:
+                document = SourceDocument(
+                    page_content=await self._load_blocks(page["id"]),
+                    metadata=page_metadata(page)
+                )
+            except Exception as e:
+                self.failed.append((page["id"], e))
+            else:
+                # Blocks while the consumer is behind, holding the slot
+                await queue.put(document)
+            finally:
+                slots.release()
+
+        async def produce():
+            try:
+                async for page in self._query_database():
+                    self.pages_found += 1
+                    if self._is_unchanged(page):
+                        self.unchanged.append(page["id"])
+                        continue
+                    await slots.acquire()
+                    task = asyncio.create_task(fetch(page))
+                    fetch_tasks.add(task)
+                    task.add_done_callback(fetch_tasks.discard)
+                if fetch_tasks:
+                    await asyncio.gather(*fetch_tasks)
+                await queue.put(done)
+            except Exception as e:
+                await queue.put(e)
+
+        self.client = AsyncClient(**self.client_options)
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+            await producer
+        finally:
+            producer.cancel()
+            for task in list(fetch_tasks):
+                task.cancel()
+            await self.client.aclose()
+
+    def _is_unchanged(self, page: dict) -> bool:
+        edited = page.get("last_edited_time")
+        if self.edited_before is None or not edited or page["id"] not in self.known_ids:
+            return False
+        edited_at = datetime.fromisoformat(edited.replace("Z", "+00:00"))
+        return edited_at < self.edited_before - timedelta(minutes=1)
+
+    async def _query_database(self) -> AsyncIterator[dict]:
+        cursor = None
+        while True:
+            body = {"page_size": NOTION_PAGE_SIZE}
+            if cursor:
+                body["start_cursor"] = cursor
+            response = await self._request(f"databases/{self.database_id}/query", "POST", body=body)
+            for page in response["results"]:
+                yield page
+            if not response.get("has_more"):
+                return
+            cursor = response["next_cursor"]
+
+    async def _load_blocks(self, block_id: str, num_tabs: int = 0) -> str:
+        """Text of a block's children; nested blocks are indented with tabs."""
+        lines = []
+        cursor = None
+        while True:
+            query = {"page_size": NOTION_PAGE_SIZE}
+            if cursor:
+                query["start_cursor"] = cursor
+            response = await self._request(f"blocks/{block_id}/children", "GET", query=query)
+            for block in response["results"]:
+                content = block.get(block["type"]) or {}
+                if "rich_text" not in content:
+                    continue
+                texts = [
+                    "\t" * num_tabs + rich_text["text"]["content"]
+                    for rich_text in content["rich_text"] if "text" in rich_text
+                ]
+                if block.get("has_children"):
+                    texts.append(await self._load_blocks(block["id"], num_tabs + 1))
+                lines.append("\n".join(texts))
+            if not response.get("has_more"):
+                return "\n".join(lines)
+            cursor = response["next_cursor"]
+
+    async def _request(self, path: str, method: str, **kwargs) -> dict:
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.acquire()
+            try:
+                return await self.client.request(path=path, method=method, **kwargs)
+            except Exception as e:
+                delay = retry_delay(e, attempt)
+                if attempt == self.max_retries or delay is None:
+                    raise
+                print(f"Notion request {path} failed ({e}); retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
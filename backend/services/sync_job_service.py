@@ -0,0 +1,235 @@
+from typing import Optional
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, update, and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.database import AsyncSessionLocal
+from db.models import SyncJob
+from services.knowledge_base_service import KnowledgeBaseService, SyncProgress, SYNC_MODES
+from db.vector_index import VECTOR_INDEX_PRECISIONS
+from uuid import UUID
+import os
+import asyncio
+import time
+
+# A queued/running job whose worker has not reported for this long is
+# considered dead (e.g. the process was restarted) and no longer blocks syncs.
+SYNC_JOB_STALE_SECONDS = int(os.getenv("SYNC_JOB_STALE_SECONDS", "600"))
+# Minimum interval between progress writes to the sync_jobs row.
+SYNC_PROGRESS_INTERVAL_SECONDS = float(os.getenv("SYNC_PROGRESS_INTERVAL_SECONDS", "1"))
+# Workers refresh heartbeat_at this often from a separate task, however long a
+# single sync step takes, so a stale heartbeat means the worker is gone.
+SYNC_HEARTBEAT_SECONDS = float(os.getenv("SYNC_HEARTBEAT_SECONDS", "30"))
+
+ACTIVE_STATUSES = ("queued", "running")
+
+# Keeps strong references to in-flight worker tasks of this process.
+_running_tasks: set = set()
+
+
+class SyncAlreadyRunningError(Exception):
+    """Raised when a sync is submitted while another one is queued or running."""
+
+    def __init__(self, job_id: Optional[UUID]):
+        self.job_id = job_id
+        super().__init__(f"A knowledge-base sync is already in progress (job {job_id})")
+
+
+class SyncJobExpiredError(Exception):
+    """Raised by a worker's progress write once its job is no longer queued or running."""
+
+    def __init__(self, job_id: UUID):
+        self.job_id = job_id
+        super().__init__(f"Sync job {job_id} is no longer active")
+
+
+class JobProgress(SyncProgress):
+    """
+    Persists sync progress to the job row, throttled to one write per interval.
+    Writes only apply while the job is still queued or running: once it has
+    been expired, they raise SyncJobExpiredError so the worker stops instead
+    of overwriting the final status.
+    """
+
+    def __init__(self, job_id: UUID):
+        self.job_id = job_id
+        self.fields = {}
+        self.errors = []
+        self.last_write = 0.0
+        self.expired = False
+
+    async def update(self, **fields):
+        self.fields.update(fields)
+        # Phase changes are always written; counters at most once per interval
+        if "phase" in fields or time.monotonic() - self.last_write >= SYNC_PROGRESS_INTERVAL_SECONDS:
+            await self.flush()
+
+    async def error(self, message: str):
+        self.errors.append(message)
+        await self.flush()
+
+    async def flush(self, **extra):
+        values = {**self.fields, **extra, "errors": self.errors, "heartbeat_at": datetime.now(timezone.utc)}
+        # Progress is written in its own short session so it is visible while
+        # the sync's own transaction is still open.
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                update(SyncJob)
+                .where(SyncJob.id == self.job_id, SyncJob.status.in_(ACTIVE_STATUSES))
+                .values(**values)
+            )
+            await session.commit()
+        self.last_write = time.monotonic()
+        if result.rowcount == 0:
+            self.expired = True
+            raise SyncJobExpiredError(self.job_id)
+
+    async def keep_alive(self, worker: asyncio.Task):
+        """Heartbeat loop; cancels `worker` if the job stops being active."""
+        while True:
+            await asyncio.sleep(SYNC_HEARTBEAT_SECONDS)
+            try:
+                await self.flush()
+            except SyncJobExpiredError:
+                worker.cancel()
+                return
+            except Exception as e:
+                # e.g. a dropped connection: keep beating so the job is not taken for stale
+                print(f"Sync job {self.job_id} heartbeat failed: {e}")
+
+
+class SyncJobService:
+    def __init__(self, db_session: AsyncSession):
+        self.db = db_session
+
+    async def submit(self, mode: str = "incremental", vector_precision: Optional[str] = None) -> dict:
+        """
+        Queues a knowledge-base sync and starts it on an in-process worker.
+        Raises SyncAlreadyRunningError if another sync is queued or running.
+        """
+        if mode not in SYNC_MODES:
+            raise ValueError(f"Unknown sync mode: {mode}")
+        if vector_precision is not None and vector_precision not in VECTOR_INDEX_PRECISIONS:
+            raise ValueError(f"Unknown vector index precision: {vector_precision}")
+
+        await self._expire_stale_jobs()
+
+        job = SyncJob(mode=mode, status="queued", phase="queued", errors=[])
+        self.db.add(job)
+        try:
+            await self.db.commit()
+        except IntegrityError:
+            await self.db.rollback()
+            raise SyncAlreadyRunningError(await self._active_job_id())
+
+        task = asyncio.create_task(run_sync_job(job.id, mode, vector_precision))
+        _running_tasks.add(task)
+        task.add_done_callback(_running_tasks.discard)
+
+        return self.to_dict(job)
+
+    async def get_job(self, job_id: UUID) -> Optional[dict]:
+        job = await self.db.get(SyncJob, job_id)
+        return self.to_dict(job) if job else None
+
+    async def _active_job_id(self) -> Optional[UUID]:
+        return await self.db.scalar(
+            select(SyncJob.id).where(SyncJob.status.in_(ACTIVE_STATUSES))
+        )
+
+    async def _expire_stale_jobs(self):
+        """Fails active jobs whose worker stopped reporting (e.g. after a restart)."""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=SYNC_JOB_STALE_SECONDS)
+        await self.db.execute(
+            update(SyncJob)
+            .where(
+                SyncJob.status.in_(ACTIVE_STATUSES),
+                or_(
+                    and_(SyncJob.heartbeat_at.is_(None), SyncJob.created_at < cutoff),
+                    SyncJob.heartbeat_at < cutoff
+                )
+            )
+            .values(
+                status="failed",
+                phase="failed",
+                errors=["Worker stopped reporting progress"],
+                finished_at=datetime.now(timezone.utc)
+            )
+        )
+        await self.db.commit()
+
+    @staticmethod
+    def to_dict(job: SyncJob) -> dict:
+        end = job.finished_at or datetime.now(timezone.utc)
+        elapsed = (end - job.started_at).total_seconds() if job.started_at else 0.0
+        return {
+            "job_id": str(job.id),
+            "mode": job.mode,
+            "status": job.status,
+            "phase": job.phase,
+            "documents_total": job.documents_total,
+            "documents_processed": job.documents_processed,
+            "chunks_embedded": job.chunks_embedded,
+            "elapsed_seconds": round(elapsed, 1),
+            "chunks_per_second": round(job.chunks_embedded / elapsed, 2) if elapsed > 0 else 0.0,
+            "errors": job.errors or [],
+            "result": job.result,
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+            "started_at": job.started_at.isoformat() if job.started_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        }
+
+
+async def run_sync_job(job_id: UUID, mode: str, vector_precision: Optional[str] = None):
+    """
+    Worker: runs one sync job with its own DB session and records the outcome.
+    Stops without committing if the job is expired meanwhile (see JobProgress).
+    """
+    progress = JobProgress(job_id)
+    try:
+        await progress.flush(status="running", phase="starting", started_at=datetime.now(timezone.utc))
+    except SyncJobExpiredError:
+        print(f"Sync job {job_id} expired before it started")
+        return
+
+    heartbeat = asyncio.create_task(progress.keep_alive(asyncio.current_task()))
+    try:
+        async with AsyncSessionLocal() as session:
+            try:
+                kb_service = KnowledgeBaseService(session)
+                result = await kb_service.sync_knowledge_base(mode, progress=progress, vector_precision=vector_precision)
+            except BaseException as e:
+                await session.rollback()
+                if progress.expired:
+                    print(f"Sync job {job_id} was expired; stopped without committing")
+                    return
+                message = "Sync cancelled" if isinstance(e, asyncio.CancelledError) else str(e)
+                print(f"Sync job {job_id} failed: {message}")
+                progress.errors.append(message)
+                try:
+                    await progress.flush(status="failed", phase="failed", finished_at=datetime.now(timezone.utc))
+                except SyncJobExpiredError:
+                    pass
+                if not isinstance(e, Exception):
+                    raise
+                return
+    finally:
+        heartbeat.cancel()
+
+    try:
+        await progress.flush(
+            status="succeeded",
+            phase="done",
+            result=result,
+            finished_at=datetime.now(timezone.utc)
+        )
+    except SyncJobExpiredError:
+        print(f"Sync job {job_id} was expired after its changes were committed")
+
+
+async def cancel_running_jobs():
+    """Shutdown hook: cancels this process's workers so their jobs are marked failed."""
+    for task in list(_running_tasks):
+        task.cancel()
+    if _running_tasks:
+        await asyncio.gather(*_running_tasks, return_exceptions=True)
@@ -0,0 +1,47 @@
+from typing import Awaitable, TypeVar
+from contextlib import contextmanager
+from services import metrics
+import time
+
+T = TypeVar("T")
+
+
+class StageTimer:
+    """
+    Collects per-stage wall-clock durations of one request, in milliseconds.
+    Each stage is also recorded in the stage latency histogram and, when
+    tracing is enabled, wrapped in a span.
+    """
+
+    def __init__(self, operation: str = "request", model_type: str = "none"):
+        self.operation = operation
+        self.model_type = model_type
+        self.started = time.perf_counter()
+        self.stages = {}
+
+    async def measure(self, stage: str, awaitable: Awaitable[T]) -> T:
+        """Awaits `awaitable`, recording how long it took as `stage`."""
+        with self.stage(stage):
+            return await awaitable
+
+    @contextmanager
+    def stage(self, stage: str):
+        started = time.perf_counter()
+        try:
+            with metrics.span(f"{self.operation}.{stage}", model_type=self.model_type):
+                yield
+        finally:
+            self._record(stage, time.perf_counter() - started)
+
+    def mark(self, stage: str) -> None:
+        """Records the time elapsed since the timer started (e.g. first token)."""
+        self._record(stage, time.perf_counter() - self.started)
+
+    def _record(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = seconds * 1000
+        metrics.observe_stage(self.operation, stage, seconds, self.model_type)
+
+    def as_dict(self) -> dict:
+        timings = {stage: round(ms, 1) for stage, ms in self.stages.items()}
+        timings["total"] = round((time.perf_counter() - self.started) * 1000, 1)
+        return timings
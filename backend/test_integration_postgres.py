@@ -3,6 +3,7 @@ import sys
 from dotenv import load_dotenv
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy import select, func
+from uuid import UUID
 from db.database import Base, DATABASE_URL
 from db.models import Document, Embedding, Conversation, Message
 from services.knowledge_base_service import KnowledgeBaseService
@@ -104,6 +105,40 @@ async def test_full_integration():
         print(f"✓ RAG response: {response3['response'][:100]}...")
         print(f"✓ Sources used: {len(response3['metadata'].get('sources', []))}")
 
+        print("\n=== TEST 6: Retry After a Failed First Streamed Turn ===")
+        # The stream hands out the new conversation id before the turn is saved
+        async def failing_stream(*args, **kwargs):
+            raise RuntimeError("simulated generation failure")
+            yield
+
+        failing_service = ChatService(session)
+        failing_service.gemini_service = type("FailingGemini", (), {"astream_content": staticmethod(failing_stream)})()
+        streamed_id = None
+        try:
+            async for event in failing_service.chat_stream(
+                conversation_id=None,
+                user_message="This turn fails",
+                model_type="fast",
+                use_rag=False
+            ):
+                if event["event"] == "conversation":
+                    streamed_id = UUID(event["data"]["conversation_id"])
+        except RuntimeError:
+            await session.rollback()
+        assert streamed_id is not None, "No conversation event before the failure"
+
+        # The client now sends that id as an existing conversation
+        retry = await chat_service.chat(
+            conversation_id=streamed_id,
+            user_message="Hello again",
+            model_type="fast",
+            use_rag=False
+        )
+        assert retry["conversation_id"] == str(streamed_id)
+        history = await chat_service.get_conversation_history(streamed_id)
+        assert len(history) == 2, f"Expected 2 messages, got {len(history)}"
+        print(f"✓ Turn after failed stream saved in conversation {streamed_id}")
+
         print("\n=== ALL TESTS PASSED ===")
         return True
 
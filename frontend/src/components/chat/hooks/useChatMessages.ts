@@ -11,6 +11,12 @@ export const useChatMessages = () => {
     const [messages, setMessages] = useState<Message[]>([]);
     const [isLoading, setIsLoading] = useState(false);
 
+    const updateMessage = (id: string, update: (text: string) => string) => {
+        setMessages(prev => prev.map(msg =>
+            msg.id === id ? { ...msg, text: update(msg.text) } : msg
+        ));
+    };
+
     const sendMessage = async (userMessage: string) => {
         setMessages(prev => [...prev, {
             id: Date.now().toString(),
@@ -20,13 +26,34 @@ export const useChatMessages = () => {
 
         setIsLoading(true);
 
+        const agentMessageId = `${Date.now()}-agent`;
+        let agentMessageAdded = false;
+
         try {
-            const response = await chatService.sendMessage(userMessage);
-            setMessages(prev => [...prev, {
-                id: Date.now().toString(),
-                text: response,
-                isUser: false
-            }]);
+            const response = await chatService.sendMessage(userMessage, {
+                onToken: (token) => {
+                    if (!agentMessageAdded) {
+                        agentMessageAdded = true;
+                        setMessages(prev => [...prev, {
+                            id: agentMessageId,
+                            text: token,
+                            isUser: false
+                        }]);
+                    } else {
+                        updateMessage(agentMessageId, text => text + token);
+                    }
+                }
+            });
+
+            if (agentMessageAdded) {
+                updateMessage(agentMessageId, () => response);
+            } else {
+                setMessages(prev => [...prev, {
+                    id: agentMessageId,
+                    text: response,
+                    isUser: false
+                }]);
+            }
         } catch (error) {
             console.error('Error:', error);
             setMessages(prev => [...prev, {
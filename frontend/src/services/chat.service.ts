@@ -1,4 +1,5 @@
 const API_URL = 'http://localhost:8001/api/chat';
+const STREAM_URL = `${API_URL}/stream`;
 
 interface ChatRequest {
   message: string;
@@ -7,25 +8,56 @@ interface ChatRequest {
   use_rag: boolean;
 }
 
+interface Source {
+  source_title: string;
+  document_id: string;
+  chunk_index: number;
+}
+
 interface ChatResponse {
   conversation_id: string;
   response: string;
   metadata: {
     model_type: string;
     rag_enabled: boolean;
-    sources?: Array<{
-      source_title: string;
-      document_id: string;
-      chunk_index: number;
-    }>;
+    sources?: Source[];
   };
 }
 
+interface StreamCallbacks {
+  onToken?: (token: string) => void;
+  onSources?: (sources: Source[]) => void;
+}
+
+type StreamEvent =
+  | { event: 'conversation'; data: { conversation_id: string } }
+  | { event: 'sources'; data: { sources: Source[] } }
+  | { event: 'token'; data: { text: string } }
+  | { event: 'done'; data: ChatResponse }
+  | { event: 'error'; data: { detail?: string } };
+
 let currentConversationId: string | null = null;
 
+// Parses one server-sent event block ("event: ...\ndata: ...").
+const parseEvent = (block: string): StreamEvent | null => {
+  let event = 'message';
+  const dataLines: string[] = [];
+
+  for (const line of block.split('\n')) {
+    if (line.startsWith('event:')) {
+      event = line.slice(6).trim();
+    } else if (line.startsWith('data:')) {
+      dataLines.push(line.slice(5).trim());
+    }
+  }
+
+  if (dataLines.length === 0) return null;
+  return { event, data: JSON.parse(dataLines.join('\n')) } as StreamEvent;
+};
+
 export const chatService = {
-  async sendMessage(message: string): Promise<string> {
-    const response = await fetch(API_URL, {
+  async sendMessage(message: string, callbacks: StreamCallbacks = {}): Promise<string> {
+    const response = await fetch(STREAM_URL, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify({
@@ -36,18 +68,52 @@ export const chatService = {
       } as ChatRequest)
     });
 
-    if (!response.ok) {
+    if (!response.ok || !response.body) {
       throw new Error('Failed to get response');
     }
 
-    const data: ChatResponse = await response.json();
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let fullText = '';
+    let result: ChatResponse | null = null;
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+
+      buffer += decoder.decode(value, { stream: true });
+      const blocks = buffer.split('\n\n');
+      buffer = blocks.pop() ?? '';
+
+      for (const block of blocks) {
+        const parsed = parseEvent(block);
+        if (!parsed) continue;
 
-    // Store conversation ID for next messages
-    if (!currentConversationId) {
-      currentConversationId = data.conversation_id;
+        switch (parsed.event) {
+          case 'conversation':
+            // Store conversation ID for next messages
+            if (!currentConversationId) {
+              currentConversationId = parsed.data.conversation_id;
+            }
+            break;
+          case 'sources':
+            callbacks.onSources?.(parsed.data.sources);
+            break;
+          case 'token':
+            fullText += parsed.data.text;
+            callbacks.onToken?.(parsed.data.text);
+            break;
+          case 'done':
+            result = parsed.data;
+            break;
+          case 'error':
+            throw new Error(parsed.data.detail || 'Failed to get response');
+        }
+      }
     }
 
-    return data.response;
+    return result ? result.response : fullText;
   },
 
   resetConversation() {